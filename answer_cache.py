@@ -0,0 +1,171 @@
+"""Semantic answer cache for the RAG system."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed on question embeddings.
+
+    A lookup returns the answer stored for the most similar cached question
+    when its cosine similarity is at least the configured threshold, so
+    near-duplicate phrasings ("when are meetings?" / "when do we meet?")
+    skip retrieval and generation entirely.
+
+    Entries are evicted least-recently-used first once either the entry or
+    the memory cap is exceeded, and expire after a fixed time-to-live.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 16 * 1024 * 1024
+    ):
+        """
+        Create an empty cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Seconds an answer stays valid (0 disables expiry)
+            max_bytes: Approximate memory cap for the cached entries
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        # key -> (vector, question, answer, created_at, size), in LRU order
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._bytes = 0
+        # Stacked vectors for lookups, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+        # Bumped on every invalidation; answers computed against an older
+        # knowledge base are dropped instead of being stored
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return vector
+
+    def get(self, embedding: List[float]) -> Optional[str]:
+        """
+        Look up the answer for a question embedding.
+
+        Args:
+            embedding: Embedding of the incoming question
+
+        Returns:
+            The cached answer, or None on a miss
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys])
+
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][2]
+
+    def put(self, question: str, embedding: List[float], answer: str, generation: Optional[int] = None):
+        """
+        Store an answer.
+
+        Args:
+            question: The question that was answered
+            embedding: Embedding of the question
+            answer: The generated answer
+            generation: Value of self.generation when the answer was started;
+                the answer is discarded if the cache was invalidated since
+        """
+        vector = self._normalize(embedding)
+        size = vector.nbytes + sys.getsizeof(question) + sys.getsizeof(answer)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (vector, question, answer, time.monotonic(), size)
+            self._bytes += size
+            self._matrix = None
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop_oldest()
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the knowledge base changed."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._matrix = None
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+            }
+
+    def _pop_oldest(self):
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry[4]
+        self._matrix = None
+
+    def _expire(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry[3] < cutoff]
+        for key in expired:
+            self._bytes -= self._entries.pop(key)[4]
+            self.evictions += 1
+        if expired:
+            self._matrix = None
@@ -0,0 +1,101 @@
+"""Bound the length of generated answers to what Discord can show."""
+import re
+from typing import List, Optional
+
+from config import Config
+
+# Rough size of an English token and word, used to turn the character
+# budget into a max_tokens limit and a length the prompt asks for
+CHARS_PER_TOKEN = 4
+CHARS_PER_WORD = 6
+
+_SENTENCE_END = re.compile(r"[.!?](?=\s)|\n")
+
+
+class ErrorMessage(str):
+    """
+    Streamed answer text reporting that answering failed.
+
+    It replaces whatever was streamed before it instead of extending it,
+    so an error is never shown glued to half an answer.
+    """
+
+
+def answer_char_budget() -> int:
+    """Return the number of characters an answer may use, over all its pages."""
+    pages = Config.ANSWER_MAX_PAGES if Config.PAGINATE_ANSWERS else 1
+    return Config.MAX_MESSAGE_LENGTH * max(pages, 1)
+
+
+def answer_token_budget() -> int:
+    """Return the max_tokens limit passed to the LLM providers."""
+    if Config.ANSWER_MAX_TOKENS > 0:
+        return Config.ANSWER_MAX_TOKENS
+    return answer_char_budget() // CHARS_PER_TOKEN
+
+
+def length_instruction() -> str:
+    """Return the prompt sentence asking for an answer that fits the budget."""
+    words = answer_char_budget() // CHARS_PER_WORD
+    return (
+        f"Keep the answer under {words} words and finish it within that length; "
+        "prefer a short, direct answer over an exhaustive one."
+    )
+
+
+def _break_point(text: str, limit: int):
+    """
+    Return where to cut text so the first part has at most limit characters.
+
+    Prefers the end of a paragraph, then the end of a sentence, then a
+    space, as long as that keeps at least half of the limit.
+
+    Returns:
+        (cut index, whether the cut falls between sentences)
+    """
+    window = text[:limit]
+    paragraph = window.rfind("\n\n")
+    if paragraph >= limit // 2:
+        return paragraph, True
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(text, 0, limit)]
+    if sentence_ends and sentence_ends[-1] >= limit // 2:
+        return sentence_ends[-1], True
+    space = window.rfind(" ")
+    if space >= limit // 2:
+        return space, False
+    return limit, False
+
+
+def fit_text(text: str, limit: Optional[int] = None) -> str:
+    """
+    Shorten text to at most limit characters (default: one Discord message).
+
+    The cut falls between sentences where possible; "..." marks a cut
+    inside a sentence.
+    """
+    limit = limit or Config.MAX_MESSAGE_LENGTH
+    if len(text) <= limit:
+        return text
+    cut, clean = _break_point(text, limit - 3)
+    return text[:cut].rstrip() if clean else text[:cut].rstrip() + "..."
+
+
+def paginate(text: str, page_length: Optional[int] = None, max_pages: Optional[int] = None) -> List[str]:
+    """
+    Split text into pages of at most page_length characters (default: one Discord message).
+
+    Pages break between paragraphs or sentences where possible. Text
+    past max_pages pages is cut off with fit_text().
+    """
+    page_length = page_length or Config.MAX_MESSAGE_LENGTH
+    pages = []
+    text = text.strip()
+    while len(text) > page_length:
+        if max_pages is not None and len(pages) == max_pages - 1:
+            break
+        cut, _ = _break_point(text, page_length)
+        pages.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        pages.append(fit_text(text, page_length))
+    return pages
@@ -0,0 +1,89 @@
+"""
+Report recall@k against memory for the vector quantization settings.
+
+Reads the vectors of the active knowledge base collection (of whichever
+VECTOR_BACKEND is configured) and compares float32 storage with int8
+codes and reduced dimensions, with and without re-scoring the best
+candidates using the float vectors. Use the result to pick
+VECTOR_QUANTIZATION, VECTOR_DIMENSIONS and VECTOR_REDUCTION.
+
+Usage:
+    python benchmarks/quantization_report.py [--k 4] [--queries 200] [--rescore 32]
+    python benchmarks/quantization_report.py --synthetic 5000 --dim 1536
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from config import Config
+from quantization import VectorQuantizer, recall_report
+
+
+def load_collection_vectors() -> np.ndarray:
+    """Return the stored vectors of the active collection."""
+    from rag_system import _index_directory, active_collection_name
+    from vector_index import ChromaIndex, NumpyIndex
+
+    name = active_collection_name()
+    if Config.VECTOR_BACKEND == "numpy":
+        index = NumpyIndex(os.path.join(_index_directory(), name), name, None)
+    else:
+        import chromadb
+        index = ChromaIndex(chromadb.PersistentClient(path=Config.CHROMA_PERSIST_DIRECTORY), name, None)
+    batches = [np.asarray(vectors, dtype=np.float32) for _, vectors, _, _ in index.iter_records()]
+    if not batches:
+        raise SystemExit(f"Collection {name} is empty; load the knowledge base or use --synthetic")
+    vectors = np.concatenate(batches)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_vectors(count: int, dimensions: int) -> np.ndarray:
+    """Clustered vectors with a decaying spectrum, roughly like sentence embeddings."""
+    rng = np.random.default_rng(0)
+    spectrum = 1 / np.sqrt(np.arange(1, dimensions + 1))
+    centers = rng.standard_normal((max(1, count // 20), dimensions)) * spectrum
+    vectors = centers[rng.integers(len(centers), size=count)]
+    vectors += 0.3 * rng.standard_normal((count, dimensions)) * spectrum
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=Config.RETRIEVAL_K)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore", type=int, default=Config.RESCORE_CANDIDATES)
+    parser.add_argument("--synthetic", type=int, metavar="N", help="use N synthetic vectors instead of the collection")
+    parser.add_argument("--dim", type=int, default=384, help="dimensions of the synthetic vectors")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+        source = f"{args.synthetic} synthetic vectors"
+    else:
+        vectors = load_collection_vectors()
+        source = f"{len(vectors)} vectors from the active collection"
+    dimensions = vectors.shape[1]
+
+    settings = [VectorQuantizer(), VectorQuantizer("int8")]
+    for reduced in (dimensions // 2, dimensions // 4, dimensions // 8):
+        if reduced >= 16:
+            settings.append(VectorQuantizer("int8", reduced, "pca"))
+            settings.append(VectorQuantizer("int8", reduced, "truncate"))
+            settings.append(VectorQuantizer("none", reduced, "pca"))
+
+    print(f"{source}, {dimensions} dims, recall@{args.k} over {min(args.queries, len(vectors))} queries, "
+          f"re-scoring {args.rescore} candidates\n")
+    print(f"{'setting':<20} {'dims':>5} {'bytes/vec':>10} {'index MiB':>10} {'recall':>8} {'rescored':>9}")
+    for row in recall_report(vectors, settings, k=args.k, queries=args.queries, rescore_candidates=args.rescore):
+        print(
+            f"{row['setting']:<20} {row['dimensions']:>5} {row['bytes_per_vector']:>10} "
+            f"{row['index_mib']:>10.2f} {row['recall']:>8.3f} {row['recall_rescored']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
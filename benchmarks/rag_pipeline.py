@@ -0,0 +1,491 @@
+"""
+Benchmark chunking, ingestion, retrieval and end-to-end query latency offline.
+
+Runs the real RAGSystem with deterministic fake embeddings (hashed words,
+with a configurable per-call delay) and a fake LLM with configurable
+latency, over synthetic knowledge bases of increasing size. No model,
+API key or network access is needed, so results only reflect this
+code and the vector backend.
+
+For every corpus size it measures split_text throughput, load_knowledge_base
+ingest throughput, retrieval latency, and the p50/p95/p99 latency of
+RAGSystem.query (threads) and RAGSystem.aquery (asyncio, as the bot calls
+it) at each concurrency level; with --workers N, also through a pool of N
+RAG worker processes (RAG_WORKERS). Questions are generated, or replayed from a
+JSONL log whose lines have a "question", "query", "title" or "text" field.
+
+Results are written as JSON; pass an earlier result file with --compare to
+report latency and throughput changes against it (exit status 1 when a
+change exceeds --threshold percent).
+
+Usage:
+    python benchmarks/rag_pipeline.py [--sizes 64,256,1024] [--concurrency 1,4,16]
+    python benchmarks/rag_pipeline.py --queries-file queries.jsonl --output after.json --compare before.json
+    python benchmarks/rag_pipeline.py --workers 4 --embed-cpu-ms 5 --mode async
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from config import Config
+
+_WORDS = """
+club member meeting event room workshop project team schedule budget
+election officer president treasurer secretary volunteer sponsor hackathon
+tutorial lecture social dinner trip competition deadline registration fee
+discord channel announcement newsletter library campus building semester
+""".split()
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings that cost a fixed delay per call.
+
+    cpu_ms adds busy work per text, holding the GIL like a local model
+    would, so the benefit of worker processes shows.
+    """
+
+    def __init__(self, dimensions: int = 384, latency_ms: float = 0.0, cpu_ms: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency_ms / 1000
+        self.cpu = cpu_ms / 1000
+
+    def _embed(self, text: str) -> List[float]:
+        from lexical_index import tokenize
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dimensions] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.cpu:
+            deadline = time.perf_counter() + self.cpu * len(texts)
+            while time.perf_counter() < deadline:
+                pass
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class LatencyChatModel(BaseChatModel):
+    """Chat model that answers after a fixed latency plus uniform jitter."""
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    seed: int = 0
+    rng: Any = None
+
+    def model_post_init(self, context: Any):
+        self.rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-fake"
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _result(self, messages) -> ChatResult:
+        prompt_chars = sum(len(str(message.content)) for message in messages)
+        text = f"This answer was generated from a {prompt_chars} character prompt."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return self._result(messages)
+
+
+def write_corpus(directory: str, size_kib: int, file_kib: int = 16, seed: int = 0) -> int:
+    """
+    Write a synthetic knowledge base of about size_kib KiB of text files.
+
+    Returns:
+        The number of files written
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    files = max(1, size_kib // file_kib)
+    for number in range(files):
+        paragraphs, length = [], 0
+        while length < file_kib * 1024:
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                words = rng.choices(_WORDS, k=rng.randint(6, 18))
+                words.append(f"B{rng.randint(100, 999)}")
+                rng.shuffle(words)
+                sentences.append(" ".join(words).capitalize() + ".")
+            paragraphs.append(" ".join(sentences))
+            length += len(paragraphs[-1]) + 2
+        with open(os.path.join(directory, f"doc_{number:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(paragraphs))
+    return files
+
+
+def synthetic_questions(count: int, seed: int = 1) -> List[str]:
+    """Generate questions using the corpus vocabulary."""
+    rng = random.Random(seed)
+    templates = ["When is the {} {}?", "Where does the {} {} happen?", "Who runs the {} {} in room B{}?"]
+    return [
+        rng.choice(templates).format(rng.choice(_WORDS), rng.choice(_WORDS), rng.randint(100, 999))
+        for _ in range(count)
+    ]
+
+
+def load_queries(path: str) -> List[str]:
+    """Read questions from a JSONL query log."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                questions.append(entry)
+                continue
+            for field in ("question", "query", "title", "text"):
+                if isinstance(entry.get(field), str) and entry[field].strip():
+                    questions.append(entry[field].strip())
+                    break
+    if not questions:
+        raise SystemExit(f"No questions found in {path}")
+    return questions
+
+
+def latency_summary(seconds: List[float], wall_seconds: Optional[float] = None) -> dict:
+    """Return p50/p95/p99/mean latency in milliseconds (and throughput)."""
+    ordered = sorted(seconds)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    summary = {
+        "count": len(ordered),
+        "p50_ms": round(percentile(50), 3),
+        "p95_ms": round(percentile(95), 3),
+        "p99_ms": round(percentile(99), 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+    if wall_seconds:
+        summary["queries_per_second"] = round(len(ordered) / wall_seconds, 2)
+    return summary
+
+
+def time_sync_queries(rag, questions: List[str], concurrency: int) -> dict:
+    """Answer every question with RAGSystem.query on a pool of threads."""
+    def timed(question):
+        started = time.perf_counter()
+        rag.query(question)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, questions))
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+async def time_async_queries(rag, questions: List[str], concurrency: int) -> dict:
+    """Answer every question with RAGSystem.aquery from concurrent tasks."""
+    pending = list(reversed(questions))
+    latencies = []
+
+    async def worker():
+        while pending:
+            question = pending.pop()
+            started = time.perf_counter()
+            await rag.aquery(question)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+def benchmark_rag(config: dict, dim: int, embed_latency_ms: float, embed_cpu_ms: float,
+                  llm_latency_ms: float, llm_jitter_ms: float):
+    """RAGSystem with the benchmark fakes, created in each worker process of a RAGWorkerPool."""
+    from rag_system import RAGSystem
+
+    for name, value in config.items():
+        setattr(Config, name, value)
+    return RAGSystem(
+        embeddings=HashEmbeddings(dim, embed_latency_ms, embed_cpu_ms),
+        llm=LatencyChatModel(latency=llm_latency_ms / 1000, jitter=llm_jitter_ms / 1000)
+    )
+
+
+def time_worker_queries(questions: List[str], args) -> dict:
+    """Answer every question through a pool of RAG worker processes at each concurrency level."""
+    from worker_pool import RAGWorkerPool
+
+    # The workers open the index this process just built
+    config = {
+        name: getattr(Config, name)
+        for name in ("VECTOR_BACKEND", "NUMPY_INDEX_DIRECTORY", "CHROMA_PERSIST_DIRECTORY",
+                     "EMBEDDING_CACHE_PATH", "ANSWER_CACHE_ENABLED", "COALESCE_QUERIES")
+    }
+    pool = RAGWorkerPool(
+        args.workers,
+        factory="benchmarks.rag_pipeline:benchmark_rag",
+        factory_kwargs={
+            "config": config,
+            "dim": args.dim,
+            "embed_latency_ms": args.embed_latency_ms,
+            "embed_cpu_ms": args.embed_cpu_ms,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+        }
+    )
+    pool.start()
+    try:
+        return {
+            str(concurrency): asyncio.run(time_async_queries(pool, questions, concurrency))
+            for concurrency in args.concurrency
+        }
+    finally:
+        pool.shutdown()
+
+
+def run_corpus(size_kib: int, questions: List[str], args) -> dict:
+    """Build a knowledge base of one size and measure every stage against it."""
+    from chunking import split_text
+    from knowledge_loader import load_knowledge_base
+    from rag_system import RAGSystem
+
+    workdir = tempfile.mkdtemp(prefix="bench-rag-")
+    try:
+        knowledge_dir = os.path.join(workdir, "knowledge_base")
+        files = write_corpus(knowledge_dir, size_kib)
+        Config.CHROMA_PERSIST_DIRECTORY = os.path.join(workdir, "chroma_db")
+        Config.NUMPY_INDEX_DIRECTORY = os.path.join(workdir, "numpy_index")
+
+        texts = []
+        for name in sorted(os.listdir(knowledge_dir)):
+            with open(os.path.join(knowledge_dir, name), "r", encoding="utf-8") as f:
+                texts.append(f.read())
+        started = time.perf_counter()
+        chunks = sum(len(split_text(text)) for text in texts)
+        split_seconds = time.perf_counter() - started
+        corpus_mib = sum(len(text.encode("utf-8")) for text in texts) / (1024 * 1024)
+
+        rag = RAGSystem(
+            embeddings=HashEmbeddings(args.dim, args.embed_latency_ms, args.embed_cpu_ms),
+            llm=LatencyChatModel(latency=args.llm_latency_ms / 1000, jitter=args.llm_jitter_ms / 1000)
+        )
+        started = time.perf_counter()
+        load_knowledge_base(rag, knowledge_dir)
+        ingest_seconds = time.perf_counter() - started
+
+        embeddings = [rag.embeddings.embed_query(question) for question in questions]
+        rag._search(embeddings[0], questions[0])
+        latencies = []
+        for question, embedding in zip(questions, embeddings):
+            started = time.perf_counter()
+            rag._search(embedding, question)
+            latencies.append(time.perf_counter() - started)
+
+        result = {
+            "size_kib": size_kib,
+            "files": files,
+            "chunks": chunks,
+            "split": {
+                "seconds": round(split_seconds, 4),
+                "mib_per_second": round(corpus_mib / split_seconds, 2),
+                "chunks_per_second": round(chunks / split_seconds, 1),
+            },
+            "ingest": {
+                "seconds": round(ingest_seconds, 4),
+                "chunks_per_second": round(chunks / ingest_seconds, 1),
+            },
+            "retrieval": latency_summary(latencies),
+            "query": {"sync": {}, "async": {}},
+        }
+        for concurrency in args.concurrency:
+            if args.mode in ("sync", "both"):
+                result["query"]["sync"][str(concurrency)] = time_sync_queries(rag, questions, concurrency)
+            if args.mode in ("async", "both"):
+                result["query"]["async"][str(concurrency)] = asyncio.run(
+                    time_async_queries(rag, questions, concurrency)
+                )
+            # The query semaphore belongs to the event loop that created it
+            rag._query_semaphore = None
+        if args.workers:
+            result["query"]["workers"] = time_worker_queries(questions, args)
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit() -> Optional[str]:
+    """Return the checked-out commit, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: dict) -> dict:
+    """Map "size/stage/..." paths to the comparable numbers of a result file."""
+    metrics = {}
+    for corpus in results["corpora"]:
+        prefix = f"{corpus['size_kib']}KiB"
+        metrics[f"{prefix}/split/mib_per_second"] = corpus["split"]["mib_per_second"]
+        metrics[f"{prefix}/ingest/chunks_per_second"] = corpus["ingest"]["chunks_per_second"]
+        for name in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"{prefix}/retrieval/{name}"] = corpus["retrieval"][name]
+        for mode, levels in corpus["query"].items():
+            for concurrency, summary in levels.items():
+                for name in ("p50_ms", "p95_ms", "p99_ms", "queries_per_second"):
+                    metrics[f"{prefix}/{mode}_query_c{concurrency}/{name}"] = summary[name]
+    return metrics
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    Print the change of every metric found in both result files.
+
+    Returns:
+        True if any metric got worse by more than threshold percent
+    """
+    old, new = flatten(baseline), flatten(current)
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} (threshold {threshold:.0f}%)")
+    regressed = False
+    for key in sorted(old.keys() & new.keys()):
+        if not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        # Latencies should go down, throughputs up
+        worse = change > threshold if key.endswith("_ms") else change < -threshold
+        regressed |= worse
+        marker = "  REGRESSION" if worse else ""
+        print(f"  {key:<45} {old[key]:>10.3f} -> {new[key]:>10.3f} ({change:+6.1f}%){marker}")
+    return regressed
+
+
+def print_results(results: dict):
+    for corpus in results["corpora"]:
+        print(
+            f"\n{corpus['size_kib']} KiB, {corpus['files']} files, {corpus['chunks']} chunks: "
+            f"split {corpus['split']['mib_per_second']} MiB/s, "
+            f"ingest {corpus['ingest']['chunks_per_second']} chunks/s, "
+            f"retrieval p50 {corpus['retrieval']['p50_ms']} ms / p95 {corpus['retrieval']['p95_ms']} ms"
+        )
+        print(f"  {'mode':<7} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'q/s':>9}")
+        for mode, levels in corpus["query"].items():
+            for concurrency, s in levels.items():
+                print(
+                    f"  {mode:<7} {concurrency:>5} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                    f"{s['p99_ms']:>9.2f} {s['queries_per_second']:>9.1f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="64,256,1024", help="corpus sizes in KiB, comma-separated")
+    parser.add_argument("--concurrency", default="1,4,16", help="concurrency levels, comma-separated")
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    parser.add_argument("--queries", type=int, default=200, help="questions per run")
+    parser.add_argument("--queries-file", help="JSONL query log to replay instead of generated questions")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-latency-ms", type=float, default=2.0, help="delay of every embedding call")
+    parser.add_argument("--embed-cpu-ms", type=float, default=0.0, help="CPU time of every embedded text")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier result file to compare with")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--with-caches", action="store_true",
+                        help="keep the answer cache and query coalescing on (repeated questions get faster)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="also measure aquery through this many RAG worker processes (numpy backend)")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+    sizes = [int(value) for value in args.sizes.split(",")]
+
+    if args.queries_file:
+        replay = load_queries(args.queries_file)
+        questions = [replay[i % len(replay)] for i in range(max(args.queries, len(replay)))]
+    else:
+        questions = synthetic_questions(args.queries)
+
+    # Isolated, in-memory state; every question goes through retrieval and the LLM
+    Config.EMBEDDING_CACHE_PATH = ""
+    if not args.with_caches:
+        Config.ANSWER_CACHE_ENABLED = False
+        Config.COALESCE_QUERIES = False
+    if args.workers:
+        # Worker processes share the index, which Chroma's local store doesn't support
+        Config.VECTOR_BACKEND = "numpy"
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "settings": {
+            "vector_backend": Config.VECTOR_BACKEND,
+            "hybrid_search": Config.HYBRID_SEARCH,
+            "retrieval_k": Config.RETRIEVAL_K,
+            "max_concurrent_queries": Config.MAX_CONCURRENT_QUERIES,
+            "questions": len(questions),
+            "queries_file": args.queries_file,
+            "dim": args.dim,
+            "embed_latency_ms": args.embed_latency_ms,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "with_caches": args.with_caches,
+            "embed_cpu_ms": args.embed_cpu_ms,
+            "workers": args.workers,
+        },
+        "corpora": [],
+    }
+    for size in sizes:
+        print(f"[bench] {size} KiB corpus...")
+        results["corpora"].append(run_corpus(size, questions, args))
+
+    print_results(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[OK] Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compare query latency and memory of the Chroma and NumPy vector backends.
+
+Each backend runs in its own process so their resident set sizes don't mix.
+The benchmark uses random unit vectors, so no embedding model is needed.
+
+Usage:
+    python benchmarks/vector_backends.py [--chunks 5000] [--dim 384] [--queries 500]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mib() -> float:
+    """Return the current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(backend: str, chunks: int, dim: int, queries: int, k: int) -> dict:
+    """Build an index with one backend, reopen it and time searches against it."""
+    import numpy as np
+    from vector_index import ChromaIndex, NumpyIndex
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc.txt::{i}" for i in range(chunks)]
+    texts = [f"chunk {i}" for i in range(chunks)]
+    metadatas = [{"source": "doc.txt", "chunk_index": i} for i in range(chunks)]
+    query_vectors = rng.standard_normal((queries, dim)).astype(np.float32).tolist()
+
+    directory = tempfile.mkdtemp(prefix=f"bench-{backend}-")
+    if backend == "chroma":
+        import chromadb
+
+        def open_index():
+            return ChromaIndex(chromadb.PersistentClient(path=directory), "bench", None)
+    else:
+        def open_index():
+            return NumpyIndex(os.path.join(directory, "bench"), "bench", None)
+
+    started = time.perf_counter()
+    index = open_index()
+    for start in range(0, chunks, 1000):
+        end = start + 1000
+        index.write(ids[start:end], vectors[start:end], texts[start:end], metadatas[start:end])
+    index.flush()
+    build_seconds = time.perf_counter() - started
+    del index, vectors
+
+    # Measure a freshly opened index, as the bot sees it after a restart
+    rss_before = rss_mib()
+    started = time.perf_counter()
+    index = open_index()
+    open_seconds = time.perf_counter() - started
+    for vector in query_vectors[:10]:
+        index.search(vector, k=k)
+
+    latencies = []
+    for vector in query_vectors:
+        started = time.perf_counter()
+        index.search(vector, k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    rss_after = rss_mib()
+    del index
+    shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "backend": backend,
+        "chunks": chunks,
+        "dim": dim,
+        "build_seconds": round(build_seconds, 3),
+        "open_seconds": round(open_seconds, 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "rss_mib": round(rss_after, 1),
+        "rss_index_mib": round(rss_after - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.chunks, args.dim, args.queries, args.k)))
+        return
+
+    results = []
+    for backend in ("chroma", "numpy"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--backend", backend,
+             "--chunks", str(args.chunks), "--dim", str(args.dim),
+             "--queries", str(args.queries), "--k", str(args.k)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}\n")
+    print(f"{'backend':<8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'open s':>7} {'build s':>8} {'RSS MiB':>8} {'index MiB':>10}")
+    for r in results:
+        print(
+            f"{r['backend']:<8} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['mean_ms']:>8.3f} "
+            f"{r['open_seconds']:>7.2f} {r['build_seconds']:>8.2f} {r['rss_mib']:>8.1f} {r['rss_index_mib']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,196 @@
 """Discord bot for RAG-based club information."""
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import contextlib
+import os
+from datetime import datetime
+
 import discord
 from discord.ext import commands
+
+from answer_length import ErrorMessage, fit_text, paginate
 from config import Config
-from rag_system import RAGSystem
-import asyncio
+from metrics import LLM_TOKENS, REGISTRY, REQUESTS, STAGE_SECONDS, Histogram, start_http_server
+from scheduler import QueryScheduler, RateLimited, SchedulerBusy
+import tracing
+from tracing import PROFILE_CAPTURE, SlowQueryLog, record_stage, stage, trace_request, use_trace
+from worker_pool import RAGWorkerPool
 
-# Validate configuration
-Config.validate()
+# The bot and its scheduler are created by init_bot() when the bot starts, so
+# importing this module has no side effects: processes started with the
+# spawn method (e.g. knowledge base parse workers) re-import the main module
+bot = None
+scheduler = None
 
-# Initialize bot with intents
-intents = discord.Intents.default()
-intents.message_content = True
-# intents.members = True  # Optional - only needed for member-related features
+# The RAG system is created in the background after the gateway connection
+# starts (see setup_hook), so loading the embedding model doesn't delay login.
+# With RAG_WORKERS set it is a RAGWorkerPool answering in separate processes.
+rag = None
+rag_ready = None
 
-bot = commands.Bot(command_prefix=Config.BOT_PREFIX, intents=intents)
+# Order of the stages in !stats
+STATS_STAGES = (
+    "request", "queue_wait", "worker", "embed", "retrieve", "generate", "llm",
+    "llm_first_token", "first_reply", "discord_reply", "query"
+)
 
-# Initialize RAG system
-rag = RAGSystem()
+# Reaction the asker adds to a paginated answer to get its next page
+NEXT_PAGE_EMOJI = "⏬"
+# Tasks waiting for those reactions, kept referenced until they finish
+_page_tasks = set()
 
 
-@bot.event
-async def on_ready():
-    """Called when the bot is ready."""
-    print(f'{bot.user} has connected to Discord!')
-    print(f'Bot is in {len(bot.guilds)} guild(s)')
+def register_metrics():
+    """Export counters the RAG system and scheduler already keep, read when scraped."""
+    # One scrape reads several values; with worker processes each stats()
+    # call is a round trip to all of them, so reuse it briefly
+    cached = {"at": 0.0, "stats": None}
+    
+    def from_rag(read):
+        def value():
+            if rag is None:
+                return None
+            if time.monotonic() - cached["at"] > 1.0:
+                cached["stats"], cached["at"] = rag.stats(), time.monotonic()
+            return read(cached["stats"])
+        return value
+    
+    def cache_counts(stats, field):
+        counts = {}
+        if stats.get("faq") is not None:
+            counts["faq"] = stats["faq"][field]
+        if stats.get("answer_cache") is not None:
+            counts["answer"] = stats["answer_cache"][field]
+        if stats.get("embedding_cache") is not None:
+            counts["embedding"] = stats["embedding_cache"][field]
+        return counts
+    
+    def section(name, field):
+        return lambda stats: stats[name][field] if stats.get(name) is not None else None
     
+    REGISTRY.callback("ragbot_queue_depth", "Questions waiting for a scheduler worker",
+                      lambda: scheduler.stats()["queued"])
+    REGISTRY.callback("ragbot_active_queries", "Questions being answered",
+                      lambda: scheduler.stats()["active"])
+    REGISTRY.callback("ragbot_cache_hits_total", "Cache hits", from_rag(lambda r: cache_counts(r, "hits")),
+                      kind="counter", labelname="cache")
+    REGISTRY.callback("ragbot_cache_misses_total", "Cache misses", from_rag(lambda r: cache_counts(r, "misses")),
+                      kind="counter", labelname="cache")
+    REGISTRY.callback("ragbot_coalesced_queries_total", "Questions answered by an identical question in flight",
+                      from_rag(section("coalescing", "coalesced")), kind="counter")
+    REGISTRY.callback("ragbot_query_embedding_batches_total", "Model calls embedding batched questions",
+                      from_rag(section("query_batching", "batches")), kind="counter")
+    REGISTRY.callback("ragbot_index_chunks", "Chunks in the active knowledge base collection",
+                      from_rag(lambda s: s.get("index_chunks")))
+    REGISTRY.callback("ragbot_llm_router_total", "Hedged and failed-over LLM calls",
+                      from_rag(lambda s: {"hedged": s["llm_router"]["hedged"], "failover": s["llm_router"]["failovers"]}
+                               if s.get("llm_router") is not None else None),
+                      kind="counter", labelname="event")
+    REGISTRY.callback("ragbot_rag_workers", "RAG worker processes, by state",
+                      from_rag(lambda s: {"alive": sum(w["alive"] for w in s["workers"]),
+                                          "down": sum(not w["alive"] for w in s["workers"])}
+                               if "workers" in s else None),
+                      labelname="state")
+    REGISTRY.callback("ragbot_rag_worker_restarts_total", "RAG worker processes restarted after exiting",
+                      from_rag(lambda s: sum(w["restarts"] for w in s["workers"]) if "workers" in s else None),
+                      kind="counter")
+
+
+def ensure_knowledge_base(rag_system):
+    """Index the knowledge base files if the active collection is empty."""
     # Auto-load knowledge base if it doesn't exist
     try:
-        # Check if knowledge base collection exists and has data
-        try:
-            collection = rag.client.get_collection(name="club_knowledge")
-            count = collection.count()
-            if count == 0:
-                print("Knowledge base is empty, loading from files...")
-                from knowledge_loader import load_knowledge_base
-                load_knowledge_base(rag)
-                # Re-initialize vectorstore after loading
-                rag.vectorstore = Chroma(
-                    client=rag.client,
-                    collection_name="club_knowledge",
-                    embedding_function=rag.embeddings
-                )
-                # Re-create QA chain with new vectorstore
-                from langchain_core.runnables import RunnablePassthrough
-                from langchain_core.output_parsers import StrOutputParser
-                retriever = rag.vectorstore.as_retriever(search_kwargs={"k": 4})
-                def format_docs(docs):
-                    return "\n\n".join(doc.page_content for doc in docs)
-                rag.qa_chain = (
-                    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-                    | rag.prompt_template
-                    | rag.llm
-                    | StrOutputParser()
-                )
-                print("Knowledge base loaded successfully!")
-            else:
-                print(f"Knowledge base already loaded ({count} chunks)")
-        except Exception as e:
-            # Collection doesn't exist, create and load it
-            print(f"Knowledge base collection not found ({e}), creating and loading...")
-            from knowledge_loader import load_knowledge_base
-            load_knowledge_base(rag)
-            # Re-initialize vectorstore after loading
-            from langchain_community.vectorstores import Chroma
-            from langchain_core.runnables import RunnablePassthrough
-            from langchain_core.output_parsers import StrOutputParser
-            rag.vectorstore = Chroma(
-                client=rag.client,
-                collection_name="club_knowledge",
-                embedding_function=rag.embeddings
-            )
-            # Re-create QA chain
-            retriever = rag.vectorstore.as_retriever(search_kwargs={"k": 4})
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-            rag.qa_chain = (
-                {"context": retriever | format_docs, "question": RunnablePassthrough()}
-                | rag.prompt_template
-                | rag.llm
-                | StrOutputParser()
-            )
+        count = rag_system.index.count()
+        if count == 0:
+            print("Knowledge base is empty, loading from files...")
+            rag_system.reload_knowledge_base()
             print("Knowledge base loaded successfully!")
+        else:
+            print(f"Knowledge base already loaded ({count} chunks)")
     except Exception as e:
         print(f"Warning: Could not auto-load knowledge base: {e}")
         print("Use !reload_kb command to load it manually.")
         import traceback
         traceback.print_exc()
+
+
+async def prepare_rag():
+    """Create, populate and warm up the RAG system off the event loop."""
+    global rag
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        if Config.RAG_WORKERS:
+            # The workers index the knowledge base and warm up themselves
+            pool = RAGWorkerPool(
+                Config.RAG_WORKERS,
+                start_timeout=Config.RAG_WORKER_START_TIMEOUT,
+                metrics_port=Config.METRICS_PORT
+            )
+            await loop.run_in_executor(None, pool.start)
+            rag = pool
+            print(f"[startup] RAG workers ready {time.perf_counter() - started:.2f}s after startup began")
+            return
+        
+        # Imported here: it pulls in LangChain, which the module import avoids
+        from rag_system import RAGSystem
+        rag_system = await loop.run_in_executor(None, RAGSystem)
+        print(f"[startup] RAG system initialized in {time.perf_counter() - started:.2f}s")
+        await loop.run_in_executor(None, ensure_knowledge_base, rag_system)
+        await loop.run_in_executor(None, rag_system.warm_up)
+        rag = rag_system
+        print(f"[startup] RAG system ready {time.perf_counter() - started:.2f}s after startup began")
+    except Exception as e:
+        print(f"Error initializing RAG system: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        rag_ready.set()
+
+
+async def wait_for_rag(timeout: float):
+    """
+    Wait up to timeout seconds for the RAG system to finish warming up.
+    
+    Returns:
+        The RAG system, or None if it isn't ready (or failed to start)
+    """
+    if not rag_ready.is_set():
+        try:
+            await asyncio.wait_for(rag_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+    return rag
+
+
+async def reply_not_ready(target):
+    """Tell the user the bot can't answer yet."""
+    if rag_ready.is_set():
+        await target.reply("❌ The knowledge base failed to start. Please tell an admin to check the logs.")
+    else:
+        await target.reply("🔄 I'm still warming up. Please ask again in a few seconds!")
+
+
+async def setup_hook():
+    """Start warming up the RAG system while the gateway connection is made."""
+    global rag_ready
+    rag_ready = asyncio.Event()
+    asyncio.create_task(prepare_rag())
+    
+    if Config.METRICS_PORT:
+        try:
+            start_http_server(Config.METRICS_PORT, Config.METRICS_HOST)
+            print(f"[startup] Serving metrics on http://{Config.METRICS_HOST}:{Config.METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"[!] Could not serve metrics on port {Config.METRICS_PORT}: {e}")
+
+
+async def on_ready():
+    """Called when the bot is ready."""
+    print(f'{bot.user} has connected to Discord!')
+    print(f'Bot is in {len(bot.guilds)} guild(s)')
     
     await bot.change_presence(
         activity=discord.Activity(
@@ -95,7 +200,167 @@ async def on_ready():
     )
 
 
-@bot.event
+def answer_pages(answer: str) -> list:
+    """Split an answer into the messages it is sent as (one unless Config.PAGINATE_ANSWERS)."""
+    return paginate(answer, max_pages=Config.ANSWER_MAX_PAGES if Config.PAGINATE_ANSWERS else 1)
+
+
+async def send_pages_on_reaction(author, message, pages: list):
+    """
+    Send the rest of a paginated answer, one page each time the asker reacts.
+    
+    The bot adds NEXT_PAGE_EMOJI to the last page sent and waits up to
+    Config.PAGE_REACTION_TIMEOUT seconds for the asker to add it too;
+    overflow nobody asks for is never sent.
+    
+    Args:
+        author: The user who asked the question
+        message: The reply holding the first page
+        pages: The remaining pages
+    """
+    for page in pages:
+        def is_next_page_request(reaction, user, message=message):
+            return (
+                reaction.message.id == message.id
+                and user == author
+                and str(reaction.emoji) == NEXT_PAGE_EMOJI
+            )
+        
+        try:
+            await message.add_reaction(NEXT_PAGE_EMOJI)
+            await bot.wait_for("reaction_add", check=is_next_page_request, timeout=Config.PAGE_REACTION_TIMEOUT)
+        except asyncio.TimeoutError:
+            with contextlib.suppress(discord.HTTPException):
+                await message.remove_reaction(NEXT_PAGE_EMOJI, bot.user)
+            return
+        except discord.HTTPException:
+            # Not allowed to react here
+            return
+        message = await message.reply(page)
+
+
+def offer_more_pages(target, message, pages: list):
+    """Send the pages after the first in the background, as the asker reacts for them."""
+    if not pages:
+        return
+    task = asyncio.create_task(send_pages_on_reaction(target.author, message, pages))
+    _page_tasks.add(task)
+    task.add_done_callback(_page_tasks.discard)
+
+
+async def send_streamed_reply(target, stream):
+    """
+    Reply with a streamed answer, editing the reply as more text arrives.
+    
+    The reply is posted as soon as the first text arrives and then edited
+    at most once every Config.STREAM_EDIT_INTERVAL seconds to stay within
+    Discord's rate limits. Only the first page of the answer is shown;
+    with Config.PAGINATE_ANSWERS the asker can react for the rest.
+    
+    Args:
+        target: Message or command context to reply to
+        stream: Async generator of answer pieces; an ErrorMessage replaces
+            the text before it. It is closed when the reply is done or fails.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    reply = None
+    shown = ""
+    text = ""
+    last_edit = 0.0
+    
+    async with contextlib.aclosing(stream):
+        async for piece in stream:
+            text = piece if isinstance(piece, ErrorMessage) else text + piece
+            if not text.strip():
+                continue
+            
+            now = loop.time()
+            if reply is None:
+                shown = answer_pages(text)[0]
+                with stage("discord_reply"):
+                    reply = await target.reply(shown)
+                record_stage("first_reply", started)
+                last_edit = now
+            elif now - last_edit >= Config.STREAM_EDIT_INTERVAL:
+                content = answer_pages(text)[0]
+                if content != shown:
+                    shown = content
+                    with stage("discord_reply"):
+                        await reply.edit(content=shown)
+                    last_edit = now
+    
+    pages = answer_pages(text) or ["I couldn't come up with an answer to that."]
+    with stage("discord_reply"):
+        if reply is None:
+            reply = await target.reply(pages[0])
+            record_stage("first_reply", started)
+        elif pages[0] != shown:
+            await reply.edit(content=pages[0])
+    offer_more_pages(target, reply, pages[1:])
+
+
+async def answer_question(target, question: str, priority: int = QueryScheduler.PRIORITY_MENTION):
+    """
+    Queue a question and answer it in reply to a message or command context.
+    
+    Replies right away instead if the asker is over their quota, the
+    queue is full, or the RAG system is still warming up.
+    """
+    guild_id = target.guild.id if target.guild is not None else None
+    with trace_request("question", question, user_id=target.author.id, guild_id=guild_id) as trace:
+        received = time.perf_counter()
+        if await wait_for_rag(Config.WARMUP_WAIT_SECONDS) is None:
+            REQUESTS.inc("not_ready")
+            await reply_not_ready(target)
+            return
+        
+        queued = time.perf_counter()
+        
+        async def job():
+            # Runs in a scheduler worker task, which doesn't see our context
+            with use_trace(trace):
+                record_stage("queue_wait", queued)
+                await send_answer(target, question)
+        
+        try:
+            await scheduler.submit(
+                job,
+                user_id=target.author.id,
+                guild_id=guild_id,
+                priority=priority
+            )
+            REQUESTS.inc("answered")
+            record_stage("request", received)
+        except RateLimited as e:
+            REQUESTS.inc("rate_limited")
+            who = "You're" if e.scope == "user" else "This server is"
+            await target.reply(
+                f"⏳ {who} asking questions too quickly. Please try again in {e.retry_after:.0f}s."
+            )
+        except SchedulerBusy:
+            REQUESTS.inc("busy")
+            await target.reply("🚦 I'm busy answering other questions right now. Please try again in a moment.")
+        except Exception:
+            REQUESTS.inc("error")
+            raise
+
+
+async def send_answer(target, question: str):
+    """Answer a question in reply to a message or command context."""
+    if Config.STREAM_RESPONSES:
+        await send_streamed_reply(target, rag.astream(question))
+    else:
+        # Get answer from RAG system without blocking the event loop
+        started = time.perf_counter()
+        answer = await rag.aquery(question)
+        pages = answer_pages(answer) or ["I couldn't come up with an answer to that."]
+        with stage("discord_reply"):
+            reply = await target.reply(pages[0])
+        record_stage("first_reply", started)
+        offer_more_pages(target, reply, pages[1:])
+
+
 async def on_message(message):
     """Handle incoming messages."""
     # Ignore messages from the bot itself
@@ -131,11 +396,8 @@ async def on_message(message):
             # Show typing indicator
             async with message.channel.typing():
                 try:
-                    # Get answer from RAG system
-                    answer = rag.query(query)
-                    
-                    # Send response
-                    await message.reply(answer)
+                    # Get answer from RAG system and send it
+                    await answer_question(message, query)
                 except Exception as e:
                     await message.reply(f"Sorry, I encountered an error: {str(e)}")
             return
@@ -144,7 +406,7 @@ async def on_message(message):
     await bot.process_commands(message)
 
 
-@bot.command(name='info', aliases=['h', 'about'])
+@commands.command(name='info', aliases=['h', 'about'])
 async def info_command(ctx):
     """Display help information."""
     help_text = f"""
@@ -161,6 +423,13 @@ I'm a RAG (Retrieval-Augmented Generation) bot that can answer questions about t
 - `{Config.BOT_PREFIX}ask <question>` - Ask a question about the club
 - `{Config.BOT_PREFIX}ping` - Check if the bot is online
 
+**Admin commands:**
+- `{Config.BOT_PREFIX}reload_kb` - Reload the knowledge base from files
+- `{Config.BOT_PREFIX}clear_kb` - Clear the knowledge base
+- `{Config.BOT_PREFIX}stats` - Show latency, token, cache and queue statistics
+- `{Config.BOT_PREFIX}cache_stats` - Show the answer cache hit rate
+- `{Config.BOT_PREFIX}profile [questions]` - Profile the next questions (default 10) for a flamegraph
+
 **Example:**
 @{bot.user.name} What are the meeting times?
 or
@@ -169,7 +438,7 @@ or
     await ctx.send(help_text)
 
 
-@bot.command(name='ask')
+@commands.command(name='ask')
 async def ask_command(ctx, *, question: str):
     """Ask a question about the club."""
     if not question:
@@ -178,50 +447,242 @@ async def ask_command(ctx, *, question: str):
     
     async with ctx.channel.typing():
         try:
-            answer = rag.query(question)
-            await ctx.reply(answer)
+            await answer_question(ctx, question, priority=QueryScheduler.PRIORITY_COMMAND)
         except Exception as e:
             await ctx.reply(f"Sorry, I encountered an error: {str(e)}")
 
 
-@bot.command(name='ping')
+@commands.command(name='ping')
 async def ping_command(ctx):
     """Check bot latency."""
     latency = round(bot.latency * 1000)
     await ctx.send(f"Pong! Latency: {latency}ms")
 
 
-@bot.command(name='reload_kb')
+@commands.command(name='reload_kb')
 @commands.has_permissions(administrator=True)
 async def reload_knowledge_base(ctx):
     """Reload the knowledge base from files (admin only)."""
+    if await wait_for_rag(0) is None:
+        await reply_not_ready(ctx)
+        return
+    
     await ctx.send("Reloading knowledge base...")
     try:
-        from knowledge_loader import load_knowledge_base
-        load_knowledge_base(rag)
-        await ctx.send("✅ Knowledge base reloaded successfully!")
+        # Built in a new collection off the event loop; questions keep being
+        # answered from the current one until it is swapped in
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(None, rag.reload_knowledge_base)
+        faq = summary.get("faq")
+        await ctx.send(
+            f"✅ Knowledge base reloaded successfully! "
+            f"({summary['upserted']} chunks updated, {summary['deleted']} removed, "
+            f"{summary['unchanged_files']} files unchanged"
+            + (f"; {faq['generated']} FAQ answers regenerated, {faq['reused']} unchanged" if faq and faq["questions"] else "")
+            + ")"
+        )
     except Exception as e:
         await ctx.send(f"❌ Error reloading knowledge base: {str(e)}")
 
 
-@bot.command(name='clear_kb')
+@commands.command(name='clear_kb')
 @commands.has_permissions(administrator=True)
 async def clear_knowledge_base(ctx):
     """Clear the knowledge base (admin only)."""
-    rag.clear_knowledge_base()
+    if await wait_for_rag(0) is None:
+        await reply_not_ready(ctx)
+        return
+    
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, rag.clear_knowledge_base)
     await ctx.send("✅ Knowledge base cleared!")
 
 
+@commands.command(name='cache_stats')
+@commands.has_permissions(administrator=True)
+async def cache_stats_command(ctx):
+    """Show answer cache hit rate (admin only)."""
+    if await wait_for_rag(0) is None:
+        await reply_not_ready(ctx)
+        return
+    
+    loop = asyncio.get_running_loop()
+    stats = (await loop.run_in_executor(None, rag.stats)).get("answer_cache")
+    if stats is None:
+        await ctx.send("Answer cache is disabled.")
+        return
+    
+    await ctx.send(
+        f"**Answer cache**\n"
+        f"Entries: {stats['entries']} ({stats['bytes'] / 1024:.1f} KiB)\n"
+        f"Hits: {stats['hits']} / Misses: {stats['misses']} "
+        f"(hit rate {stats['hit_rate']:.1%})\n"
+        f"Evictions: {stats['evictions']} / Invalidations: {stats['invalidations']}\n"
+        f"Similarity threshold: {stats['threshold']}"
+    )
+
+
+@commands.command(name='stats')
+@commands.has_permissions(administrator=True)
+async def stats_command(ctx):
+    """Show per-stage latency, token counts, cache hit rates and queue depth (admin only)."""
+    stats = None
+    stage_seconds, llm_tokens = STAGE_SECONDS, LLM_TOKENS
+    if rag is not None:
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, rag.stats)
+        if "stage_seconds" in stats:
+            # Add the stages recorded in the worker processes
+            stage_seconds = Histogram(STAGE_SECONDS.name, STAGE_SECONDS.help, STAGE_SECONDS.labelnames, STAGE_SECONDS.buckets)
+            stage_seconds.merge(STAGE_SECONDS.export())
+            stage_seconds.merge(stats["stage_seconds"].export())
+            llm_tokens = stats["llm_tokens"]
+    
+    lines = ["**Latency** (p50 / p95, estimated from histogram buckets)"]
+    for name in STATS_STAGES:
+        summary = stage_seconds.summary(name)
+        if summary is not None:
+            lines.append(
+                f"`{name:<16}` {summary['p50'] * 1000:>7.0f} ms / {summary['p95'] * 1000:>7.0f} ms "
+                f"({summary['count']} samples)"
+            )
+    if len(lines) == 1:
+        lines.append("No questions answered yet.")
+    
+    prompt, completion = llm_tokens.summary("prompt"), llm_tokens.summary("completion")
+    if prompt is not None and completion is not None:
+        lines.append(
+            f"\n**LLM tokens per call**: {prompt['mean']:.0f} prompt / {completion['mean']:.0f} completion "
+            f"({prompt['count']} calls)"
+        )
+    
+    outcomes = {outcome: int(REQUESTS.value(outcome))
+                for outcome in ("answered", "busy", "rate_limited", "not_ready", "error")}
+    queue = scheduler.stats()
+    lines.append(
+        "\n**Questions**: " + ", ".join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in outcomes.items())
+    )
+    lines.append(f"**Queue**: {queue['queued']} waiting, {queue['active']} being answered")
+    
+    if stats is not None:
+        caches = []
+        if stats.get("faq") and stats["faq"]["questions"]:
+            caches.append(f"FAQ {stats['faq']['hit_rate']:.1%} ({stats['faq']['questions']} questions)")
+        if stats.get("answer_cache") is not None:
+            caches.append(f"answers {stats['answer_cache']['hit_rate']:.1%}")
+        if stats.get("embedding_cache") is not None:
+            caches.append(f"embeddings {stats['embedding_cache']['hit_rate']:.1%}")
+        if caches:
+            lines.append("**Cache hit rate**: " + ", ".join(caches))
+        if stats.get("coalescing") is not None:
+            lines.append(f"**Coalesced questions**: {stats['coalescing']['coalesced']}")
+        if stats.get("llm_router") is not None:
+            router = stats["llm_router"]
+            lines.append(f"**LLM router**: {router['hedged']} hedged, {router['failovers']} failovers")
+        if "workers" in stats:
+            lines.append("**Workers**: " + ", ".join(
+                f"#{w['number']} {'up' if w['alive'] else 'down'} ({w['requests']} requests, {w['restarts']} restarts)"
+                for w in stats["workers"]
+            ))
+    
+    await ctx.send(fit_text("\n".join(lines)))
+
+
+@commands.command(name='profile')
+@commands.has_permissions(administrator=True)
+async def profile_command(ctx, queries: int = 10):
+    """Profile the next questions and post a collapsed-stack file for a flamegraph (admin only)."""
+    # With worker processes each worker profiles its share and posts its own file
+    capture = rag.profile_capture if isinstance(rag, RAGWorkerPool) else PROFILE_CAPTURE
+    loop = asyncio.get_running_loop()
+    progress = await loop.run_in_executor(None, capture.progress)
+    if progress is not None:
+        await ctx.send(
+            f"⏱️ Already profiling: {progress['remaining']} question(s) to go, "
+            f"{progress['active']} in progress."
+        )
+        return
+    
+    queries = max(1, min(queries, Config.PROFILE_MAX_QUERIES))
+    path = os.path.join(Config.PROFILE_DIRECTORY, f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed")
+    
+    async def send_profile(written_path: str, samples: int):
+        message = f"✅ Profile ({samples} samples) written to `{written_path}`"
+        try:
+            await ctx.send(message, file=discord.File(written_path))
+        except discord.HTTPException:
+            # Too large to upload
+            await ctx.send(message)
+    
+    def done(written_path: str, samples: int):
+        # May be called from a worker thread
+        loop.call_soon_threadsafe(lambda: asyncio.ensure_future(send_profile(written_path, samples)))
+    
+    await loop.run_in_executor(
+        None, lambda: capture.arm(queries, path, interval=Config.PROFILE_INTERVAL_MS / 1000, on_done=done)
+    )
+    await ctx.send(f"⏱️ Profiling the next {queries} question(s)...")
+
+
 @reload_knowledge_base.error
 @clear_knowledge_base.error
+@cache_stats_command.error
+@stats_command.error
+@profile_command.error
 async def admin_error(ctx, error):
     """Handle permission errors for admin commands."""
     if isinstance(error, commands.MissingPermissions):
         await ctx.send("❌ You don't have permission to use this command.")
 
 
+def init_bot():
+    """Validate the configuration and create the bot, the scheduler and the metrics."""
+    global bot, scheduler
+    # Validate configuration
+    Config.validate()
+    
+    # Initialize bot with intents
+    intents = discord.Intents.default()
+    intents.message_content = True
+    # intents.members = True  # Optional - only needed for member-related features
+    
+    bot = commands.Bot(command_prefix=Config.BOT_PREFIX, intents=intents)
+    for event in (setup_hook, on_ready, on_message):
+        bot.event(event)
+    for command in (
+        info_command, ask_command, ping_command, reload_knowledge_base, clear_knowledge_base,
+        cache_stats_command, stats_command, profile_command
+    ):
+        bot.add_command(command)
+    
+    # Bounded, quota-enforcing queue in front of the RAG system
+    scheduler = QueryScheduler(
+        workers=Config.SCHEDULER_WORKERS,
+        max_queue=Config.SCHEDULER_QUEUE_SIZE,
+        user_rate_per_minute=Config.USER_QUERIES_PER_MINUTE,
+        user_burst=Config.USER_QUERY_BURST,
+        guild_rate_per_minute=Config.GUILD_QUERIES_PER_MINUTE,
+        guild_burst=Config.GUILD_QUERY_BURST
+    )
+    
+    register_metrics()
+    
+    # Requests slower than the threshold are written to a rotating JSONL trace log
+    if Config.SLOW_QUERY_LOG_ENABLED:
+        tracing.configure(SlowQueryLog(
+            Config.SLOW_QUERY_LOG_PATH,
+            threshold_seconds=Config.SLOW_QUERY_THRESHOLD_SECONDS,
+            max_bytes=Config.SLOW_QUERY_LOG_MAX_MB * 1024 * 1024,
+            backup_count=Config.SLOW_QUERY_LOG_BACKUPS
+        ))
+        print(f"[startup] Logging questions slower than {Config.SLOW_QUERY_THRESHOLD_SECONDS}s to {Config.SLOW_QUERY_LOG_PATH}")
+    return bot
+
+
 def main():
     """Run the bot."""
+    print(f"[startup] Imported bot modules in {time.perf_counter() - _import_started:.2f}s")
+    init_bot()
     try:
         bot.run(Config.DISCORD_BOT_TOKEN)
     except Exception as e:
@@ -0,0 +1,229 @@
+"""Token-aware text chunking for the knowledge base."""
+import itertools
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from config import Config
+
+# A chunk is built from units: lines, or sentences within a line. Each unit
+# remembers the separator that preceded it so chunks keep paragraph and
+# line structure.
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])[ \t]+")
+# Rough stand-in for a BPE tokenizer: up to four word characters or one
+# punctuation mark per token
+_FALLBACK_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Longest stretch of text without a paragraph break buffered while streaming
+_MAX_PENDING_CHARS = 64 * 1024
+
+_encoding = None
+_encoding_loaded = False
+
+
+def chunking_signature() -> str:
+    """
+    Describe the chunking settings; indexes built with other settings are re-chunked.
+
+    Includes the tokenizer actually used: chunks cut with the regex
+    approximation (tiktoken unavailable) differ from tiktoken's.
+    """
+    tokenizer = Config.CHUNK_TOKENIZER if _get_encoding() is not None else "regex"
+    return f"tokens:{tokenizer}:{Config.CHUNK_SIZE_TOKENS}:{Config.CHUNK_OVERLAP_TOKENS}"
+
+
+def _get_encoding():
+    """Load the tiktoken encoding once, or return None if it is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(Config.CHUNK_TOKENIZER)
+        except Exception as e:
+            print(f"[!] tiktoken encoding '{Config.CHUNK_TOKENIZER}' unavailable "
+                  f"({type(e).__name__}), approximating token counts")
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens in text."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_FALLBACK_TOKEN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of text with at most max_tokens tokens."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+
+    # Stop scanning at the first token past the limit
+    past_limit = next(itertools.islice(_FALLBACK_TOKEN.finditer(text), max_tokens, None), None)
+    if past_limit is None:
+        return text
+    return text[:past_limit.start()].rstrip()
+
+
+_SEPARATOR_RANK = {"": 0, " ": 1, "\n": 2, "\n\n": 3}
+
+
+def _stronger(separator: str, candidate: str) -> str:
+    return candidate if _SEPARATOR_RANK[candidate] > _SEPARATOR_RANK[separator] else separator
+
+
+def _iter_units(text: str, separator: str = "") -> Iterator[Tuple[str, str]]:
+    """Yield (separator, unit) pairs for a block of text."""
+    for paragraph_index, paragraph in enumerate(_PARAGRAPH_BREAK.split(text)):
+        if paragraph_index:
+            separator = _stronger(separator, "\n\n")
+        for line_index, line in enumerate(paragraph.split("\n")):
+            if line_index:
+                separator = _stronger(separator, "\n")
+            for sentence in _SENTENCE_BREAK.split(line):
+                sentence = sentence.strip()
+                if sentence:
+                    yield separator, sentence
+                    separator = " "
+
+
+def _iter_stream_units(windows: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield units from streamed text, cutting at paragraph breaks or whitespace.
+
+    Text with no whitespace at all is cut wherever it passes
+    _MAX_PENDING_CHARS, so the buffer (and each search of it) stays bounded.
+    """
+    buffer = ""
+    separator = ""
+    for window in windows:
+        buffer += window
+        cut = buffer.rfind("\n\n")
+        if cut <= 0 and len(buffer) > _MAX_PENDING_CHARS:
+            cut = max(buffer.rfind("\n"), buffer.rfind(" "))
+            if cut <= 0:
+                # Cut inside a word, which the next unit continues
+                yield from _iter_units(buffer, separator)
+                buffer, separator = "", ""
+                continue
+        if cut <= 0:
+            continue
+        block, buffer = buffer[:cut], buffer[cut:]
+        yield from _iter_units(block, separator)
+        # The remainder starts with the whitespace it was cut at, which
+        # upgrades this to the right separator
+        separator = " "
+    yield from _iter_units(buffer, separator)
+
+
+def _split_oversized(unit: str, chunk_size: int) -> Iterator[str]:
+    """Split a single unit longer than chunk_size tokens at word boundaries."""
+    words = unit.split(" ")
+    current, current_tokens = [], 0
+    for word in words:
+        tokens = count_tokens(word)
+        if tokens > chunk_size:
+            # A single enormous "word" (URL, blob): cut it by tokens
+            if current:
+                yield " ".join(current)
+                current, current_tokens = [], 0
+            while word:
+                piece = truncate_to_tokens(word, chunk_size) or word[:1]
+                yield piece
+                word = word[len(piece):]
+            continue
+        if current and current_tokens + tokens > chunk_size:
+            yield " ".join(current)
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += tokens
+    if current:
+        yield " ".join(current)
+
+
+def iter_chunks(
+    windows: Iterable[str],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Split text into chunks of at most chunk_size tokens, lazily.
+
+    Text is cut at line and sentence boundaries, with paragraph breaks kept
+    inside chunks. Consecutive chunks share up to chunk_overlap tokens of
+    whole sentences. Every unit is tokenized once, so the whole pass is
+    linear in the length of the text.
+
+    Args:
+        windows: The text, or consecutive pieces of it (e.g. file windows)
+        chunk_size: Maximum tokens per chunk (default: Config.CHUNK_SIZE_TOKENS)
+        chunk_overlap: Tokens shared between chunks (default: Config.CHUNK_OVERLAP_TOKENS)
+    """
+    if chunk_size is None:
+        chunk_size = Config.CHUNK_SIZE_TOKENS
+    if chunk_overlap is None:
+        chunk_overlap = Config.CHUNK_OVERLAP_TOKENS
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be between 0 and chunk_size - 1")
+
+    if isinstance(windows, str):
+        windows = [windows]
+
+    # (separator, unit, tokens) of the chunk being built
+    current: List[Tuple[str, str, int]] = []
+    current_tokens = 0
+    has_new_text = False
+
+    def render(units):
+        return units[0][1] + "".join(separator + unit for separator, unit, _ in units[1:])
+
+    for separator, unit in _iter_stream_units(windows):
+        tokens = count_tokens(unit)
+        pieces = [(unit, tokens)]
+        if tokens > chunk_size:
+            pieces = [(piece, count_tokens(piece)) for piece in _split_oversized(unit, chunk_size)]
+
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > chunk_size:
+                yield render(current)
+
+                # Carry whole trailing units into the next chunk as overlap
+                carried, carried_tokens = [], 0
+                for item in reversed(current):
+                    if carried_tokens + item[2] > chunk_overlap or carried_tokens + item[2] + piece_tokens > chunk_size:
+                        break
+                    carried.insert(0, item)
+                    carried_tokens += item[2]
+                current, current_tokens = carried, carried_tokens
+                has_new_text = False
+
+            current.append((separator, piece, piece_tokens))
+            current_tokens += piece_tokens
+            has_new_text = True
+            separator = " "
+
+    if current and has_new_text:
+        yield render(current)
+
+
+def split_text(text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks for better retrieval.
+
+    Args:
+        text: The text to split
+        chunk_size: Maximum tokens per chunk (default: Config.CHUNK_SIZE_TOKENS)
+        chunk_overlap: Tokens shared between chunks (default: Config.CHUNK_OVERLAP_TOKENS)
+
+    Returns:
+        List of text chunks
+    """
+    return list(iter_chunks([text], chunk_size, chunk_overlap))
@@ -30,17 +30,142 @@ class Config:
     # OpenAI Configuration (Optional)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "")
+    
+    # Provider failover: comma-separated providers tried after LLM_PROVIDER.
+    # A call still unanswered after the provider's HEDGE_PERCENTILE latency
+    # (HEDGE_DEFAULT_DELAY seconds until enough calls were seen) is also sent
+    # to the next provider, and the first answer is used
+    LLM_FALLBACK_PROVIDERS = [
+        name.strip().lower() for name in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(",") if name.strip()
+    ]
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "4.0"))
+    HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+    LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "100"))
+    # Pooled HTTP connections shared by the hosted LLM clients
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
     
     # Embedding Configuration (using sentence-transformers for free local embeddings)
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
     USE_OPENAI_EMBEDDINGS = os.getenv("USE_OPENAI_EMBEDDINGS", "false").lower() == "true"
     
-    # Vector Database
+    # Vector Database ("chroma", or "numpy" for an in-process index suited to small knowledge bases)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
     CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+    NUMPY_INDEX_DIRECTORY = os.getenv("NUMPY_INDEX_DIRECTORY", "./numpy_index")
+    
+    # Compact vectors for the numpy backend: int8 codes and/or fewer
+    # dimensions ("pca" or "truncate"; 0 keeps all), with the best
+    # RESCORE_CANDIDATES re-scored using the full float vectors
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+    VECTOR_DIMENSIONS = int(os.getenv("VECTOR_DIMENSIONS", "0"))
+    VECTOR_REDUCTION = os.getenv("VECTOR_REDUCTION", "pca").lower()
+    RESCORE_CANDIDATES = int(os.getenv("RESCORE_CANDIDATES", "32"))
+    
+    # Retrieval: chunks put in the prompt, and whether BM25 keyword matches
+    # are fused (reciprocal rank fusion) with the vector search results
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    
+    # Chunking (sizes in tokens; all-MiniLM-L6-v2 truncates input past 256 word pieces)
+    CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "200"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "30"))
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "cl100k_base")
+    
+    # Prompt context budget, in tokens (0 = unlimited)
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    
+    # Bulk Ingestion
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "1024"))
+    STREAM_FILE_THRESHOLD_BYTES = int(os.getenv("STREAM_FILE_THRESHOLD_BYTES", str(4 * 1024 * 1024)))
+    STREAM_WINDOW_CHARS = int(os.getenv("STREAM_WINDOW_CHARS", str(256 * 1024)))
+    # Processes parsing and chunking changed files (1 parses in-process), and
+    # comma-separated glob patterns of knowledge base paths not to index
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    KNOWLEDGE_EXCLUDE = os.getenv("KNOWLEDGE_EXCLUDE", "README.md")
+    
+    # Embedding Cache (set EMBEDDING_CACHE_PATH to empty to keep it in memory only)
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+    EMBEDDING_CACHE_PATH = os.getenv(
+        "EMBEDDING_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(CHROMA_PERSIST_DIRECTORY)), "embedding_cache.sqlite3")
+    )
+    
+    # Query Concurrency
+    MAX_CONCURRENT_QUERIES = int(os.getenv("MAX_CONCURRENT_QUERIES", "8"))
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+    # Questions arriving together are embedded in one batch (size 1 disables batching)
+    QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+    QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "5"))
+    
+    # RAG worker processes: queries run in this many separate processes
+    # sharing the index read-only (0 answers in the bot process itself)
+    RAG_WORKERS = int(os.getenv("RAG_WORKERS", "0"))
+    RAG_WORKER_START_TIMEOUT = float(os.getenv("RAG_WORKER_START_TIMEOUT", "600"))
+    
+    # Query Scheduling (bounded queue with per-user / per-guild quotas)
+    SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+    SCHEDULER_QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", "32"))
+    USER_QUERIES_PER_MINUTE = float(os.getenv("USER_QUERIES_PER_MINUTE", "6"))
+    USER_QUERY_BURST = int(os.getenv("USER_QUERY_BURST", "3"))
+    GUILD_QUERIES_PER_MINUTE = float(os.getenv("GUILD_QUERIES_PER_MINUTE", "60"))
+    GUILD_QUERY_BURST = int(os.getenv("GUILD_QUERY_BURST", "20"))
+    
+    # Coalesce identical questions that are being answered at the same time
+    COALESCE_QUERIES = os.getenv("COALESCE_QUERIES", "true").lower() == "true"
+    
+    # FAQ: answers to the canonical questions in FAQ_FILE (one per line) are
+    # generated when the knowledge base is indexed and served without an LLM call
+    FAQ_FILE = os.getenv("FAQ_FILE", "knowledge_base/faq/questions.txt")
+    FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.92"))
+    
+    # Answer Cache (reuses answers for near-duplicate questions)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_MAX_MB = int(os.getenv("ANSWER_CACHE_MAX_MB", "16"))
     
     # Bot Settings
     BOT_PREFIX = os.getenv("BOT_PREFIX", "!")
     MAX_MESSAGE_LENGTH = int(os.getenv("MAX_MESSAGE_LENGTH", "2000"))
+    WARMUP_WAIT_SECONDS = float(os.getenv("WARMUP_WAIT_SECONDS", "10"))
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+    
+    # Answer length: the LLM is asked for an answer that fits in one message
+    # (or ANSWER_MAX_PAGES messages when paginating) and its output is capped
+    # at ANSWER_MAX_TOKENS tokens (0 derives it from that character budget).
+    # Paginated answers show the first page; the asker reacts for the rest.
+    ANSWER_MAX_TOKENS = int(os.getenv("ANSWER_MAX_TOKENS", "0"))
+    PAGINATE_ANSWERS = os.getenv("PAGINATE_ANSWERS", "false").lower() == "true"
+    ANSWER_MAX_PAGES = int(os.getenv("ANSWER_MAX_PAGES", "3"))
+    PAGE_REACTION_TIMEOUT = float(os.getenv("PAGE_REACTION_TIMEOUT", "300"))
+    
+    # Metrics (Prometheus text format at http://METRICS_HOST:METRICS_PORT/metrics; port 0 disables it)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    
+    # Slow-query log: traces of questions taking at least the threshold are
+    # appended to a rotating JSONL file (off by default)
+    SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "false").lower() == "true"
+    SLOW_QUERY_THRESHOLD_SECONDS = float(os.getenv("SLOW_QUERY_THRESHOLD_SECONDS", "10"))
+    SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", "./logs/slow_queries.jsonl")
+    SLOW_QUERY_LOG_MAX_MB = int(os.getenv("SLOW_QUERY_LOG_MAX_MB", "10"))
+    SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+    
+    # Sampling profiles captured with the !profile admin command
+    PROFILE_DIRECTORY = os.getenv("PROFILE_DIRECTORY", "./profiles")
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_MAX_QUERIES = int(os.getenv("PROFILE_MAX_QUERIES", "50"))
     
     @classmethod
     def validate(cls):
@@ -48,22 +173,37 @@ class Config:
         if not cls.DISCORD_BOT_TOKEN:
             raise ValueError("DISCORD_BOT_TOKEN environment variable is required. Set it in Railway's Variables tab.")
         
-        # Validate LLM provider configuration
-        if cls.LLM_PROVIDER == "groq":
+        # Validate LLM provider configuration (the primary and every fallback)
+        for provider in [cls.LLM_PROVIDER] + cls.LLM_FALLBACK_PROVIDERS:
+            cls._validate_provider(provider)
+        
+        if cls.VECTOR_BACKEND not in ("chroma", "numpy"):
+            raise ValueError(f"Invalid VECTOR_BACKEND: {cls.VECTOR_BACKEND}. Must be one of: chroma, numpy")
+        if (cls.VECTOR_QUANTIZATION != "none" or cls.VECTOR_DIMENSIONS) and cls.VECTOR_BACKEND != "numpy":
+            raise ValueError("VECTOR_QUANTIZATION and VECTOR_DIMENSIONS require VECTOR_BACKEND=numpy")
+        if cls.RAG_WORKERS < 0:
+            raise ValueError("RAG_WORKERS must be 0 or more")
+        if cls.RAG_WORKERS and cls.VECTOR_BACKEND != "numpy":
+            raise ValueError("RAG_WORKERS requires VECTOR_BACKEND=numpy (Chroma's local store is not multi-process safe)")
+        
+        if cls.USE_OPENAI_EMBEDDINGS and not cls.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY is required when USE_OPENAI_EMBEDDINGS=true")
+    
+    @classmethod
+    def _validate_provider(cls, provider: str):
+        """Validate the configuration of one LLM provider."""
+        if provider == "groq":
             if not cls.GROQ_API_KEY:
-                raise ValueError("GROQ_API_KEY is required when LLM_PROVIDER=groq")
-        elif cls.LLM_PROVIDER == "ollama":
+                raise ValueError("GROQ_API_KEY is required when using the groq provider")
+        elif provider == "ollama":
             # Ollama doesn't need API key, just needs to be running locally
             pass
-        elif cls.LLM_PROVIDER == "deepseek":
+        elif provider == "deepseek":
             if not cls.DEEPSEEK_API_KEY:
-                raise ValueError("DEEPSEEK_API_KEY is required when LLM_PROVIDER=deepseek")
-        elif cls.LLM_PROVIDER == "openai":
+                raise ValueError("DEEPSEEK_API_KEY is required when using the deepseek provider")
+        elif provider == "openai":
             if not cls.OPENAI_API_KEY:
-                raise ValueError("OPENAI_API_KEY is required when LLM_PROVIDER=openai")
+                raise ValueError("OPENAI_API_KEY is required when using the openai provider")
         else:
-            raise ValueError(f"Invalid LLM_PROVIDER: {cls.LLM_PROVIDER}. Must be one of: groq, ollama, deepseek, openai")
-        
-        if cls.USE_OPENAI_EMBEDDINGS and not cls.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is required when USE_OPENAI_EMBEDDINGS=true")
+            raise ValueError(f"Invalid LLM provider: {provider}. Must be one of: groq, ollama, deepseek, openai")
 
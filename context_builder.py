@@ -0,0 +1,114 @@
+"""Assemble the {context} slot of the prompt from retrieved chunks."""
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from chunking import count_tokens, truncate_to_tokens
+from config import Config
+
+# Shorter suffix/prefix matches are treated as coincidence, not chunk overlap
+_MIN_OVERLAP_CHARS = 16
+
+
+def _overlap_length(previous: str, following: str) -> int:
+    """
+    Return the length of the longest suffix of previous that is also a prefix of following.
+
+    Uses the KMP prefix function over following + separator + tail of
+    previous, so the cost is linear in the chunk length.
+    """
+    limit = min(len(previous), len(following))
+    if limit < _MIN_OVERLAP_CHARS:
+        return 0
+
+    text = following[:limit] + "\0" + previous[-limit:]
+    prefix = [0] * len(text)
+    for i in range(1, len(text)):
+        k = prefix[i - 1]
+        while k and text[i] != text[k]:
+            k = prefix[k - 1]
+        if text[i] == text[k]:
+            k += 1
+        prefix[i] = k
+
+    overlap = prefix[-1]
+    return overlap if overlap >= _MIN_OVERLAP_CHARS else 0
+
+
+def _merge_sections(docs: List[Document]) -> List[str]:
+    """
+    Merge retrieved chunks into sections of contiguous text.
+
+    Chunks from the same source with consecutive chunk_index values are
+    joined into one section with their shared overlap removed. Sections are
+    returned in the rank order of their best-ranked chunk.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        metadata = doc.metadata or {}
+        source = metadata.get("source")
+        index = metadata.get("chunk_index")
+        if source is None or index is None:
+            # No position information, keep the chunk as it is
+            groups[("", rank)] = [(rank, None, doc.page_content)]
+            continue
+        groups.setdefault((source, None), []).append((rank, int(index), doc.page_content))
+
+    sections = []
+    for members in groups.values():
+        members.sort(key=lambda member: -1 if member[1] is None else member[1])
+        # [best rank, last chunk_index, text] of the section being merged
+        current = None
+        for rank, index, content in members:
+            if current is not None and index is not None and current[1] is not None:
+                if index == current[1]:
+                    # Same chunk retrieved twice
+                    current[0] = min(current[0], rank)
+                    continue
+                if index == current[1] + 1:
+                    overlap = _overlap_length(current[2], content)
+                    text = current[2] + ("" if overlap else "\n") + content[overlap:]
+                    current = [min(current[0], rank), index, text]
+                    continue
+            if current is not None:
+                sections.append((current[0], current[2]))
+            current = [rank, index, content]
+        sections.append((current[0], current[2]))
+
+    sections.sort(key=lambda section: section[0])
+    return [text for _, text in sections]
+
+
+def build_context(docs: List[Document], max_tokens: Optional[int] = None) -> str:
+    """
+    Build the prompt context from retrieved documents.
+
+    Adjacent chunks of the same file are merged without repeating their
+    overlap, and the result is limited to a token budget, filled in
+    retrieval rank order.
+
+    Args:
+        docs: Retrieved documents, most relevant first
+        max_tokens: Token budget (default: Config.CONTEXT_MAX_TOKENS; 0 disables it)
+
+    Returns:
+        The context string
+    """
+    if max_tokens is None:
+        max_tokens = Config.CONTEXT_MAX_TOKENS
+
+    sections = _merge_sections(docs)
+    if not max_tokens:
+        return "\n\n".join(sections)
+
+    parts = []
+    remaining = max_tokens
+    for section in sections:
+        tokens = count_tokens(section)
+        if tokens > remaining:
+            if remaining > 0:
+                parts.append(truncate_to_tokens(section, remaining))
+            break
+        parts.append(section)
+        remaining -= tokens
+    return "\n\n".join(parts)
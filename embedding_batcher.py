@@ -0,0 +1,100 @@
+"""Micro-batching of concurrent query embeddings."""
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional
+
+from tracing import with_trace_context
+
+
+class EmbeddingBatcher:
+    """
+    Combine concurrent embedding requests into batched model calls.
+
+    Requests are collected for up to max_wait_ms milliseconds after the
+    first one arrives, or until max_batch_size distinct texts are waiting,
+    and then embedded with one call to embed_batch on the executor. Each
+    caller gets its own vector back. Under burst load this turns many
+    single-text forward passes into a few batched ones.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        executor: Optional[Executor] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5
+    ):
+        """
+        Args:
+            embed_batch: Blocking function embedding a list of texts
+            executor: Executor the batches run on (None: the loop's default)
+            max_batch_size: Distinct texts per batch
+            max_wait_ms: Longest time the first request of a batch waits for others
+        """
+        self.embed_batch = embed_batch
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        # text -> futures waiting for its vector
+        self._pending = {}
+        self._timer = None
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text as part of the next batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests += 1
+        self._pending.setdefault(text, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        """Send the waiting texts to the model as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        texts = list(batch)
+        loop = asyncio.get_running_loop()
+        # Anything the batch records joins the trace of the request that
+        # flushed it (directly, or through the timer it started)
+        task = loop.run_in_executor(self.executor, with_trace_context(self.embed_batch), texts)
+
+        def _deliver(done):
+            error = done.exception()
+            vectors = None if error is not None else done.result()
+            for index, text in enumerate(texts):
+                for future in batch[text]:
+                    if future.done():
+                        # The caller was cancelled
+                        continue
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(vectors[index])
+
+        task.add_done_callback(_deliver)
+
+    def stats(self) -> dict:
+        """Return request and batch counters."""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,192 @@
+"""Caching wrapper for the embedding model."""
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookups (unicode form and whitespace)."""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that remembers every vector it has computed.
+
+    Vectors are keyed on the normalized text and the embedding model name,
+    kept in an in-memory LRU and optionally persisted to a SQLite file, so
+    repeated questions and unchanged chunks never hit the model (or the
+    paid API) twice.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        max_entries: int = 10000,
+        store_path: Optional[str] = None
+    ):
+        """
+        Wrap an embeddings object.
+
+        Args:
+            embeddings: The underlying embeddings (HuggingFace or OpenAI)
+            model_name: Model identifier, part of every cache key
+            max_entries: Maximum number of vectors kept in memory
+            store_path: Optional SQLite file used as a persistent second level
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._store = None
+        if store_path:
+            directory = os.path.dirname(os.path.abspath(store_path))
+            os.makedirs(directory, exist_ok=True)
+            # RAG worker processes share the file: WAL lets readers proceed
+            # while one of them writes, and writers wait instead of failing
+            self._store = sqlite3.connect(store_path, check_same_thread=False, timeout=30)
+            self._store.execute("PRAGMA journal_mode=WAL")
+            self._store.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._store.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, kind: str, text: str) -> str:
+        raw = f"{self.model_name}\0{kind}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        """Return cached vectors for the given keys (memory first, then disk)."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            missing = [key for key in keys if key not in found]
+            if self._store is not None and missing:
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._store.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        vector = vector.tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+        return found
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _count(self, hits: int, misses: int):
+        # Updated from several executor threads at once
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _store_vectors(self, items: dict):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._store is not None and items:
+                self._store.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+                )
+                self._store.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing a cached vector when possible."""
+        key = self._key("query", text)
+        cached = self._lookup([key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key]
+
+        self._count(0, 1)
+        vector = list(self.embeddings.embed_query(text))
+        self._store_vectors({key: vector})
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, sending the uncached ones to the model as one batch.
+
+        The batch goes through the model's embed_documents(), which for the
+        supported backends (sentence-transformers, OpenAI) computes the same
+        vectors as embed_query().
+        """
+        keys = [self._key("query", text) for text in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self._count(len(texts) - len(missing), len(missing))
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: list(vector) for key, vector in zip(missing.keys(), vectors)}
+            self._store_vectors(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, only sending uncached texts to the model."""
+        keys = [self._key("document", text) for text in texts]
+        cached = self._lookup(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self._count(len(texts) - len(missing), len(missing))
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: list(vector) for key, vector in zip(missing.keys(), vectors)}
+            self._store_vectors(computed)
+            cached.update(computed)
+
+        return [cached[key] for key in keys]
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the in-memory size."""
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._memory)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,143 @@
+"""Precomputed answers to frequently asked questions."""
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+def read_faq_questions(path: str) -> List[str]:
+    """
+    Read the canonical FAQ questions, one per line.
+
+    Blank lines and lines starting with # are skipped, and repeated
+    questions are kept once.
+
+    Returns:
+        The questions, or an empty list if the file doesn't exist
+    """
+    if not os.path.exists(path):
+        return []
+    questions = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            question = " ".join(line.split())
+            key = question.casefold()
+            if question and not question.startswith("#") and key not in seen:
+                seen.add(key)
+                questions.append(question)
+    return questions
+
+
+def faq_dependencies(documents: List[Document]) -> List[List[str]]:
+    """Return the [chunk ID, chunk hash] pairs an answer was generated from."""
+    return [
+        [f"{doc.metadata.get('source')}::{doc.metadata.get('chunk_index')}", doc.metadata.get("chunk_hash")]
+        for doc in documents
+    ]
+
+
+class FAQTable:
+    """
+    Answers to the FAQ questions, generated when the knowledge base is indexed.
+
+    Each entry keeps the question's embedding, so a matching incoming
+    question is answered with one dot product and no retrieval or LLM call,
+    and the chunks its answer was generated from, so a reload regenerates
+    only the answers whose chunks changed.
+
+    The table belongs to one collection and is saved next to it.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.92):
+        """
+        Args:
+            path: JSON file the table is saved to (None keeps it in memory only)
+            threshold: Minimum cosine similarity for a question to match an entry
+        """
+        self.path = path
+        self.threshold = threshold
+        # Identifies the prompt and LLM the answers were generated with
+        self.signature = None
+        # casefolded question -> {"question", "embedding", "answer", "dependencies"}
+        self._entries: Dict[str, dict] = {}
+        # (normalized embedding matrix, answers), swapped as one for lock-free lookups
+        self._lookup = (None, [])
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> bool:
+        """
+        Load the saved table.
+
+        Returns:
+            False if there is no saved table
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.replace(data["entries"], data.get("signature"))
+        return True
+
+    def save(self):
+        """Save the table."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = {"signature": self.signature, "entries": list(self._entries.values())}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    def drop(self):
+        """Delete the saved table."""
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def get(self, question: str) -> Optional[dict]:
+        """Return the entry of a canonical question, if any."""
+        return self._entries.get(question.casefold())
+
+    def questions(self) -> List[str]:
+        """Return the canonical questions in the table."""
+        return [entry["question"] for entry in self._entries.values()]
+
+    def replace(self, entries: List[dict], signature: Optional[str]):
+        """Replace every entry."""
+        with self._lock:
+            self.signature = signature
+            self._entries = {entry["question"].casefold(): entry for entry in entries}
+            matrix = None
+            if self._entries:
+                matrix = np.asarray([entry["embedding"] for entry in self._entries.values()], dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix = matrix / np.where(norms > 0, norms, 1.0)
+            self._lookup = (matrix, [entry["answer"] for entry in self._entries.values()])
+
+    def match(self, embedding: List[float]) -> Optional[str]:
+        """
+        Return the answer of the FAQ question most similar to a question embedding.
+
+        Returns:
+            The answer, or None if no question is similar enough
+        """
+        matrix, answers = self._lookup
+        if matrix is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return answers[best]
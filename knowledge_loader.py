@@ -1,51 +1,190 @@
 """Load and index knowledge base documents."""
+import multiprocessing
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional, Union
+# split_text is re-exported for scripts that imported it from here
+from chunking import chunking_signature, split_text
+from config import Config
+from faq import read_faq_questions
+# The file helpers moved to parsers; re-exported for scripts importing them from here
+from parsers import (
+    configure_worker, content_hash, file_hash, get_parser, iter_file_chunks,
+    iter_text_windows, load_text_file, parse_file
+)
 from rag_system import RAGSystem
+from vector_index import VectorIndex
 
+# Settings the parse worker processes take from this process, so values
+# changed at runtime (not only through the environment) apply there too
+_WORKER_SETTINGS = (
+    "CHUNK_SIZE_TOKENS", "CHUNK_OVERLAP_TOKENS", "CHUNK_TOKENIZER",
+    "STREAM_FILE_THRESHOLD_BYTES", "STREAM_WINDOW_CHARS"
+)
 
-def load_text_file(file_path: str) -> str:
-    """Load text from a file."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
 
+def chunk_id(source: str, chunk_index: int) -> str:
+    """Return the stable document ID of a chunk."""
+    return f"{source}::{chunk_index}"
 
-def split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+
+def knowledge_source(knowledge_path: Path, file_path: Path) -> str:
+    """Return the source name of a file: its path relative to the knowledge base."""
+    return file_path.relative_to(knowledge_path).as_posix()
+
+
+def iter_knowledge_files(knowledge_path: Path) -> Iterator[Path]:
+    """
+    Yield the knowledge base files to index.
+    
+    Every file with a registered parser (see parsers.py) is indexed,
+    including files in subdirectories, except hidden files, the FAQ
+    question file and files matching a Config.KNOWLEDGE_EXCLUDE pattern.
     """
-    Split text into chunks for better retrieval.
+    faq_file = Path(Config.FAQ_FILE).resolve() if Config.FAQ_FILE else None
+    excluded = [pattern.strip() for pattern in Config.KNOWLEDGE_EXCLUDE.split(",") if pattern.strip()]
+    for file_path in sorted(knowledge_path.rglob("*")):
+        source = knowledge_source(knowledge_path, file_path)
+        if any(part.startswith(".") for part in Path(source).parts):
+            continue
+        if not file_path.is_file() or get_parser(str(file_path)) is None:
+            continue
+        if file_path.resolve() == faq_file or any(fnmatch(source, pattern) for pattern in excluded):
+            continue
+        yield file_path
+
+
+def _stream_file(file_path: Path) -> dict:
+    """parse_file() for a file parsed in this process: its chunks are produced lazily."""
+    result = {"chunks": None, "seconds": 0.0}
+    
+    def timed_chunks():
+        chunks = iter_file_chunks(str(file_path))
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pair = (chunk, content_hash(chunk))
+            result["seconds"] += time.perf_counter() - started
+            if chunk is None:
+                return
+            yield pair
+    
+    result["chunks"] = timed_chunks()
+    return result
+
+
+def iter_parsed_files(file_paths: List[Path], workers: Optional[int] = None) -> Iterator[Union[dict, Exception]]:
+    """
+    Parse and chunk files, yielding each one's parse_file() result (or error) in order.
+    
+    Files are parsed ahead on a pool of processes, at most two per process
+    at a time so parsed chunks don't pile up while they are embedded.
+    Files over Config.STREAM_FILE_THRESHOLD_BYTES are parsed in this process
+    instead, with their chunks streamed so they are never held in memory
+    at once; so is everything when there is one worker or one file. The
+    "seconds" of a streamed file are final once its chunks are consumed.
     
     Args:
-        text: The text to split
-        chunk_size: Maximum size of each chunk
-        chunk_overlap: Number of characters to overlap between chunks
-        
-    Returns:
-        List of text chunks
+        file_paths: Files with a registered parser
+        workers: Parse processes (default: Config.PARSE_WORKERS)
     """
-    if len(text) <= chunk_size:
-        return [text]
+    workers = Config.PARSE_WORKERS if workers is None else workers
+    pool = None
+    if workers > 1 and len(file_paths) > 1:
+        # Spawned rather than forked: the bot process runs threads, which
+        # a forked child could inherit holding locks. Spawned workers
+        # re-import the main module, so bot.py does nothing on import.
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(file_paths)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=configure_worker,
+            initargs=({name: getattr(Config, name) for name in _WORKER_SETTINGS},)
+        )
     
-    chunks = []
-    start = 0
+    upcoming = iter(file_paths)
+    pending = deque()
     
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - chunk_overlap
+    def submit_ahead():
+        while pool is not None and sum(future is not None for _, future in pending) < 2 * workers:
+            file_path = next(upcoming, None)
+            if file_path is None:
+                return
+            try:
+                streamed = os.path.getsize(file_path) > Config.STREAM_FILE_THRESHOLD_BYTES
+            except OSError:
+                streamed = True
+            future = None if streamed else pool.submit(parse_file, os.path.abspath(file_path), get_parser(str(file_path)))
+            pending.append((file_path, future))
     
-    return chunks
+    try:
+        while True:
+            submit_ahead()
+            if pending:
+                file_path, future = pending.popleft()
+            else:
+                file_path, future = next(upcoming, None), None
+                if file_path is None:
+                    return
+            # Keep the pool busy while this file is consumed
+            submit_ahead()
+            try:
+                result = future.result() if future is not None else _stream_file(file_path)
+            except Exception as e:
+                result = e
+            yield result
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
 
 
-def load_knowledge_base(rag_system: RAGSystem, knowledge_dir: str = "knowledge_base"):
+def load_knowledge_base(
+    rag_system: Union[RAGSystem, VectorIndex],
+    knowledge_dir: str = "knowledge_base",
+    full_rebuild: bool = False,
+    answerer: Optional[RAGSystem] = None
+) -> dict:
     """
-    Load all documents from the knowledge base directory.
+    Index all documents from the knowledge base directory.
+    
+    Indexing is incremental: every chunk is stored under a stable ID derived
+    from its source file and chunk index, together with a hash of the file
+    and of the chunk. Files that are unchanged and were chunked with the
+    current settings are skipped, only new or changed chunks are embedded,
+    and chunks of deleted files are removed.
+    
+    Files of every format in the parser registry (parsers.py) are
+    discovered, including in subdirectories, and hashed; the new or changed
+    ones are parsed and chunked on a pool of Config.PARSE_WORKERS processes
+    and their chunks streamed, in order, into ingest_documents(), so memory
+    use does not grow with the size of the corpus. Each file's parse time
+    is reported, and their sum is in the summary as "parse_seconds".
+    
+    This updates the given collection in place; the bot reloads through
+    RAGSystem.reload_knowledge_base(), which runs this against a staging
+    copy and swaps it in when it is done.
+    
+    If Config.FAQ_FILE is set, the answers to its questions are then
+    precomputed from the indexed chunks (see RAGSystem.precompute_faq);
+    answers whose chunks didn't change are kept.
     
     Args:
-        rag_system: The RAG system instance to add documents to
+        rag_system: The RAG system instance to add documents to, or a
+            VectorIndex
         knowledge_dir: Directory containing knowledge base files
+        full_rebuild: Clear the collection and re-index everything (RAGSystem only)
+        answerer: RAG system generating the FAQ answers when rag_system
+            is a VectorIndex
+        
+    Returns:
+        Summary counts of the changes made to the index, with the FAQ
+        counts under "faq"
     """
+    summary = {"upserted": 0, "deleted": 0, "unchanged_files": 0, "changed_files": 0, "parse_seconds": 0.0}
     knowledge_path = Path(knowledge_dir)
     
     if not knowledge_path.exists():
@@ -56,46 +195,146 @@ def load_knowledge_base(rag_system: RAGSystem, knowledge_dir: str = "knowledge_b
         sample_file.write_text(
             "Welcome to the club knowledge base!\n\n"
             "Add your club information files to this directory. "
-            "Supported formats: .txt files\n\n"
-            "The bot will automatically index all text files in this directory."
+            "Supported formats: .txt, .md, .html, .csv and .pdf files\n\n"
+            "The bot will automatically index all supported files in this directory "
+            "and its subdirectories."
         )
         print(f"Created sample file: {sample_file}")
-        return
+        return summary
     
-    all_texts = []
-    all_metadatas = []
-    
-    # Load all .txt files
-    for file_path in knowledge_path.glob("*.txt"):
-        try:
-            text = load_text_file(str(file_path))
-            chunks = split_text(text)
-            
-            for i, chunk in enumerate(chunks):
-                all_texts.append(chunk)
-                all_metadatas.append({
-                    "source": file_path.name,
-                    "chunk_index": i
-                })
-            
-            print(f"Loaded {len(chunks)} chunks from {file_path.name}")
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}")
-    
-    if all_texts:
-        # Clear existing knowledge base
+    if full_rebuild:
         rag_system.clear_knowledge_base()
+    
+    # What is currently indexed, grouped by source file
+    indexed = rag_system.get_index_state()
+    indexed_ids_by_source = {}
+    indexed_file_hashes = {}
+    for doc_id, metadata in indexed.items():
+        source = metadata.get("source")
+        indexed_ids_by_source.setdefault(source, set()).add(doc_id)
+        indexed_file_hashes.setdefault(source, set()).add(
+            (metadata.get("file_hash"), metadata.get("chunking"))
+        )
+    signature = chunking_signature()
+    
+    retag_ids, retag_metadatas = [], []
+    delete_ids = []
+    seen_sources = set()
+    # (seconds, source) of every parsed file
+    parse_times = []
+    
+    def changed_chunks():
+        """Yield (id, text, metadata) for every new or changed chunk."""
+        # Hash every file first, so only new or changed files are parsed
+        to_parse = []
+        for file_path in iter_knowledge_files(knowledge_path):
+            source = knowledge_source(knowledge_path, file_path)
+            # Keep a file's existing chunks if it fails to load this time
+            seen_sources.add(source)
+            try:
+                current_hash = file_hash(str(file_path))
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+                continue
+            if indexed_file_hashes.get(source) == {(current_hash, signature)}:
+                summary["unchanged_files"] += 1
+                continue
+            to_parse.append((file_path, source, current_hash))
         
-        # Add all documents
-        rag_system.add_documents(all_texts, all_metadatas)
-        print(f"[OK] Successfully indexed {len(all_texts)} document chunks!")
-    else:
+        parsed_files = iter_parsed_files([file_path for file_path, _, _ in to_parse])
+        try:
+            for parsed, (file_path, source, current_hash) in zip(parsed_files, to_parse):
+                try:
+                    if isinstance(parsed, Exception):
+                        raise parsed
+                    
+                    current_ids = set()
+                    changed = 0
+                    
+                    for i, (chunk, chunk_hash) in enumerate(parsed["chunks"]):
+                        doc_id = chunk_id(source, i)
+                        current_ids.add(doc_id)
+                        metadata = {
+                            "source": source,
+                            "chunk_index": i,
+                            "chunk_hash": chunk_hash,
+                            "file_hash": current_hash,
+                            "chunking": signature
+                        }
+                        
+                        previous = indexed.get(doc_id)
+                        if previous is not None and previous.get("chunk_hash") == metadata["chunk_hash"]:
+                            # Same text, only the file hash needs refreshing
+                            retag_ids.append(doc_id)
+                            retag_metadatas.append(metadata)
+                            continue
+                        
+                        changed += 1
+                        yield doc_id, chunk, metadata
+                    
+                    # Chunks past the new end of the file (or left over from
+                    # older, non-incremental indexing)
+                    delete_ids.extend(indexed_ids_by_source.get(source, set()) - current_ids)
+                    summary["changed_files"] += 1
+                    summary["parse_seconds"] += parsed["seconds"]
+                    parse_times.append((parsed["seconds"], source))
+                    
+                    print(
+                        f"Loaded {len(current_ids)} chunks from {source} ({changed} new or changed), "
+                        f"parsed in {parsed['seconds']:.2f}s"
+                    )
+                except Exception as e:
+                    print(f"Error loading {file_path}: {e}")
+        finally:
+            # Shut the parse pool down even if ingestion stopped early
+            parsed_files.close()
+    
+    started = time.perf_counter()
+    stats = rag_system.ingest_documents(changed_chunks())
+    summary["upserted"] = stats["chunks"]
+    
+    # Chunks of files that no longer exist
+    for source, doc_ids in indexed_ids_by_source.items():
+        if source not in seen_sources:
+            delete_ids.extend(doc_ids)
+    
+    rag_system.delete_documents(sorted(delete_ids))
+    rag_system.update_metadatas(retag_ids, retag_metadatas)
+    summary["deleted"] = len(delete_ids)
+    
+    if not seen_sources:
         print("[!] No documents found in knowledge base directory.")
+    print(
+        f"[OK] Indexed {summary['upserted']} new or changed chunks, "
+        f"removed {summary['deleted']}, "
+        f"{summary['unchanged_files']} file(s) unchanged."
+    )
+    if parse_times:
+        slowest = ", ".join(f"{source} {seconds:.2f}s" for seconds, source in sorted(parse_times, reverse=True)[:3])
+        print(
+            f"[OK] Parsed {len(parse_times)} file(s) in {summary['parse_seconds']:.2f}s of parse time, "
+            f"indexed in {time.perf_counter() - started:.2f}s (slowest: {slowest})"
+        )
+    
+    # Precompute the FAQ answers from what was just indexed
+    if isinstance(rag_system, RAGSystem):
+        answerer, index = rag_system, rag_system.index
+    else:
+        index = rag_system
+    if answerer is not None and index.faq is not None:
+        summary["faq"] = answerer.precompute_faq(index, read_faq_questions(Config.FAQ_FILE))
+        if summary["faq"]["questions"]:
+            print(
+                f"[OK] FAQ: {summary['faq']['generated']} answer(s) generated, "
+                f"{summary['faq']['reused']} unchanged"
+            )
+    return summary
 
 
 if __name__ == "__main__":
     """Load knowledge base when run directly."""
     from rag_system import RAGSystem
+    import sys
     rag = RAGSystem()
-    load_knowledge_base(rag)
+    load_knowledge_base(rag, full_rebuild="--full" in sys.argv)
 
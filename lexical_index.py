@@ -0,0 +1,189 @@
+"""BM25 keyword index kept next to the vector index, and rank fusion of their results."""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+_TOKEN = re.compile(r"\w+")
+
+# Question words and fillers that would otherwise match nearly every chunk
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or
+our the to was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, dropping stopwords."""
+    return [token for token in _TOKEN.findall(text.casefold()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the knowledge base chunks.
+
+    Each chunk's term frequencies are computed once, when it is added, and
+    saved with the chunk, so loading the index only rebuilds the postings
+    lists. A search touches only the postings of the query's terms, which
+    for a club-sized knowledge base takes microseconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            path: JSON file the index is saved to (None keeps it in memory only)
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        # doc ID -> [text, metadata, {term: frequency}, length]
+        self._docs: Dict[str, list] = {}
+        # term -> {doc ID: frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def load(self) -> bool:
+        """
+        Load the saved index.
+
+        Returns:
+            False if there is no saved index
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            docs = json.load(f)["docs"]
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, {}, 0
+            for doc_id, (text, metadata, frequencies, length) in docs.items():
+                self._insert(doc_id, text, metadata, frequencies, length)
+            self._dirty = False
+        return True
+
+    def save(self):
+        """Save the index if it changed since it was loaded or last saved."""
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"docs": self._docs}, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+    def drop(self):
+        """Delete the saved index."""
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _insert(self, doc_id: str, text: str, metadata: dict, frequencies: Dict[str, int], length: int):
+        self._docs[doc_id] = [text, metadata, frequencies, length]
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+
+    def _remove(self, doc_id: str):
+        _, _, frequencies, length = self._docs.pop(doc_id)
+        self._total_length -= length
+        for term in frequencies:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Iterable[dict]):
+        """Add documents, replacing those with the same IDs."""
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._docs:
+                    self._remove(doc_id)
+                tokens = tokenize(text)
+                self._insert(doc_id, text, metadata or {}, dict(Counter(tokens)), len(tokens))
+                self._dirty = True
+
+    def update_metadatas(self, ids: Iterable[str], metadatas: Iterable[dict]):
+        """Replace the metadata of existing documents."""
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                if doc_id in self._docs:
+                    self._docs[doc_id][1] = metadata or {}
+                    self._dirty = True
+
+    def delete(self, ids: Iterable[str]):
+        """Delete documents by ID."""
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._docs:
+                    self._remove(doc_id)
+                    self._dirty = True
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        """Return up to k documents ranked by BM25 score (only documents sharing a term)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._docs)
+            if not terms or not count:
+                return []
+            average_length = self._total_length / count
+
+            scores = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    length = self._docs[doc_id][3]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            return [
+                Document(page_content=self._docs[doc_id][0], metadata=dict(self._docs[doc_id][1]))
+                for doc_id, _ in scores.most_common(k)
+            ]
+
+
+def _document_key(doc: Document) -> Hashable:
+    metadata = doc.metadata or {}
+    if metadata.get("source") is not None and metadata.get("chunk_index") is not None:
+        return metadata["source"], int(metadata["chunk_index"])
+    return doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, constant: int = 60) -> List[Document]:
+    """
+    Merge ranked result lists with reciprocal rank fusion.
+
+    Each document scores sum(1 / (constant + rank)) over the lists it
+    appears in; ties keep the order of the earlier list.
+
+    Args:
+        rankings: Result lists, best first
+        k: Number of documents to return
+        constant: RRF damping constant
+
+    Returns:
+        The k best documents
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (constant + rank)
+    order = sorted(scores, key=lambda key: -scores[key])
+    return [documents[key] for key in order[:k]]
@@ -0,0 +1,283 @@
+"""Route LLM calls across providers with hedged requests and failover."""
+import asyncio
+import concurrent.futures
+import contextvars
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import merge_configs
+
+
+class LatencyTracker:
+    """Rolling window of observed latencies."""
+
+    def __init__(self, window: int = 100):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Return the given percentile of the window (None if it is empty)."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+class ProviderRouter(Runnable[LanguageModelInput, BaseMessage]):
+    """
+    Chat model stand-in that spreads a call over several LLM providers.
+
+    Providers are tried in order. If the current one fails, the next one is
+    called right away; if it hasn't answered (or, when streaming, produced
+    its first token) within its recent p95 latency, the next one is called
+    as a hedge while the first keeps running. The first answer wins and the
+    other calls are cancelled (except in invoke(), see there).
+
+    Only successful calls are recorded as latency samples. A cancelled
+    loser's elapsed time is cut short by the hedge, and a provider that
+    fails fast (e.g. rejecting the request) says nothing about how long
+    its answers take; counting either would pull the p95 and the hedge
+    delay down.
+    """
+
+    # Samples needed before a provider's own percentile is trusted
+    MIN_SAMPLES = 5
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, Any]],
+        percentile: float = 95,
+        default_delay: float = 4.0,
+        min_delay: float = 0.5,
+        window: int = 100
+    ):
+        """
+        Args:
+            providers: (name, chat model) pairs, primary first
+            percentile: Latency percentile after which a call is hedged
+            default_delay: Hedge delay used until a provider has enough samples
+            min_delay: Lower bound of the hedge delay
+            window: Number of recent latencies kept per provider
+        """
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        self.providers = providers
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        # (provider, "invoke" or "stream") -> tracker
+        self._latency = {
+            (name, kind): LatencyTracker(window)
+            for name, _ in providers for kind in ("invoke", "stream")
+        }
+        # Blocking calls made by invoke(); losing calls finish in the background
+        self._threads = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4 * len(providers), thread_name_prefix="llm-router"
+        )
+
+        self.calls = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.wins: Dict[str, int] = {name: 0 for name, _ in providers}
+        self.failures: Dict[str, int] = {name: 0 for name, _ in providers}
+
+    def hedge_delay(self, name: str, kind: str) -> float:
+        """Return how long to wait for a provider before hedging."""
+        tracker = self._latency[(name, kind)]
+        if len(tracker.samples) < self.MIN_SAMPLES:
+            return self.default_delay
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    @staticmethod
+    def _provider_config(config: Optional[RunnableConfig], name: str) -> RunnableConfig:
+        """Tag a call's config with the provider name, for callbacks and traces."""
+        return merge_configs(config, {"metadata": {"llm_provider": name}})
+
+    def _failed(self, name: str, error: BaseException):
+        self.failures[name] += 1
+        print(f"[!] LLM provider {name} failed: {type(error).__name__}: {error}")
+
+    def invoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs) -> BaseMessage:
+        """
+        Return the first answer from the providers (blocking).
+
+        A call running on a thread can't be cancelled, so a hedged call's
+        loser runs to completion in the background: every hedge adds a
+        full request to the providers' load, not just the part until the
+        winner answers. Use ainvoke() where the load matters.
+        """
+        self.calls += 1
+        running = {}
+        last_error = None
+
+        def launch():
+            name, llm = self.providers[len(launched)]
+            launched.append(name)
+            future = self._threads.submit(
+                contextvars.copy_context().run, llm.invoke, input, self._provider_config(config, name), **kwargs
+            )
+            running[future] = (name, time.perf_counter())
+
+        launched = []
+        launch()
+        while running:
+            more = len(launched) < len(self.providers)
+            timeout = self.hedge_delay(launched[-1], "invoke") if more else None
+            done, _ = concurrent.futures.wait(
+                running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                self.hedged += 1
+                launch()
+                continue
+
+            for future in done:
+                name, started = running.pop(future)
+                if future.exception() is None:
+                    self._latency[(name, "invoke")].record(time.perf_counter() - started)
+                    self.wins[name] += 1
+                    # Only drops hedges still queued for a thread
+                    for other in running:
+                        other.cancel()
+                    return future.result()
+                last_error = future.exception()
+                self._failed(name, last_error)
+
+            if not running and len(launched) < len(self.providers):
+                self.failovers += 1
+                launch()
+        raise last_error
+
+    async def ainvoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs) -> BaseMessage:
+        """Return the first answer from the providers."""
+        self.calls += 1
+        running = {}
+        last_error = None
+
+        def launch():
+            name, llm = self.providers[len(launched)]
+            launched.append(name)
+            task = asyncio.ensure_future(llm.ainvoke(input, self._provider_config(config, name), **kwargs))
+            running[task] = (name, time.perf_counter())
+
+        launched = []
+        launch()
+        try:
+            while running:
+                more = len(launched) < len(self.providers)
+                timeout = self.hedge_delay(launched[-1], "invoke") if more else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    name, started = running.pop(task)
+                    if task.exception() is None:
+                        self._latency[(name, "invoke")].record(time.perf_counter() - started)
+                        self.wins[name] += 1
+                        return task.result()
+                    last_error = task.exception()
+                    self._failed(name, last_error)
+
+                if not running and len(launched) < len(self.providers):
+                    self.failovers += 1
+                    launch()
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def astream(
+        self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> AsyncIterator[BaseMessageChunk]:
+        """
+        Stream the answer of the provider that produces a first token first.
+
+        Hedging and failover only apply until the first token; once a
+        provider is streaming, its errors are raised to the caller.
+        """
+        self.calls += 1
+        # task awaiting a stream's first chunk -> (name, stream, start time)
+        running = {}
+        last_error = None
+        winner = None
+
+        def launch():
+            name, llm = self.providers[len(launched)]
+            launched.append(name)
+            stream = llm.astream(input, self._provider_config(config, name), **kwargs)
+            running[asyncio.ensure_future(stream.__anext__())] = (name, stream, time.perf_counter())
+
+        launched = []
+        launch()
+        try:
+            while running and winner is None:
+                more = len(launched) < len(self.providers)
+                timeout = self.hedge_delay(launched[-1], "stream") if more else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    launch()
+                    continue
+
+                for task in done:
+                    name, stream, started = running.pop(task)
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        self._latency[(name, "stream")].record(time.perf_counter() - started)
+                    if winner is None and (error is None or isinstance(error, StopAsyncIteration)):
+                        self.wins[name] += 1
+                        winner = (stream, None if error is not None else task.result())
+                    elif error is not None and not isinstance(error, StopAsyncIteration):
+                        last_error = error
+                        self._failed(name, error)
+                    else:
+                        # A second stream started in the same instant
+                        await stream.aclose()
+
+                if winner is None and not running and len(launched) < len(self.providers):
+                    self.failovers += 1
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+            for task, (_, stream, _) in running.items():
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await stream.aclose()
+
+        if winner is None:
+            raise last_error
+        stream, first = winner
+        if first is None:
+            return
+        yield first
+        async for chunk in stream:
+            yield chunk
+
+    def stats(self) -> dict:
+        """Return call counters and the current hedge delay of every provider."""
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "providers": {
+                name: {
+                    "wins": self.wins[name],
+                    "failures": self.failures[name],
+                    "p95_seconds": self._latency[(name, "invoke")].percentile(95),
+                    "p95_first_token_seconds": self._latency[(name, "stream")].percentile(95),
+                }
+                for name, _ in self.providers
+            },
+        }
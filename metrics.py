@@ -0,0 +1,339 @@
+"""Low-overhead latency histograms and counters, exposed in the Prometheus text format."""
+import bisect
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Upper bounds in seconds; stages range from sub-millisecond searches to
+# multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, one series per label value tuple.
+
+    Recording a value is a bisect and three increments under a lock, about
+    a microsecond, so every request can be measured.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        """Record one value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Record the duration of the with-block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def summary(self, *labels: str) -> Optional[dict]:
+        """
+        Return the count, mean and estimated p50/p95/p99 of one series.
+
+        Percentiles are interpolated within buckets, like Prometheus'
+        histogram_quantile(), so they are only as precise as the buckets.
+
+        Returns:
+            None if nothing was recorded for these labels
+        """
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None or not series[2]:
+                return None
+            counts, total, count = list(series[0]), series[1], series[2]
+
+        def quantile(q):
+            rank = q * count
+            cumulative = 0
+            for index, bucket_count in enumerate(counts):
+                if cumulative + bucket_count >= rank and bucket_count:
+                    if index == len(self.buckets):
+                        return self.buckets[-1]
+                    lower = self.buckets[index - 1] if index else 0.0
+                    upper = self.buckets[index]
+                    return lower + (upper - lower) * (rank - cumulative) / bucket_count
+                cumulative += bucket_count
+            return self.buckets[-1]
+
+        return {
+            "count": count,
+            "mean": total / count,
+            "p50": quantile(0.50),
+            "p95": quantile(0.95),
+            "p99": quantile(0.99),
+        }
+
+    def export(self) -> dict:
+        """Return the raw series, for merge() into a histogram in another process."""
+        with self._lock:
+            return {labels: [list(s[0]), s[1], s[2]] for labels, s in self._series.items()}
+
+    def merge(self, exported: dict):
+        """Add the series of another histogram with the same buckets (see export)."""
+        with self._lock:
+            for labels, (counts, total, count) in exported.items():
+                series = self._series.get(labels)
+                if series is None:
+                    series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+    def label_values(self) -> List[Tuple[str, ...]]:
+        """Return the label value tuples that have been recorded."""
+        with self._lock:
+            return sorted(self._series)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label value tuple."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge or counter read from existing state when metrics are scraped.
+
+    Used for values other components already keep (queue depth, cache
+    hit counters), so they cost nothing between scrapes.
+    """
+
+    def __init__(self, name: str, help: str, func: Callable, kind: str = "gauge", labelname: Optional[str] = None):
+        """
+        Args:
+            name: Metric name
+            help: Description
+            func: Returns the value, a {label value: value} dict when
+                labelname is set, or None when there is nothing to report
+            kind: "gauge" or "counter"
+            labelname: Label distinguishing the values of a returned dict
+        """
+        self.name = name
+        self.help = help
+        self.func = func
+        self.kind = kind
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        try:
+            value = self.func()
+        except Exception as e:
+            return [f"# {self.name} unavailable: {type(e).__name__}"]
+        if value is None:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.labelname is None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        else:
+            for label, item in sorted(value.items()):
+                lines.append(f"{self.name}{_format_labels((self.labelname,), (label,))} {_format_value(item)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            # Re-registering a name replaces it (e.g. a callback bound to a new object)
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def callback(self, name: str, help: str, func: Callable, kind: str = "gauge", labelname: Optional[str] = None) -> CallbackMetric:
+        return self._add(CallbackMetric(name, help, func, kind, labelname))
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ragbot_stage_seconds",
+    "Time spent in each stage of answering a question",
+    ("stage",)
+)
+LLM_TOKENS = REGISTRY.histogram(
+    "ragbot_llm_tokens",
+    "Tokens per LLM call (provider-reported, else estimated)",
+    ("kind",),
+    buckets=TOKEN_BUCKETS
+)
+REQUESTS = REGISTRY.counter(
+    "ragbot_requests_total",
+    "Questions received by the bot, by outcome",
+    ("outcome",)
+)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording LLM call latency, time to first token and token counts.
+
+    Attach it to the chat model in the chain; it sees every provider call
+    (including each call of a ProviderRouter).
+    """
+
+    # Recording is cheap; don't hop to a thread pool in async chains
+    run_inline = True
+
+    def __init__(self):
+        # run ID -> [start time, prompt messages, first token seen]
+        self._runs: Dict[uuid.UUID, list] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), messages, False]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[2]:
+            run[2] = True
+            STAGE_SECONDS.observe(time.perf_counter() - run[0], "llm_first_token")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - run[0], "llm")
+
+        usage = None
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        if message is not None and getattr(message, "usage_metadata", None):
+            usage = message.usage_metadata
+        if usage:
+            LLM_TOKENS.observe(usage.get("input_tokens", 0), "prompt")
+            LLM_TOKENS.observe(usage.get("output_tokens", 0), "completion")
+            return
+
+        # The provider didn't report usage (e.g. some streaming APIs)
+        from chunking import count_tokens
+        prompt = sum(count_tokens(str(m.content)) for batch in run[1] for m in batch)
+        completion = sum(count_tokens(g.text) for g in generations)
+        LLM_TOKENS.observe(prompt, "prompt")
+        LLM_TOKENS.observe(completion, "completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serve the registry's metrics at http://host:port/metrics from a daemon thread.
+
+    Raises:
+        OSError: The port is unavailable
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
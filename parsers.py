@@ -0,0 +1,224 @@
+"""Text extraction from knowledge base files, by file extension.
+
+Every supported format has a parser: a function taking a file path and
+returning its text, or an iterable of consecutive pieces of it. Parsers
+are registered with register_parser() and looked up by extension;
+knowledge_loader runs them (and chunking) on a pool of processes, so a
+parser must be a module-level function of an importable module.
+"""
+import csv
+import hashlib
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from chunking import iter_chunks
+from config import Config
+
+Parser = Callable[[str], Iterable[str]]
+
+# Lower-case extension (with the dot) -> parser
+PARSERS: Dict[str, Parser] = {}
+
+# CSV rows per piece of text handed to the chunker
+_CSV_ROWS_PER_PIECE = 256
+
+
+def register_parser(*extensions: str):
+    """
+    Register a function as the parser of files with the given extensions.
+
+    Args:
+        extensions: File extensions, with the dot (e.g. ".md")
+    """
+    def decorator(parser: Parser) -> Parser:
+        for extension in extensions:
+            PARSERS[extension.lower()] = parser
+        return parser
+    return decorator
+
+
+def get_parser(file_path: str) -> Optional[Parser]:
+    """Return the parser of a file, or None if its format isn't supported."""
+    return PARSERS.get(os.path.splitext(file_path)[1].lower())
+
+
+def load_text_file(file_path: str) -> str:
+    """Load text from a file."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def content_hash(text: str) -> str:
+    """Return a stable hash of a piece of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Return a stable hash of a file's contents, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@register_parser(".txt")
+def iter_text_windows(file_path: str) -> Iterator[str]:
+    """
+    Yield the text of a file.
+
+    Files up to Config.STREAM_FILE_THRESHOLD_BYTES are read in one piece;
+    larger files are read in windows of Config.STREAM_WINDOW_CHARS
+    characters so they are never held in memory as a single string.
+    """
+    if os.path.getsize(file_path) <= Config.STREAM_FILE_THRESHOLD_BYTES:
+        yield load_text_file(file_path)
+        return
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for window in iter(lambda: f.read(Config.STREAM_WINDOW_CHARS), ""):
+            yield window
+
+
+_FRONT_MATTER = re.compile(r"\A---\s*\n.*?\n---\s*\n", re.DOTALL)
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)[^)]*\)")
+
+
+@register_parser(".md", ".markdown")
+def parse_markdown(file_path: str) -> str:
+    """Return the text of a Markdown file, without front matter, comments and image links."""
+    text = load_text_file(file_path)
+    text = _FRONT_MATTER.sub("", text)
+    text = _HTML_COMMENT.sub("", text)
+    text = _IMAGE.sub(r"\1", text)
+    return _LINK.sub(r"\1 (\2)", text)
+
+
+class _HTMLText(HTMLParser):
+    """Collects the visible text of an HTML page, one line per block element."""
+
+    _SKIPPED = {"script", "style", "noscript", "template", "svg"}
+    _BLOCKS = {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+        "figcaption", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+        "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th",
+        "title", "tr", "ul"
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._line: List[str] = []
+        self._skipping = 0
+
+    def _break(self):
+        line = " ".join("".join(self._line).split())
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIPPED:
+            self._skipping += 1
+        elif tag in self._BLOCKS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self._BLOCKS:
+            self._break()
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self._line.append(data)
+
+    def text(self) -> str:
+        self._break()
+        return "\n".join(self.lines)
+
+
+@register_parser(".html", ".htm")
+def parse_html(file_path: str) -> str:
+    """Return the visible text of an HTML page, without scripts, styles and markup."""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        html = f.read()
+    extractor = _HTMLText()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+@register_parser(".csv")
+def parse_csv(file_path: str) -> Iterator[str]:
+    """
+    Yield the rows of a CSV file as "column: value" lines.
+
+    The first row is the header. Every row becomes one line, so chunks
+    break between rows.
+    """
+    with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        lines = []
+        for row in reader:
+            fields = [
+                f"{name.strip()}: {value.strip()}" if name.strip() else value.strip()
+                for name, value in zip(header, row) if value.strip()
+            ]
+            if fields:
+                lines.append("; ".join(fields))
+            if len(lines) == _CSV_ROWS_PER_PIECE:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines)
+
+
+@register_parser(".pdf")
+def parse_pdf(file_path: str) -> Iterator[str]:
+    """Yield the text of a PDF file, page by page."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError(
+            "PDF support not available. Install with: pip install pypdf"
+        )
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if text.strip():
+            yield text.strip() + "\n\n"
+
+
+def iter_file_chunks(file_path: str, parser: Optional[Parser] = None) -> Iterator[str]:
+    """Parse a file and yield its chunks, lazily."""
+    parser = parser or get_parser(file_path)
+    if parser is None:
+        raise ValueError(f"No parser for {os.path.splitext(file_path)[1] or 'files without an extension'}")
+    return iter_chunks(parser(file_path))
+
+
+def configure_worker(settings: Dict[str, object]):
+    """Apply the parent's chunking and parsing settings in a parse worker process."""
+    for name, value in settings.items():
+        setattr(Config, name, value)
+
+
+def parse_file(file_path: str, parser: Parser) -> dict:
+    """
+    Parse and chunk one file; run in a parse worker process.
+
+    Returns:
+        {"chunks": [(chunk, chunk hash)], "seconds": time taken}
+    """
+    started = time.perf_counter()
+    chunks = [(chunk, content_hash(chunk)) for chunk in iter_file_chunks(file_path, parser)]
+    return {"chunks": chunks, "seconds": time.perf_counter() - started}
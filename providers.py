@@ -0,0 +1,178 @@
+"""Factories for the embedding and LLM backends.
+
+Provider packages are imported only when the configured backend needs them,
+so starting the bot does not pay for importing every optional LangChain
+integration (or torch, for sentence-transformers) up front.
+"""
+import importlib
+import time
+
+from answer_length import answer_token_budget
+from config import Config
+
+# Shared HTTP connection pools of the hosted LLM clients, created on first use
+_http_clients = {}
+
+
+def _import_first(*candidates):
+    """
+    Import the first available class from (module, name) candidates.
+
+    Returns:
+        The class, or None if none of the modules can be imported
+    """
+    for module_name, attribute in candidates:
+        try:
+            return getattr(importlib.import_module(module_name), attribute)
+        except ImportError:
+            continue
+    return None
+
+
+def create_embeddings():
+    """Create the configured embeddings backend."""
+    started = time.perf_counter()
+    if Config.USE_OPENAI_EMBEDDINGS:
+        # Use OpenAI embeddings
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(
+            model=Config.EMBEDDING_MODEL,
+            openai_api_key=Config.OPENAI_API_KEY,
+            openai_api_base=Config.OPENAI_API_BASE or None,
+            **_http_client_kwargs()
+        )
+    else:
+        # Use sentence-transformers (free, local)
+        HuggingFaceEmbeddings = _import_first(
+            ("langchain_community.embeddings", "HuggingFaceEmbeddings"),
+            ("langchain_huggingface", "HuggingFaceEmbeddings")
+        )
+        if HuggingFaceEmbeddings is None:
+            raise ImportError(
+                "HuggingFaceEmbeddings not available. "
+                "Install with: pip install langchain-community sentence-transformers"
+            )
+        embeddings = HuggingFaceEmbeddings(
+            model_name=Config.EMBEDDING_MODEL,
+            encode_kwargs={"batch_size": Config.EMBEDDING_BATCH_SIZE}
+        )
+    print(f"[startup] Loaded embedding model {Config.EMBEDDING_MODEL} in {time.perf_counter() - started:.2f}s")
+    return embeddings
+
+
+def _http_client_kwargs() -> dict:
+    """
+    Return the pooled httpx clients to pass to an OpenAI-compatible chat model.
+
+    Every hosted provider shares one sync and one async client, so their
+    keep-alive connections are reused across requests (and across the
+    providers of a ProviderRouter) instead of each model opening its own.
+    """
+    if not _http_clients:
+        import httpx
+        limits = httpx.Limits(
+            max_connections=Config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.LLM_MAX_CONNECTIONS
+        )
+        timeout = httpx.Timeout(Config.LLM_TIMEOUT, connect=10.0)
+        _http_clients["http_client"] = httpx.Client(limits=limits, timeout=timeout)
+        _http_clients["http_async_client"] = httpx.AsyncClient(limits=limits, timeout=timeout)
+    return dict(_http_clients)
+
+
+def create_llm(provider: str = None, max_retries: int = None):
+    """
+    Create the chat model for an LLM provider.
+
+    Args:
+        provider: groq, ollama, deepseek or openai (default: Config.LLM_PROVIDER)
+        max_retries: Retries of failed requests (default: the client library's)
+    """
+    provider = provider or Config.LLM_PROVIDER
+    started = time.perf_counter()
+    options = {} if max_retries is None else {"max_retries": max_retries}
+    # Stop generating at the answer budget instead of paying for text
+    # that won't fit in the reply
+    max_tokens = answer_token_budget()
+
+    if provider == "groq":
+        ChatGroq = _import_first(("langchain_groq", "ChatGroq"))
+        if ChatGroq is None:
+            raise ImportError(
+                "ChatGroq not available. Install with: pip install langchain-groq"
+            )
+        llm = ChatGroq(
+            model=Config.GROQ_MODEL,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            groq_api_key=Config.GROQ_API_KEY,
+            **_http_client_kwargs(),
+            **options
+        )
+    elif provider == "ollama":
+        ChatOllama = _import_first(
+            ("langchain_community.chat_models", "ChatOllama"),
+            ("langchain_ollama", "ChatOllama")
+        )
+        if ChatOllama is None:
+            raise ImportError(
+                "ChatOllama not available. Install with: pip install langchain-community"
+            )
+        llm = ChatOllama(
+            model=Config.OLLAMA_MODEL,
+            base_url=Config.OLLAMA_BASE_URL,
+            temperature=0.7,
+            num_predict=max_tokens
+        )
+    elif provider == "deepseek":
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            model_name=Config.DEEPSEEK_MODEL,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            openai_api_key=Config.DEEPSEEK_API_KEY,
+            openai_api_base=Config.DEEPSEEK_API_BASE,
+            **_http_client_kwargs(),
+            **options
+        )
+    elif provider == "openai":
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(
+            model_name=Config.OPENAI_MODEL,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            openai_api_key=Config.OPENAI_API_KEY,
+            openai_api_base=Config.OPENAI_API_BASE or None,
+            **_http_client_kwargs(),
+            **options
+        )
+    else:
+        raise ValueError(f"Invalid LLM_PROVIDER: {provider}")
+
+    print(f"[startup] Loaded {provider} LLM backend in {time.perf_counter() - started:.2f}s")
+    return llm
+
+
+def create_llm_router():
+    """
+    Create the chat model used to answer questions.
+
+    Returns the LLM_PROVIDER model itself, or, when LLM_FALLBACK_PROVIDERS
+    are configured, a ProviderRouter that hedges and fails over from it to
+    the fallbacks in order.
+    """
+    providers = [Config.LLM_PROVIDER] + [
+        name for name in Config.LLM_FALLBACK_PROVIDERS if name != Config.LLM_PROVIDER
+    ]
+    if len(providers) == 1:
+        return create_llm(Config.LLM_PROVIDER)
+
+    from llm_router import ProviderRouter
+    # The router retries on another provider, so the clients fail fast
+    return ProviderRouter(
+        [(name, create_llm(name, max_retries=0)) for name in providers],
+        percentile=Config.HEDGE_PERCENTILE,
+        default_delay=Config.HEDGE_DEFAULT_DELAY,
+        min_delay=Config.HEDGE_MIN_DELAY,
+        window=Config.LLM_LATENCY_WINDOW
+    )
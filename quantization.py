@@ -0,0 +1,222 @@
+"""Compact encodings of embedding vectors for the NumPy vector index."""
+from typing import List, Optional
+
+import numpy as np
+
+# Rows converted to float32 at a time while scoring int8 codes, which
+# bounds the temporary memory a search needs
+_SCORE_BLOCK_ROWS = 8192
+
+
+class VectorQuantizer:
+    """
+    Reduce and quantize normalized embeddings for approximate dot-product search.
+
+    Vectors can first be reduced to fewer dimensions, either by projecting
+    them onto their principal components (fitted on the indexed vectors) or
+    by keeping the leading dimensions (for embeddings trained to be
+    truncated, such as OpenAI's text-embedding-3 models). Each dimension can
+    then be stored as an int8 code between its minimum and maximum value.
+    Scores are only approximate; callers re-score the best candidates with
+    the original vectors.
+    """
+
+    def __init__(self, quantization: str = "none", dimensions: int = 0, reduction: str = "pca"):
+        """
+        Args:
+            quantization: "int8", or "none" to keep float32 values
+            dimensions: Dimensions to keep (0 keeps all of them)
+            reduction: "pca" or "truncate"
+        """
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Invalid quantization: {quantization}. Must be one of: none, int8")
+        if reduction not in ("pca", "truncate"):
+            raise ValueError(f"Invalid reduction: {reduction}. Must be one of: pca, truncate")
+        self.quantization = quantization
+        self.dimensions = dimensions
+        self.reduction = reduction
+
+        self.input_dimensions = None
+        # d x r projection matrix (pca), or None
+        self.projection: Optional[np.ndarray] = None
+        # Per-dimension int8 decoding: value = offset + scale * code
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether this stores anything other than the original vectors."""
+        return self.quantization != "none" or self.dimensions > 0
+
+    def signature(self) -> str:
+        """Describe the settings; saved codes made with other settings are refitted."""
+        return f"{self.quantization}:{self.reduction}:{self.dimensions}"
+
+    def describe(self) -> str:
+        """Return a short human-readable description of the settings."""
+        parts = ["int8" if self.quantization == "int8" else "float32"]
+        if self.dimensions:
+            parts.append(f"{self.reduction} {self.dimensions}")
+        return " + ".join(parts)
+
+    def output_dimensions(self) -> int:
+        """Return the dimensions of an encoded vector (once fitted)."""
+        if self.dimensions and self.dimensions < self.input_dimensions:
+            return self.dimensions
+        return self.input_dimensions
+
+    def bytes_per_vector(self) -> int:
+        """Return the size of one encoded vector."""
+        return self.output_dimensions() * (1 if self.quantization == "int8" else 4)
+
+    def fit(self, vectors: np.ndarray, sample_size: int = 20000) -> "VectorQuantizer":
+        """
+        Fit the reduction and quantization ranges to the indexed vectors.
+
+        Args:
+            vectors: n x d matrix of normalized vectors
+            sample_size: Rows used to fit the principal components
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.input_dimensions = vectors.shape[1]
+        reduced = self.output_dimensions()
+
+        self.projection = None
+        if reduced < self.input_dimensions and self.reduction == "pca":
+            sample = vectors
+            if len(vectors) > sample_size:
+                rows = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+                sample = vectors[np.sort(rows)]
+            # Uncentered components preserve dot products (not just distances
+            # from the mean) as well as possible
+            _, _, components = np.linalg.svd(sample, full_matrices=False)
+            self.projection = np.ascontiguousarray(components[:reduced].T, dtype=np.float32)
+
+        self.offset = self.scale = None
+        if self.quantization == "int8" and len(vectors):
+            projected = self.project(vectors)
+            low, high = projected.min(axis=0), projected.max(axis=0)
+            self.offset = ((high + low) / 2).astype(np.float32)
+            scale = (high - low) / 254
+            scale[scale == 0] = 1
+            self.scale = scale.astype(np.float32)
+        return self
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Reduce vectors (n x d, or a single vector) to the output dimensions."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.projection is not None:
+            return vectors @ self.projection
+        return vectors[..., :self.output_dimensions()]
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode an n x d matrix of vectors."""
+        projected = self.project(vectors)
+        if self.quantization != "int8":
+            return np.ascontiguousarray(projected, dtype=np.float32)
+        codes = np.rint((projected - self.offset) / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Return approximate dot products of a normalized query with encoded vectors.
+
+        Scores of int8 codes are offset by a constant (the same for every
+        vector), which doesn't change their ranking.
+        """
+        projected = self.project(query)
+        if self.quantization != "int8":
+            return codes @ projected
+
+        weights = projected * self.scale
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCORE_BLOCK_ROWS):
+            block = codes[start:start + _SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        return scores
+
+    def state(self) -> dict:
+        """Return the fitted parameters as arrays, for np.savez."""
+        state = {"input_dimensions": np.array(self.input_dimensions)}
+        for name in ("projection", "offset", "scale"):
+            if getattr(self, name) is not None:
+                state[name] = getattr(self, name)
+        return state
+
+    def load_state(self, state) -> "VectorQuantizer":
+        """Restore parameters saved with state()."""
+        self.input_dimensions = int(state["input_dimensions"])
+        for name in ("projection", "offset", "scale"):
+            setattr(self, name, state[name] if name in state else None)
+        return self
+
+
+def recall_report(
+    vectors: np.ndarray,
+    settings: List[VectorQuantizer],
+    k: int = 4,
+    queries: int = 200,
+    rescore_candidates: int = 32,
+    seed: int = 0
+) -> List[dict]:
+    """
+    Measure recall@k and memory of quantizer settings on a set of vectors.
+
+    Each query is a stored vector, searched for among all the others
+    (leave-one-out); recall@k is the share of its exact top-k neighbours
+    that an approximate search returns, with and without re-scoring the
+    best rescore_candidates with the original vectors.
+
+    Args:
+        vectors: n x d matrix of normalized vectors, e.g. the indexed chunks
+        settings: Unfitted quantizers to compare
+        k: Results per query
+        queries: Number of query vectors sampled
+        rescore_candidates: Candidates re-scored with the float vectors
+        seed: Seed of the query sample
+
+    Returns:
+        One dictionary per setting with its memory use and recall
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    count = len(vectors)
+    if count <= k:
+        raise ValueError(f"Need more than k={k} vectors to measure recall")
+    rows = np.random.default_rng(seed).choice(count, min(queries, count), replace=False)
+
+    def top(scores, n):
+        n = min(n, len(scores))
+        best = np.argpartition(-scores, n - 1)[:n]
+        return best[np.argsort(-scores[best])]
+
+    exact = []
+    for row in rows:
+        scores = vectors @ vectors[row]
+        scores[row] = -np.inf
+        exact.append(set(top(scores, k).tolist()))
+
+    report = []
+    for quantizer in settings:
+        quantizer.fit(vectors)
+        codes = quantizer.encode(vectors)
+        hits = rescored_hits = 0
+        for row, truth in zip(rows, exact):
+            scores = quantizer.score(codes, vectors[row])
+            scores[row] = -np.inf
+            hits += len(truth & set(top(scores, k).tolist()))
+
+            candidates = top(scores, max(k, rescore_candidates))
+            candidates = candidates[candidates != row]
+            exact_scores = vectors[candidates] @ vectors[row]
+            rescored_hits += len(truth & set(candidates[np.argsort(-exact_scores)[:k]].tolist()))
+
+        total = len(rows) * k
+        report.append({
+            "setting": quantizer.describe(),
+            "dimensions": quantizer.output_dimensions(),
+            "bytes_per_vector": quantizer.bytes_per_vector(),
+            "index_mib": quantizer.bytes_per_vector() * count / (1024 * 1024),
+            "recall": hits / total,
+            "recall_rescored": rescored_hits / total,
+        })
+    return report
@@ -1,188 +1,860 @@
 """RAG (Retrieval-Augmented Generation) system for the Discord bot."""
 import os
-from typing import List, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import Chroma
+import asyncio
+import hashlib
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from config import Config
+from answer_cache import SemanticAnswerCache
+from answer_length import ErrorMessage, answer_char_budget, answer_token_budget, fit_text, length_instruction
+from embedding_cache import CachedEmbeddings
+from embedding_batcher import EmbeddingBatcher
+from faq import FAQTable, faq_dependencies
+from context_builder import build_context
+from lexical_index import reciprocal_rank_fusion
+from llm_router import ProviderRouter
+from metrics import LLMMetricsHandler
+from singleflight import SingleFlight
+from tracing import (
+    LLMTraceHandler, current_trace, record_error, record_stage, stage, trace_request, with_trace_context
+)
+from providers import create_embeddings, create_llm_router
+from quantization import VectorQuantizer
+from vector_index import ChromaIndex, NumpyIndex, VectorIndex
+
+# Knowledge base collections are named club_knowledge (before the first
+# reload) or club_knowledge_v<n>
+COLLECTION_PREFIX = "club_knowledge"
+LEXICAL_INDEX_SUFFIX = ".bm25.json"
+FAQ_TABLE_SUFFIX = ".faq.json"
+
+
+def _index_directory() -> str:
+    """Return the directory the configured vector backend stores its collections in."""
+    if Config.VECTOR_BACKEND == "numpy":
+        return Config.NUMPY_INDEX_DIRECTORY
+    return Config.CHROMA_PERSIST_DIRECTORY
+
+
+def _lexical_index_path(name: str) -> str:
+    """Return the path of a collection's BM25 keyword index."""
+    return os.path.join(_index_directory(), f"{name}{LEXICAL_INDEX_SUFFIX}")
 
-# Try to import HuggingFaceEmbeddings, fallback if not available
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-except ImportError:
-    try:
-        from langchain_huggingface import HuggingFaceEmbeddings
-    except ImportError:
-        HuggingFaceEmbeddings = None
 
-# Try to import Groq and Ollama
-try:
-    from langchain_groq import ChatGroq
-except ImportError:
-    ChatGroq = None
+def _faq_table_path(name: str) -> str:
+    """Return the path of a collection's precomputed FAQ answers."""
+    return os.path.join(_index_directory(), f"{name}{FAQ_TABLE_SUFFIX}")
 
-try:
-    from langchain_community.chat_models import ChatOllama
-except ImportError:
+
+def _active_collection_path() -> str:
+    """Return the path of the file naming the active collection."""
+    return os.path.join(_index_directory(), "active_collection")
+
+
+def active_collection_name() -> str:
+    """Return the name of the collection queries should use."""
     try:
-        from langchain_ollama import ChatOllama
-    except ImportError:
-        ChatOllama = None
+        with open(_active_collection_path(), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        name = ""
+    return name or COLLECTION_PREFIX
 
 
 class RAGSystem:
     """Handles RAG operations: embedding, retrieval, and generation."""
     
-    def __init__(self):
-        """Initialize the RAG system with vector store and LLM."""
+    def __init__(self, embeddings=None, llm=None):
+        """
+        Initialize the RAG system with vector store and LLM.
+        
+        Args:
+            embeddings: Embeddings backend to use instead of the configured one
+            llm: Chat model to use instead of the configured provider(s)
+        """
         # Initialize embeddings
-        if Config.USE_OPENAI_EMBEDDINGS:
-            # Use OpenAI embeddings
-            self.embeddings = OpenAIEmbeddings(
-                model=Config.EMBEDDING_MODEL,
-                openai_api_key=Config.OPENAI_API_KEY
+        self.embeddings = embeddings if embeddings is not None else create_embeddings()
+        
+        # Remember computed vectors so repeated questions and unchanged
+        # chunks skip the model forward pass / API call
+        if Config.EMBEDDING_CACHE_ENABLED:
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                model_name=Config.EMBEDDING_MODEL,
+                max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+                store_path=Config.EMBEDDING_CACHE_PATH or None
             )
-        else:
-            # Use sentence-transformers (free, local)
-            if HuggingFaceEmbeddings is None:
-                raise ImportError(
-                    "HuggingFaceEmbeddings not available. "
-                    "Install with: pip install langchain-community sentence-transformers"
-                )
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=Config.EMBEDDING_MODEL
+        
+        # Initialize ChromaDB client (imported here to keep module import
+        # cheap, and not at all with the in-process NumPy backend)
+        self.client = None
+        if Config.VECTOR_BACKEND == "chroma":
+            import chromadb
+            self.client = chromadb.PersistentClient(
+                path=Config.CHROMA_PERSIST_DIRECTORY
             )
+        elif Config.VECTOR_BACKEND != "numpy":
+            raise ValueError(f"Invalid VECTOR_BACKEND: {Config.VECTOR_BACKEND}")
         
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=Config.CHROMA_PERSIST_DIRECTORY
-        )
+        # Reloads build a new versioned collection next to the active one and
+        # swap it in; the active collection's name survives restarts in a
+        # pointer file (will create the collection if it doesn't exist)
+        self.index = self._open_index(active_collection_name())
+        # Held while replacing self.index, and while a search takes it
+        self._index_lock = threading.Lock()
+        # Only one reload or clear runs at a time
+        self._reload_lock = threading.Lock()
+        self.faq_hits = 0
+        self.faq_misses = 0
         
-        # Initialize vector store (will create collection if it doesn't exist)
-        # Use get_or_create to ensure collection exists
-        try:
-            # Try to get existing collection
-            self.client.get_collection(name="club_knowledge")
-        except Exception:
-            # Collection doesn't exist, create it
-            self.client.create_collection(name="club_knowledge")
-        
-        self.vectorstore = Chroma(
-            client=self.client,
-            collection_name="club_knowledge",
-            embedding_function=self.embeddings
+        # Worker processes sharing the index leave replaced collections for
+        # the pool to drop once all of them have switched (see refresh_index)
+        self.drop_replaced_collections = True
+        
+        # Bounded pool for the blocking embedding and search calls made from
+        # aquery(), so the event loop never runs them and never spawns more
+        # threads than configured
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.EMBEDDING_WORKERS,
+            thread_name_prefix="rag-embed"
         )
+        # Created lazily inside the running event loop
+        self._query_semaphore = None
         
-        # Initialize LLM based on provider
-        if Config.LLM_PROVIDER == "groq":
-            if ChatGroq is None:
-                raise ImportError(
-                    "ChatGroq not available. Install with: pip install langchain-groq"
-                )
-            self.llm = ChatGroq(
-                model=Config.GROQ_MODEL,
-                temperature=0.7,
-                groq_api_key=Config.GROQ_API_KEY
-            )
-        elif Config.LLM_PROVIDER == "ollama":
-            if ChatOllama is None:
-                raise ImportError(
-                    "ChatOllama not available. Install with: pip install langchain-community"
-                )
-            self.llm = ChatOllama(
-                model=Config.OLLAMA_MODEL,
-                base_url=Config.OLLAMA_BASE_URL,
-                temperature=0.7
-            )
-        elif Config.LLM_PROVIDER == "deepseek":
-            self.llm = ChatOpenAI(
-                model_name=Config.DEEPSEEK_MODEL,
-                temperature=0.7,
-                openai_api_key=Config.DEEPSEEK_API_KEY,
-                openai_api_base=Config.DEEPSEEK_API_BASE
+        # Questions embedded at about the same time share one model call
+        self.query_batcher = None
+        if Config.QUERY_BATCH_SIZE > 1:
+            self.query_batcher = EmbeddingBatcher(
+                self._embed_queries,
+                executor=self._executor,
+                max_batch_size=Config.QUERY_BATCH_SIZE,
+                max_wait_ms=Config.QUERY_BATCH_WAIT_MS
             )
-        elif Config.LLM_PROVIDER == "openai":
-            self.llm = ChatOpenAI(
-                model_name=Config.OPENAI_MODEL,
-                temperature=0.7,
-                openai_api_key=Config.OPENAI_API_KEY
+        
+        # Concurrent identical questions share one retrieval + LLM call
+        self.inflight = None
+        if Config.COALESCE_QUERIES:
+            self.inflight = SingleFlight(similarity_threshold=Config.ANSWER_CACHE_THRESHOLD)
+        
+        # Answers to recent questions, invalidated whenever the collection changes
+        self.answer_cache = None
+        if Config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=Config.ANSWER_CACHE_THRESHOLD,
+                max_entries=Config.ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+                max_bytes=Config.ANSWER_CACHE_MAX_MB * 1024 * 1024
             )
-        else:
-            raise ValueError(f"Invalid LLM_PROVIDER: {Config.LLM_PROVIDER}")
         
-        # Create custom prompt template
+        # Initialize LLM based on provider
+        self.llm = llm if llm is not None else create_llm_router()
+        
+        # Create custom prompt template; the answer is asked to fit the
+        # reply's length budget, which also caps the provider's max_tokens
         self.prompt_template = ChatPromptTemplate.from_messages([
             ("system", """You are a helpful assistant for a university club. Answer the user's question based on the following context from the club's knowledge base.
 
 Context:
 {context}
 
-Provide a helpful, accurate answer based on the context. If the context doesn't contain enough information to answer the question, say so politely and suggest what information might be helpful."""),
+Provide a helpful, accurate answer based on the context. If the context doesn't contain enough information to answer the question, say so politely and suggest what information might be helpful. """ + length_instruction()),
             ("human", "{question}")
         ])
         
-        # Create retrieval chain using LCEL
-        retriever = self.vectorstore.as_retriever(
-            search_kwargs={"k": 4}  # Retrieve top 4 most relevant chunks
-        )
-        
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
+        # Create retrieval chain using LCEL. The chain takes the question
+        # together with its precomputed embedding, and the retriever looks up
+        # self.index on every call, so swapping the index swaps the collection
+        # the chain reads from.
+        retriever = RunnableLambda(self._retrieve, afunc=self._aretrieve)
         
+        # Generation from a given context, also used to precompute FAQ answers
+        self.answer_chain = (
+            self.prompt_template
+            | self.llm.with_config(callbacks=[LLMMetricsHandler(), LLMTraceHandler()])
+            | StrOutputParser()
+        )
         self.qa_chain = (
             {
-                "context": retriever | format_docs,
-                "question": RunnablePassthrough()
+                "context": retriever | build_context,
+                "question": itemgetter("question")
             }
-            | self.prompt_template
-            | self.llm
-            | StrOutputParser()
+            | self.answer_chain
         )
     
-    def add_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None):
+    def add_documents(self, texts: List[str], metadatas: Optional[List[dict]] = None) -> dict:
         """
         Add documents to the knowledge base.
         
         Args:
             texts: List of text documents to add
             metadatas: Optional list of metadata dictionaries for each document
+            
+        Returns:
+            Ingestion statistics (see ingest_documents)
         """
         if metadatas is None:
             metadatas = [{}] * len(texts)
         
-        self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+        ids = [str(uuid.uuid4()) for _ in texts]
+        return self.upsert_documents(ids, texts, metadatas)
+    
+    def upsert_documents(self, ids: List[str], texts: List[str], metadatas: List[dict]) -> dict:
+        """
+        Insert or replace documents under stable IDs.
+        
+        Args:
+            ids: Document IDs; existing documents with these IDs are replaced
+            texts: Text of each document
+            metadatas: Metadata dictionary for each document
+            
+        Returns:
+            Ingestion statistics (see ingest_documents)
+        """
+        return self.ingest_documents(zip(ids, texts, metadatas))
+    
+    def ingest_documents(self, records: Iterable[Tuple[str, str, dict]]) -> dict:
+        """
+        Embed and write a stream of documents into the active collection.
+        
+        See VectorIndex.ingest_documents() for how the work is batched.
+        
+        Args:
+            records: Iterable of (id, text, metadata) tuples; existing
+                documents with the same IDs are replaced
+            
+        Returns:
+            Dictionary with the chunk count, total seconds, chunks per second
+            and per-batch embed/write timings
+        """
+        stats = self.index.ingest_documents(records)
+        if stats["chunks"]:
+            self._knowledge_base_changed()
+        return stats
+    
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]):
+        """Replace the metadata of existing documents without re-embedding them."""
+        self.index.update_metadatas(ids, metadatas)
+    
+    def delete_documents(self, ids: List[str]):
+        """Delete documents by ID."""
+        if not ids:
+            return
+        self.index.delete_documents(ids)
+        self._knowledge_base_changed()
+    
+    def get_index_state(self) -> dict:
+        """
+        Return the metadata of every indexed document.
+        
+        Returns:
+            Mapping of document ID to its metadata dictionary
+        """
+        return self.index.get_index_state()
+    
+    def _knowledge_base_changed(self):
+        """Invalidate everything derived from the previous collection contents."""
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate()
+    
+    def _retrieve(self, inputs: dict):
+        """Fetch the most relevant chunks for the question in inputs."""
+        return self._search(inputs["embedding"], inputs["question"])
+    
+    async def _aretrieve(self, inputs: dict):
+        """Async retrieval that runs the blocking search on the bounded executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, with_trace_context(self._search), inputs["embedding"], inputs["question"]
+        )
+    
+    def _embed_queries(self, questions: List[str]) -> List[List[float]]:
+        """Embed a batch of questions with one model call."""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.embed_queries(questions)
+        # Same vectors as embed_query() for sentence-transformers and OpenAI
+        return self.embeddings.embed_documents(questions)
+    
+    async def _aembed_query(self, question: str) -> List[float]:
+        """Embed a question on the bounded executor, batched with concurrent questions."""
+        with stage("embed"):
+            if self.query_batcher is not None:
+                return await self.query_batcher.embed(question)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, with_trace_context(self.embeddings.embed_query), question
+            )
+    
+    def _search(
+        self,
+        embedding: List[float],
+        question: Optional[str] = None,
+        index: Optional[VectorIndex] = None,
+        stage_name: str = "retrieve"
+    ):
+        """
+        Return the top Config.RETRIEVAL_K chunks for a question.
+        
+        With hybrid search, the best vector matches and the best BM25
+        keyword matches are merged by reciprocal rank fusion, so chunks
+        containing exact names, room numbers or dates from the question
+        rank high even when their embedding is not the closest.
+        
+        Searches the active collection, or index if given (a collection
+        being built by a reload). The time taken is recorded as the
+        stage_name stage; searches made outside of answering a question
+        use their own name, so they don't skew the "retrieve" latencies.
+        """
+        # Take the index under the swap lock, so a reload can't drop it
+        # between reading self.index and marking it in use
+        started = time.perf_counter()
+        with self._index_lock:
+            index = index or self.index
+            index.acquire()
+        try:
+            if index.lexical is None or not question:
+                documents = index.search(embedding, k=Config.RETRIEVAL_K)
+            else:
+                candidates = max(Config.HYBRID_CANDIDATES, Config.RETRIEVAL_K)
+                documents = reciprocal_rank_fusion(
+                    [index.search(embedding, k=candidates), index.lexical.search(question, k=candidates)],
+                    k=Config.RETRIEVAL_K,
+                    constant=Config.RRF_K
+                )
+        finally:
+            index.release()
+            record_stage(stage_name, started)
+        
+        trace = current_trace()
+        if trace is not None:
+            trace.add_chunks(documents)
+        return documents
+    
+    def fit_message(self, answer: str) -> str:
+        """
+        Shorten an answer that overran its length budget.
+        
+        The budget is one Discord message, or Config.ANSWER_MAX_PAGES of
+        them with Config.PAGINATE_ANSWERS. Generation is already bounded
+        by the prompt and max_tokens, so this rarely cuts anything; when it
+        does, it cuts between sentences where possible.
+        """
+        return fit_text(answer, answer_char_budget())
+    
+    def _cached_answer(self, embedding: List[float]) -> Optional[str]:
+        """Return the precomputed FAQ answer or a cached answer for a similar question, if any."""
+        trace = current_trace()
+        faq = self.index.faq
+        if faq is not None and len(faq):
+            answer = faq.match(embedding)
+            if trace is not None:
+                trace.attributes["faq"] = "hit" if answer is not None else "miss"
+            if answer is not None:
+                self.faq_hits += 1
+                return answer
+            self.faq_misses += 1
+        
+        if self.answer_cache is None:
+            return None
+        answer = self.answer_cache.get(embedding)
+        if trace is not None:
+            trace.attributes["answer_cache"] = "hit" if answer is not None else "miss"
+        return answer
+    
+    def _cache_generation(self) -> Optional[int]:
+        """Snapshot the cache generation before generating an answer."""
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.generation
+    
+    def _remember_answer(self, question: str, embedding: List[float], answer: str, generation: Optional[int]):
+        """Store a freshly generated answer in the answer cache."""
+        if self.answer_cache is not None:
+            self.answer_cache.put(question, embedding, answer, generation)
+    
+    def _get_query_semaphore(self) -> asyncio.Semaphore:
+        """Return the semaphore limiting concurrent async queries."""
+        if self._query_semaphore is None:
+            self._query_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_QUERIES)
+        return self._query_semaphore
+    
+    @staticmethod
+    def _flight_key(question: str) -> str:
+        """Normalize a question for coalescing identical in-flight queries."""
+        return " ".join(question.casefold().split())
+    
+    def _generate(self, question: str, embedding: List[float]) -> str:
+        """Run retrieval and generation for a question that missed the cache."""
+        generation = self._cache_generation()
+        with stage("generate"):
+            answer = self.qa_chain.invoke({"question": question, "embedding": embedding})
+        
+        # Truncate if too long for Discord
+        answer = self.fit_message(answer)
+        self._remember_answer(question, embedding, answer, generation)
+        return answer
+    
+    async def _agenerate(self, question: str, embedding: List[float]) -> str:
+        """Async counterpart of _generate(), limited by the query semaphore."""
+        async with self._get_query_semaphore():
+            generation = self._cache_generation()
+            with stage("generate"):
+                answer = await self.qa_chain.ainvoke({"question": question, "embedding": embedding})
+            
+            # Truncate if too long for Discord
+            answer = self.fit_message(answer)
+            self._remember_answer(question, embedding, answer, generation)
+            return answer
     
     def query(self, question: str) -> str:
         """
         Query the RAG system with a question.
         
+        Concurrent calls asking the same question share one retrieval and
+        LLM call.
+        
         Args:
             question: The user's question
             
         Returns:
             The generated answer
         """
-        try:
-            answer = self.qa_chain.invoke(question)
+        started = time.perf_counter()
+        with trace_request("query", question):
+            try:
+                with stage("embed"):
+                    embedding = self.embeddings.embed_query(question)
+                cached = self._cached_answer(embedding)
+                if cached is not None:
+                    return cached
+                
+                if self.inflight is None:
+                    return self._generate(question, embedding)
+                return self.inflight.do(
+                    self._flight_key(question), embedding,
+                    lambda: self._generate(question, embedding)
+                )
+            except Exception as e:
+                record_error(e)
+                return f"I encountered an error while processing your question: {str(e)}"
+            finally:
+                record_stage("query", started)
+    
+    async def aquery(self, question: str) -> str:
+        """
+        Query the RAG system without blocking the event loop.
+        
+        At most Config.MAX_CONCURRENT_QUERIES answers are generated at once;
+        extra callers wait for a free slot. Concurrent calls asking the same
+        (or a near-identical) question attach to the one already in flight.
+        
+        Args:
+            question: The user's question
             
-            # Truncate if too long for Discord
-            if len(answer) > Config.MAX_MESSAGE_LENGTH:
-                answer = answer[:Config.MAX_MESSAGE_LENGTH - 3] + "..."
+        Returns:
+            The generated answer
+        """
+        started = time.perf_counter()
+        with trace_request("aquery", question):
+            try:
+                embedding = await self._aembed_query(question)
+                cached = self._cached_answer(embedding)
+                if cached is not None:
+                    return cached
+                
+                if self.inflight is None:
+                    return await self._agenerate(question, embedding)
+                return await self.inflight.ado(
+                    self._flight_key(question), embedding,
+                    lambda: self._agenerate(question, embedding)
+                )
+            except Exception as e:
+                record_error(e)
+                return f"I encountered an error while processing your question: {str(e)}"
+            finally:
+                record_stage("query", started)
+    
+    async def astream(self, question: str) -> AsyncIterator[str]:
+        """
+        Stream the answer to a question as it is generated.
+        
+        Uses the chain's streaming interface, so the first text arrives
+        after time-to-first-token instead of after the whole generation.
+        Cached answers, and answers to a matching question that is already
+        in flight, are yielded in one piece. The streamed text is not
+        truncated; callers should apply fit_message() or paginate it
+        before display.
+        
+        The LLM stream runs in its own task, which holds a query slot (see
+        aquery()) only while the LLM is generating; a consumer that reads
+        slowly, or stops reading without closing the stream, doesn't keep
+        one taken.
+        
+        Args:
+            question: The user's question
             
+        Yields:
+            Consecutive pieces of the answer; on failure, an ErrorMessage
+            that replaces the pieces yielded before it
+        """
+        with trace_request("astream", question):
+            async for piece in self._astream(question):
+                yield piece
+    
+    async def _astream(self, question: str) -> AsyncIterator[str]:
+        """Body of astream(), run inside its request trace."""
+        try:
+            embedding = await self._aembed_query(question)
+            cached = self._cached_answer(embedding)
+            if cached is not None:
+                yield cached
+                return
+            
+            key = self._flight_key(question)
+            if self.inflight is not None:
+                existing = self.inflight.find(key, embedding)
+                if existing is not None:
+                    yield await self.inflight.wait(existing)
+                    return
+        except Exception as e:
+            record_error(e)
+            yield ErrorMessage(f"I encountered an error while processing your question: {str(e)}")
+            return
+        
+        # Lead this question: others asking it meanwhile wait for our result
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        if self.inflight is not None:
+            self.inflight.register(key, embedding, result)
+        
+        pieces = asyncio.Queue()
+        
+        async def generate() -> str:
+            async with self._get_query_semaphore():
+                generation = self._cache_generation()
+                parts = []
+                async for piece in self.qa_chain.astream({"question": question, "embedding": embedding}):
+                    parts.append(piece)
+                    pieces.put_nowait(piece)
+            answer = self.fit_message("".join(parts))
+            self._remember_answer(question, embedding, answer, generation)
             return answer
+        
+        producer = asyncio.create_task(generate())
+        # Queued after the last piece, whether the stream finished or failed
+        producer.add_done_callback(lambda _: pieces.put_nowait(None))
+        try:
+            while (piece := await pieces.get()) is not None:
+                yield piece
+            result.set_result(producer.result())
         except Exception as e:
-            return f"I encountered an error while processing your question: {str(e)}"
+            result.set_exception(e)
+            record_error(e)
+            yield ErrorMessage(f"I encountered an error while processing your question: {str(e)}")
+        finally:
+            producer.cancel()
+            if not result.done():
+                # The consumer stopped reading before the answer was complete
+                result.set_exception(RuntimeError("the answer stream was abandoned"))
+            # Followers retrieve the outcome; don't warn about unretrieved errors
+            result.exception()
+    
+    def stats(self) -> dict:
+        """
+        Return the counters of the index, caches, query coalescing and LLM router.
+        
+        Sections that are disabled are None.
+        """
+        return {
+            "index_chunks": self.index.count(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "embedding_cache": self.embeddings.stats() if isinstance(self.embeddings, CachedEmbeddings) else None,
+            "coalescing": self.inflight.stats() if self.inflight is not None else None,
+            "query_batching": self.query_batcher.stats() if self.query_batcher is not None else None,
+            "llm_router": self.llm.stats() if isinstance(self.llm, ProviderRouter) else None,
+            "faq": self._faq_stats(),
+        }
+    
+    def _faq_stats(self) -> Optional[dict]:
+        faq = self.index.faq
+        if faq is None:
+            return None
+        lookups = self.faq_hits + self.faq_misses
+        return {
+            "questions": len(faq),
+            "hits": self.faq_hits,
+            "misses": self.faq_misses,
+            "hit_rate": self.faq_hits / lookups if lookups else 0.0,
+        }
+    
+    def warm_up(self):
+        """
+        Run one embedding and one search so the first real query is not slow.
+        
+        Loads lazily initialized model weights and the collection's index
+        into memory. Logs how long it took.
+        """
+        started = time.perf_counter()
+        embedding = self.embeddings.embed_query("warm up")
+        self._search(embedding, "warm up", stage_name="warm_up")
+        print(f"[startup] Warmed up embedding model and vector store in {time.perf_counter() - started:.2f}s")
+    
+    def _write_active_collection(self, name: str):
+        """Record the active collection name, replacing the pointer file atomically."""
+        path = _active_collection_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(temp_path, path)
+    
+    def _open_vectors(self, name: str) -> VectorIndex:
+        """Open (or create) a collection with the configured vector backend."""
+        if self.client is None:
+            return NumpyIndex(
+                os.path.join(_index_directory(), name), name, self.embeddings,
+                quantizer=VectorQuantizer(
+                    Config.VECTOR_QUANTIZATION, Config.VECTOR_DIMENSIONS, Config.VECTOR_REDUCTION
+                ),
+                rescore_candidates=Config.RESCORE_CANDIDATES
+            )
+        return ChromaIndex(self.client, name, self.embeddings)
+    
+    def _open_index(self, name: str) -> VectorIndex:
+        """Open a collection together with its keyword index, if hybrid search is on."""
+        index = self._open_vectors(name)
+        if Config.HYBRID_SEARCH:
+            index.attach_lexical_index(_lexical_index_path(name))
+        if Config.FAQ_FILE:
+            index.faq = FAQTable(_faq_table_path(name), threshold=Config.FAQ_THRESHOLD)
+            index.faq.load()
+        return index
+    
+    def _new_index(self) -> VectorIndex:
+        """Create an empty, uniquely named collection for the next generation."""
+        return self._open_index(f"{COLLECTION_PREFIX}_v{time.time_ns()}")
+    
+    def _drop_stale_collections(self):
+        """Drop collections left behind by reloads that were interrupted."""
+        if self.client is None:
+            directory = _index_directory()
+            names = [
+                name for name in os.listdir(directory)
+                if os.path.isdir(os.path.join(directory, name))
+            ] if os.path.isdir(directory) else []
+        else:
+            # Older chromadb versions return names instead of collections
+            names = [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+        
+        for name in names:
+            if name.startswith(COLLECTION_PREFIX) and name != self.index.name:
+                print(f"Dropping stale collection {name}")
+                if self.client is None:
+                    shutil.rmtree(os.path.join(_index_directory(), name), ignore_errors=True)
+                else:
+                    self.client.delete_collection(name=name)
+        
+        # Keyword indexes and FAQ tables of dropped collections (or of any
+        # collection, if hybrid search or the FAQ was turned off since)
+        directory = _index_directory()
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if not filename.startswith(COLLECTION_PREFIX):
+                    continue
+                if filename.endswith(LEXICAL_INDEX_SUFFIX):
+                    keep = self.index.lexical is not None and filename == f"{self.index.name}{LEXICAL_INDEX_SUFFIX}"
+                elif filename.endswith(FAQ_TABLE_SUFFIX):
+                    keep = self.index.faq is not None and filename == f"{self.index.name}{FAQ_TABLE_SUFFIX}"
+                else:
+                    continue
+                if not keep:
+                    os.remove(os.path.join(directory, filename))
+    
+    def _swap_index(self, new_index: VectorIndex):
+        """
+        Make new_index the active collection and drop the previous one.
+        
+        Queries that already started searching the previous collection
+        finish against it; it is dropped once the last of them is done
+        (or left to the worker pool, see drop_replaced_collections).
+        """
+        self._write_active_collection(new_index.name)
+        with self._index_lock:
+            old_index, self.index = self.index, new_index
+        self._knowledge_base_changed()
+        
+        waited = time.perf_counter()
+        old_index.wait_idle()
+        if not self.drop_replaced_collections:
+            print(f"[OK] Switched to collection {new_index.name}")
+            return
+        old_index.drop()
+        print(
+            f"[OK] Switched to collection {new_index.name}, dropped {old_index.name} "
+            f"(waited {time.perf_counter() - waited:.2f}s for in-flight queries)"
+        )
+    
+    def _faq_signature(self) -> str:
+        """Identify the prompt and model FAQ answers are generated with."""
+        llm = self.llm.providers[0][1] if isinstance(self.llm, ProviderRouter) else self.llm
+        model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+        prompt = "\n".join(str(message.prompt.template) for message in self.prompt_template.messages)
+        settings = f"{model}\n{Config.RETRIEVAL_K}\n{answer_token_budget()}\n{prompt}"
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+    
+    def precompute_faq(self, index: VectorIndex, questions: List[str]) -> dict:
+        """
+        Generate the answers to the FAQ questions from index's documents.
+        
+        Every question is embedded and retrieved against index. Answers of
+        the active collection's FAQ table whose retrieved chunks (IDs and
+        content hashes) are unchanged are reused; only the others are
+        generated, in one batch of LLM calls.
+        
+        Args:
+            index: Collection to answer from, whose FAQ table is replaced
+            questions: The canonical questions
+            
+        Returns:
+            Counts of generated, reused and failed answers, and whether the
+            table changed
+        """
+        previous = self.index.faq
+        if previous is not None and previous.signature != self._faq_signature():
+            previous = None
+        
+        embeddings = self._embed_queries(questions) if questions else []
+        entries, stale = [], []
+        for question, embedding in zip(questions, embeddings):
+            documents = self._search(embedding, question, index=index, stage_name="faq_retrieve")
+            dependencies = faq_dependencies(documents)
+            entry = previous.get(question) if previous is not None else None
+            if entry is not None and entry["dependencies"] == dependencies:
+                entries.append({**entry, "embedding": list(embedding)})
+            else:
+                stale.append((question, embedding, documents, dependencies))
+        
+        failed = 0
+        if stale:
+            started = time.perf_counter()
+            answers = self.answer_chain.batch(
+                [{"context": build_context(documents), "question": question} for question, _, documents, _ in stale],
+                config={"max_concurrency": Config.MAX_CONCURRENT_QUERIES},
+                return_exceptions=True
+            )
+            for (question, embedding, _, dependencies), answer in zip(stale, answers):
+                if isinstance(answer, Exception):
+                    print(f"[!] Could not answer FAQ question {question!r}: {answer}")
+                    failed += 1
+                    continue
+                entries.append({
+                    "question": question,
+                    "embedding": list(embedding),
+                    "answer": self.fit_message(answer),
+                    "dependencies": dependencies,
+                })
+            print(f"[OK] Generated {len(stale) - failed} FAQ answer(s) in {time.perf_counter() - started:.2f}s")
+        
+        index.faq.replace(entries, self._faq_signature())
+        index.faq.save()
+        kept = {entry["question"].casefold() for entry in entries}
+        before = {question.casefold() for question in previous.questions()} if previous is not None else set()
+        return {
+            "questions": len(questions),
+            "generated": len(stale) - failed,
+            "reused": len(questions) - len(stale),
+            "failed": failed,
+            "changed": bool(stale) or kept != before,
+        }
+    
+    def refresh_index(self) -> bool:
+        """
+        Switch to the active collection if another process swapped in a new one.
+        
+        Worker processes share one persisted index: one of them reloads it,
+        and the others call this to follow. The previous collection is not
+        dropped here.
+        
+        Returns:
+            True if the collection changed
+        """
+        name = active_collection_name()
+        if name == self.index.name:
+            return False
+        new_index = self._open_index(name)
+        with self._index_lock:
+            old_index, self.index = self.index, new_index
+        self._knowledge_base_changed()
+        old_index.wait_idle()
+        print(f"[OK] Switched to collection {name}")
+        return True
+    
+    def reload_knowledge_base(self, knowledge_dir: str = "knowledge_base", full_rebuild: bool = False) -> dict:
+        """
+        Re-index the knowledge base files without interrupting queries.
+        
+        The active collection is copied, vectors included, into a new
+        versioned collection, which is then updated incrementally with
+        load_knowledge_base(). Queries keep using the active collection until
+        the new one is complete and swapped in; if nothing changed, the copy
+        is discarded and the active collection (and answer cache) is kept.
+        
+        The copy costs O(corpus) even when few files changed: every stored
+        vector and record is read and written again (and re-tokenized for
+        the keyword index), though nothing is re-embedded. That is cheap next to
+        embedding at the knowledge base sizes this bot serves, and keeps
+        the active collection untouched until the swap.
+        
+        Blocks until the reload is done, so callers on the event loop should
+        run it in an executor.
+        
+        Args:
+            knowledge_dir: Directory containing knowledge base files
+            full_rebuild: Re-embed everything instead of copying unchanged chunks
+            
+        Returns:
+            Summary counts of the changes made (see load_knowledge_base)
+            
+        Raises:
+            RuntimeError: Another reload is already running
+        """
+        from knowledge_loader import load_knowledge_base
+        
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("a knowledge base reload is already in progress")
+        try:
+            self._drop_stale_collections()
+            started = time.perf_counter()
+            staging = self._new_index()
+            try:
+                if not full_rebuild:
+                    copied = staging.copy_from(self.index)
+                    print(f"Copied {copied} chunks from {self.index.name} into {staging.name}")
+                summary = load_knowledge_base(staging, knowledge_dir, answerer=self)
+            except BaseException:
+                staging.drop()
+                raise
+            
+            unchanged = not summary["changed_files"] and not summary["deleted"]
+            if not full_rebuild and unchanged and not summary.get("faq", {}).get("changed"):
+                staging.drop()
+                print("Knowledge base unchanged, keeping the active collection")
+                return summary
+            
+            self._swap_index(staging)
+            print(f"[OK] Knowledge base reloaded in {time.perf_counter() - started:.2f}s")
+            return summary
+        finally:
+            self._reload_lock.release()
     
     def clear_knowledge_base(self):
         """Clear all documents from the knowledge base."""
-        self.client.delete_collection(name="club_knowledge")
-        self.vectorstore = Chroma(
-            client=self.client,
-            collection_name="club_knowledge",
-            embedding_function=self.embeddings
-        )
-
+        with self._reload_lock:
+            self._swap_index(self._new_index())
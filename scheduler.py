@@ -0,0 +1,206 @@
+"""Fair scheduling of bot queries with quotas, priorities and backpressure."""
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+
+class SchedulerBusy(Exception):
+    """Raised when the query queue is full."""
+
+
+class RateLimited(Exception):
+    """Raised when a user or guild has used up its query quota."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(f"{scope} rate limit exceeded, retry after {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Return the seconds until a token is available (0 if one is available now)."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """Consume a token; call wait_time() first."""
+        self.tokens -= 1
+
+    def is_full(self) -> bool:
+        return self.tokens >= self.capacity
+
+
+class QueryScheduler:
+    """
+    Bounded worker pool sitting between the bot and the RAG system.
+
+    Every job is charged against a per-user and a per-guild token bucket
+    and queued by priority (lower runs first, FIFO within a priority). When
+    the queue is full, submit() fails immediately with SchedulerBusy so the
+    bot can answer "busy" instead of letting latency grow without bound.
+    """
+
+    PRIORITY_COMMAND = 0
+    PRIORITY_MENTION = 1
+
+    # Idle buckets are dropped once this many are tracked
+    _MAX_BUCKETS = 10000
+
+    def __init__(
+        self,
+        workers: int = 8,
+        max_queue: int = 32,
+        user_rate_per_minute: float = 6,
+        user_burst: int = 3,
+        guild_rate_per_minute: float = 60,
+        guild_burst: int = 20
+    ):
+        """
+        Args:
+            workers: Number of jobs run concurrently
+            max_queue: Maximum number of jobs waiting for a worker
+            user_rate_per_minute: Sustained queries per minute per user
+            user_burst: Queries a user can send back to back
+            guild_rate_per_minute: Sustained queries per minute per guild
+            guild_burst: Queries a guild can send back to back
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate_per_minute / 60
+        self.guild_burst = guild_burst
+
+        self._queue = None
+        self._tasks = []
+        self._sequence = itertools.count()
+        self._user_buckets = {}
+        self._guild_buckets = {}
+
+        self.active = 0
+        self.completed = 0
+        self.rejected_busy = 0
+        self.rejected_rate_limited = 0
+
+    def start(self):
+        """Start the worker tasks (idempotent; needs a running event loop)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"query-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Cancel the worker tasks."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _bucket(self, buckets: dict, key, rate: float, burst: int) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self._MAX_BUCKETS:
+                for idle in [k for k, b in buckets.items() if b.wait_time() == 0 and b.is_full()]:
+                    del buckets[idle]
+            bucket = buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def _charge(self, user_id, guild_id):
+        """Take one token from the user's and guild's buckets, or raise RateLimited."""
+        now = time.monotonic()
+        buckets = [("user", self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst))]
+        if guild_id is not None:
+            buckets.append(("guild", self._bucket(self._guild_buckets, guild_id, self.guild_rate, self.guild_burst)))
+
+        for scope, bucket in buckets:
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                self.rejected_rate_limited += 1
+                raise RateLimited(scope, wait)
+        for _, bucket in buckets:
+            bucket.take()
+
+    async def submit(
+        self,
+        job: Callable[[], Awaitable[Any]],
+        user_id,
+        guild_id=None,
+        priority: int = PRIORITY_MENTION
+    ) -> Any:
+        """
+        Queue a job and wait for its result.
+
+        Args:
+            job: Coroutine function doing the work (e.g. answering and replying)
+            user_id: ID of the user the job is charged to
+            guild_id: ID of the guild the job is charged to (None for DMs)
+            priority: PRIORITY_COMMAND or PRIORITY_MENTION
+
+        Raises:
+            RateLimited: The user or guild is over its quota
+            SchedulerBusy: The queue is full
+        """
+        self.start()
+        if self._queue.full():
+            self.rejected_busy += 1
+            raise SchedulerBusy("query queue is full")
+        self._charge(user_id, guild_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._sequence), job, future))
+        return await future
+
+    async def _worker(self):
+        while True:
+            _, _, job, future = await self._queue.get()
+            if future.cancelled():
+                continue
+            self.active += 1
+            try:
+                result = await job()
+            except asyncio.CancelledError:
+                # A job cancelled from inside (e.g. a timed-out await) must not
+                # take the worker down with it; only stop() cancels the worker
+                future.cancel()
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        """Return queue depth, active jobs and rejection counters."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active": self.active,
+            "completed": self.completed,
+            "rejected_busy": self.rejected_busy,
+            "rejected_rate_limited": self.rejected_rate_limited,
+        }
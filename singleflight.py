@@ -0,0 +1,144 @@
+"""Coalescing of identical in-flight computations ("single flight")."""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, List, Optional
+
+import numpy as np
+
+
+class SingleFlight:
+    """
+    Let concurrent callers asking the same thing share one computation.
+
+    Calls are matched either by key (e.g. the normalized question text) or
+    by embedding: a new call whose embedding has at least the configured
+    cosine similarity to an in-flight call's embedding attaches to it and
+    receives its result (or exception) instead of starting its own.
+
+    Async callers (ado) and threaded callers (do) are tracked separately.
+    """
+
+    def __init__(self, similarity_threshold: Optional[float] = None):
+        """
+        Args:
+            similarity_threshold: Minimum cosine similarity for two calls to
+                be coalesced by embedding; None only matches by key
+        """
+        self.similarity_threshold = similarity_threshold
+        # key -> (future, normalized vector)
+        self._async_calls = {}
+        # key -> (_Call, normalized vector)
+        self._sync_calls = {}
+        self._lock = threading.Lock()
+
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _normalize(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _match(self, calls: dict, key: str, vector: Optional[np.ndarray]):
+        entry = calls.get(key)
+        if entry is not None:
+            return entry[0]
+        if vector is None or self.similarity_threshold is None:
+            return None
+        for call, other in calls.values():
+            if other is not None and float(other @ vector) >= self.similarity_threshold:
+                return call
+        return None
+
+    def find(self, key: str, embedding: Optional[List[float]] = None) -> Optional[asyncio.Future]:
+        """Return the future of a matching in-flight async call, if any."""
+        return self._match(self._async_calls, key, self._normalize(embedding))
+
+    def register(self, key: str, embedding: Optional[List[float]], future: asyncio.Future):
+        """
+        Register an in-flight async call that others may attach to.
+
+        The call is removed automatically once the future is done.
+        """
+        self._async_calls[key] = (future, self._normalize(embedding))
+        self.leaders += 1
+
+        def _done(_):
+            entry = self._async_calls.get(key)
+            if entry is not None and entry[0] is future:
+                del self._async_calls[key]
+
+        future.add_done_callback(_done)
+
+    async def wait(self, future: asyncio.Future) -> Any:
+        """Wait for another caller's in-flight result."""
+        self.coalesced += 1
+        # Shield so a cancelled follower does not cancel the shared work
+        return await asyncio.shield(future)
+
+    async def ado(self, key: str, embedding: Optional[List[float]], func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func() unless a matching call is already in flight, and return its result.
+
+        Args:
+            key: Exact-match key of the call
+            embedding: Optional embedding used for similarity matching
+            func: Coroutine function performing the work
+        """
+        existing = self.find(key, embedding)
+        if existing is not None:
+            return await self.wait(existing)
+
+        task = asyncio.ensure_future(func())
+        self.register(key, embedding, task)
+        return await asyncio.shield(task)
+
+    def do(self, key: str, embedding: Optional[List[float]], func: Callable[[], Any]) -> Any:
+        """Threaded counterpart of ado(): run func() or wait for a matching call."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            call = self._match(self._sync_calls, key, vector)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._sync_calls[key] = (call, vector)
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.event.set()
+
+    def stats(self) -> dict:
+        """Return how many computations ran and how many callers were coalesced."""
+        return {
+            "in_flight": len(self._async_calls) + len(self._sync_calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class _Call:
+    """State of an in-flight threaded call."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
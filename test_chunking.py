@@ -0,0 +1,90 @@
+"""
+Tests for token-aware chunking.
+
+Run with: python -m pytest test_chunking.py
+"""
+import sys
+
+import pytest
+
+import chunking
+from chunking import count_tokens, iter_chunks, split_text
+
+
+@pytest.fixture(autouse=True)
+def regex_tokens(monkeypatch):
+    """Count tokens with the regex fallback, so results don't depend on tiktoken."""
+    monkeypatch.setattr(chunking, "_encoding", None)
+    monkeypatch.setattr(chunking, "_encoding_loaded", True)
+
+
+def sentences(count: int) -> str:
+    return " ".join(f"Sentence {i} talks about topic {i}." for i in range(count))
+
+
+def test_chunks_stay_within_the_token_budget():
+    chunks = split_text(sentences(50), chunk_size=40, chunk_overlap=15)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_consecutive_chunks_share_whole_sentences():
+    # A sentence is 11 tokens, so one of them fits in the overlap
+    chunks = split_text(sentences(50), chunk_size=40, chunk_overlap=15)
+
+    assert len(chunks) > 1
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit("Sentence ", 1)[1]
+        assert chunk.startswith("Sentence " + last_sentence)
+
+
+def test_no_overlap_keeps_every_sentence_once():
+    text = sentences(50)
+    chunks = split_text(text, chunk_size=40, chunk_overlap=0)
+
+    assert " ".join(chunks) == text
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(40, 40), (40, 50), (40, -1), (0, 0)])
+def test_invalid_sizes_are_rejected(chunk_size, chunk_overlap):
+    with pytest.raises(ValueError):
+        split_text("Some text.", chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def test_streamed_windows_chunk_like_the_whole_text():
+    text = "\n\n".join(sentences(8) for _ in range(6))
+    windows = [text[i:i + 7] for i in range(0, len(text), 7)]
+
+    assert list(iter_chunks(windows, 40, 15)) == split_text(text, 40, 15)
+
+
+def test_long_stream_without_paragraph_breaks_is_cut_at_whitespace(monkeypatch):
+    monkeypatch.setattr(chunking, "_MAX_PENDING_CHARS", 50)
+    text = "word " * 200
+    windows = [text[i:i + 13] for i in range(0, len(text), 13)]
+
+    chunks = list(iter_chunks(windows, 40, 0))
+
+    assert " ".join(chunks).split() == text.split()
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_long_stream_without_whitespace_is_cut_at_the_cap(monkeypatch):
+    monkeypatch.setattr(chunking, "_MAX_PENDING_CHARS", 50)
+    text = "x" * 1000
+    windows = [text[i:i + 10] for i in range(0, len(text), 10)]
+
+    chunks = list(iter_chunks(windows, 40, 0))
+
+    assert "".join(chunks) == text
+    assert all(count_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_signature_names_the_tokenizer_in_use():
+    assert chunking.chunking_signature().startswith("tokens:regex:")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,93 @@
+"""
+Tests for the BM25 keyword index and reciprocal rank fusion.
+
+Run with: python -m pytest test_lexical_index.py
+"""
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def chunk(source: str, index: int, text: str = "") -> Document:
+    return Document(page_content=text or f"{source} {index}", metadata={"source": source, "chunk_index": index})
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / "lexical.json"))
+    index.add(
+        ["meetings", "room", "dues"],
+        [
+            "The club meets every Tuesday evening.",
+            "Meetings are held in room 214 of the science building.",
+            "Membership dues are 20 dollars per semester.",
+        ],
+        [{"source": "faq.md", "chunk_index": i} for i in range(3)]
+    )
+    return index
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("Where is the Club meeting?") == ["club", "meeting"]
+
+
+def test_exact_terms_rank_their_chunk_first(index):
+    results = index.search("Which room is 214?", k=3)
+
+    assert results[0].metadata["chunk_index"] == 1
+    # Only chunks sharing a term are returned
+    assert len(results) == 1
+
+
+def test_stopword_only_query_matches_nothing(index):
+    assert index.search("what is the", k=3) == []
+
+
+def test_replaced_and_deleted_documents_leave_the_postings(index):
+    index.add(["room"], ["Meetings moved to the library annex."], [{"source": "faq.md", "chunk_index": 1}])
+    assert index.search("214", k=3) == []
+    assert index.search("annex", k=3)[0].metadata["chunk_index"] == 1
+
+    index.delete(["room"])
+    assert index.search("annex", k=3) == []
+    assert len(index) == 2
+
+
+def test_index_is_saved_and_loaded(index):
+    index.save()
+
+    loaded = BM25Index(index.path)
+    assert loaded.load()
+    assert loaded.search("dues", k=1)[0].page_content == "Membership dues are 20 dollars per semester."
+
+
+def test_fusion_favours_documents_ranked_by_both_lists():
+    vector = [chunk("a.md", 0), chunk("b.md", 0), chunk("c.md", 0)]
+    keyword = [chunk("c.md", 0), chunk("d.md", 0)]
+
+    fused = reciprocal_rank_fusion([vector, keyword], k=3)
+
+    # b.md and d.md tie at rank 2; the earlier list breaks the tie
+    assert [doc.metadata["source"] for doc in fused] == ["c.md", "a.md", "b.md"]
+
+
+def test_fusion_ties_keep_the_order_of_the_earlier_list():
+    fused = reciprocal_rank_fusion([[chunk("a.md", 0)], [chunk("b.md", 0)]], k=2)
+
+    assert [doc.metadata["source"] for doc in fused] == ["a.md", "b.md"]
+
+
+def test_fusion_identifies_chunks_by_source_and_index():
+    # The same chunk as returned by both searches: different objects, and
+    # Chroma may return the index as a float
+    vector = [Document(page_content="text", metadata={"source": "a.md", "chunk_index": 2.0})]
+    keyword = [chunk("a.md", 2, "text")]
+
+    assert len(reciprocal_rank_fusion([vector, keyword], k=4)) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
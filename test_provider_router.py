@@ -0,0 +1,209 @@
+"""Test LLM provider hedging and failover against local stub servers."""
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from config import Config
+from llm_router import ProviderRouter
+import providers
+from providers import create_llm
+
+
+class StubProvider:
+    """OpenAI-compatible chat completions server with a configurable delay and status."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.delay = 0.0
+        self.status = 200
+        self.requests = 0
+        self.connections = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests += 1
+                time.sleep(stub.delay)
+                if stub.status != 200:
+                    self._send(stub.status, "application/json", json.dumps({"error": {"message": "stub error"}}))
+                    return
+
+                text = f"answer from {stub.name}"
+                if body.get("stream"):
+                    events = [
+                        {"id": "1", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"role": "assistant", "content": word + " "},
+                                      "finish_reason": None}]}
+                        for word in text.split()
+                    ]
+                    payload = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+                    self._send(200, "text/event-stream", payload)
+                else:
+                    self._send(200, "application/json", json.dumps({
+                        "id": "1", "object": "chat.completion", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": 3, "total_tokens": 4},
+                    }))
+
+            def _send(self, status, content_type, payload):
+                data = payload.encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The router cancelled this (losing) request
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    """A primary and a fallback stub provider, shut down after the test."""
+    primary, fallback = StubProvider("primary"), StubProvider("fallback")
+    yield primary, fallback
+    primary.close()
+    fallback.close()
+
+
+@pytest.fixture
+def make_router(monkeypatch):
+    """Build a deepseek -> openai router pointed at two stub providers."""
+    def make(primary: StubProvider, fallback: StubProvider, default_delay: float = 0.3) -> ProviderRouter:
+        monkeypatch.setattr(Config, "DEEPSEEK_API_BASE", primary.url)
+        monkeypatch.setattr(Config, "DEEPSEEK_API_KEY", "stub")
+        monkeypatch.setattr(Config, "OPENAI_API_BASE", fallback.url)
+        monkeypatch.setattr(Config, "OPENAI_API_KEY", "stub")
+        return ProviderRouter(
+            [("deepseek", create_llm("deepseek", max_retries=0)), ("openai", create_llm("openai", max_retries=0))],
+            default_delay=default_delay,
+            min_delay=0.1
+        )
+    return make
+
+
+def test_fast_primary_is_not_hedged(stubs, make_router):
+    primary, fallback = stubs
+    router = make_router(primary, fallback)
+
+    async def run():
+        for _ in range(ProviderRouter.MIN_SAMPLES):
+            answer = await router.ainvoke("hello")
+        return answer
+
+    answer = asyncio.run(run())
+    assert answer.content == "answer from primary"
+    assert router.hedged == 0 and fallback.requests == 0
+
+
+def test_slow_primary_is_hedged_to_fallback(stubs, make_router):
+    primary, fallback = stubs
+    router = make_router(primary, fallback)
+    primary.delay = 2.0
+
+    started = time.perf_counter()
+    answer = asyncio.run(router.ainvoke("hello"))
+    elapsed = time.perf_counter() - started
+
+    assert answer.content == "answer from fallback"
+    assert router.hedged == 1
+    assert elapsed < 1.0, f"answered in {elapsed:.2f}s instead of waiting for the primary"
+    # The cancelled primary call must not drag its latency window down
+    assert len(router._latency[("deepseek", "invoke")].samples) == 0
+    assert len(router._latency[("openai", "invoke")].samples) == 1
+
+
+def test_failing_primary_fails_over_immediately(stubs, make_router):
+    primary, fallback = stubs
+    # A hedge delay well above the time a failover takes
+    router = make_router(primary, fallback, default_delay=2.0)
+    primary.status = 429
+
+    started = time.perf_counter()
+    answer = asyncio.run(router.ainvoke("hello"))
+    elapsed = time.perf_counter() - started
+
+    assert answer.content == "answer from fallback"
+    assert router.failovers == 1 and router.hedged == 0
+    assert elapsed < 1.0, f"failed over in {elapsed:.2f}s instead of right away"
+    # A fast failure says nothing about the provider's answer latency
+    assert len(router._latency[("deepseek", "invoke")].samples) == 0
+    assert len(router._latency[("openai", "invoke")].samples) == 1
+
+
+def test_stream_is_hedged_on_first_token(stubs, make_router):
+    primary, fallback = stubs
+    router = make_router(primary, fallback)
+    primary.delay = 2.0
+
+    async def run():
+        return [chunk.content async for chunk in router.astream("hello")]
+
+    started = time.perf_counter()
+    pieces = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    assert "".join(pieces).strip() == "answer from fallback"
+    assert elapsed < 1.0, f"streamed in {elapsed:.2f}s"
+    assert len(router._latency[("deepseek", "stream")].samples) == 0
+
+
+def test_connections_are_pooled(stubs, make_router):
+    primary, fallback = stubs
+    router = make_router(primary, fallback)
+
+    async def run():
+        for _ in range(10):
+            await router.ainvoke("hello")
+        await asyncio.gather(*(router.ainvoke("hello") for _ in range(4)))
+
+    asyncio.run(run())
+    for _ in range(10):
+        router.invoke("hello")
+
+    assert primary.requests == 24
+    assert primary.connections <= 6, f"{primary.connections} connections opened for {primary.requests} requests"
+
+
+def test_openai_embeddings_share_the_pooled_client(monkeypatch):
+    monkeypatch.setattr(Config, "USE_OPENAI_EMBEDDINGS", True)
+    monkeypatch.setattr(Config, "EMBEDDING_MODEL", "text-embedding-3-small")
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "stub")
+
+    embeddings = providers.create_embeddings()
+
+    assert embeddings.model == "text-embedding-3-small"
+    assert embeddings.http_client is providers._http_client_kwargs()["http_client"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,72 @@
+"""
+Tests for quantized vector search.
+
+Run with: python -m pytest test_quantization.py
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from quantization import VectorQuantizer, recall_report
+from vector_index import NumpyIndex
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    """Normalized 128-dimensional vectors with 16 dimensions of structure, like real embeddings."""
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(2000, 16)) @ rng.normal(size=(16, 128)) + 0.05 * rng.normal(size=(2000, 128))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top(vectors, query, k):
+    return set(np.argsort(-(vectors @ query))[:k].tolist())
+
+
+@pytest.mark.parametrize("quantization, dimensions", [("int8", 0), ("int8", 32), ("none", 32)])
+def test_rescoring_recovers_the_exact_neighbours(vectors, quantization, dimensions):
+    [report] = recall_report(vectors, [VectorQuantizer(quantization, dimensions, "pca")], queries=100)
+
+    assert report["recall"] >= 0.9
+    assert report["recall_rescored"] >= 0.99
+
+
+def test_int8_pca_codes_are_a_sixteenth_of_float32(vectors):
+    quantizer = VectorQuantizer("int8", 32, "pca").fit(vectors)
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.int8 and codes.shape == (2000, 32)
+    assert quantizer.bytes_per_vector() * 16 == vectors.shape[1] * 4
+
+
+def test_saved_state_scores_like_the_fitted_quantizer(vectors):
+    quantizer = VectorQuantizer("int8", 32, "pca").fit(vectors)
+    codes = quantizer.encode(vectors)
+    restored = VectorQuantizer("int8", 32, "pca").load_state(quantizer.state())
+
+    np.testing.assert_array_equal(restored.score(codes, vectors[0]), quantizer.score(codes, vectors[0]))
+
+
+@pytest.mark.parametrize("quantization, reduction", [("int4", "pca"), ("int8", "random")])
+def test_invalid_settings_are_rejected(quantization, reduction):
+    with pytest.raises(ValueError):
+        VectorQuantizer(quantization, 32, reduction)
+
+
+def test_quantized_index_returns_the_exact_top_k(tmp_path, vectors):
+    index = NumpyIndex(str(tmp_path), "test", None, quantizer=VectorQuantizer("int8", 32, "pca"))
+    ids = [f"doc-{row}" for row in range(len(vectors))]
+    index.write(ids, vectors, ids, [{"row": row} for row in range(len(vectors))])
+    index.flush()
+    reopened = NumpyIndex(str(tmp_path), "test", None, quantizer=VectorQuantizer("int8", 32, "pca"))
+
+    for search_index in (index, reopened):
+        assert search_index._codes is not None
+        for row in range(0, 2000, 100):
+            found = {doc.metadata["row"] for doc in search_index.search(vectors[row].tolist(), k=4)}
+            assert found == exact_top(vectors, vectors[row], 4)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,59 @@
+"""
+Tests for the query scheduler's worker tasks.
+
+Run with: python -m pytest test_scheduler.py
+"""
+import asyncio
+import sys
+
+import pytest
+
+from scheduler import QueryScheduler
+
+
+def test_cancelled_job_does_not_stop_its_worker():
+    async def run():
+        scheduler = QueryScheduler(workers=1, user_burst=10)
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def answered():
+            return "answer"
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(scheduler.submit(cancelled, user_id=1), timeout=1.0)
+        alive = sum(not task.done() for task in scheduler._tasks)
+        try:
+            result = await asyncio.wait_for(scheduler.submit(answered, user_id=1), timeout=1.0)
+        finally:
+            await scheduler.stop()
+        return alive, result
+
+    alive, result = asyncio.run(run())
+    assert alive == 1
+    assert result == "answer"
+
+
+def test_stop_cancels_a_worker_running_a_job():
+    async def run():
+        scheduler = QueryScheduler(workers=1)
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        submitted = asyncio.create_task(scheduler.submit(slow, user_id=1))
+        await started.wait()
+        await asyncio.wait_for(scheduler.stop(), timeout=1.0)
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(submitted, timeout=1.0)
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler._tasks == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,40 @@
+"""Test the batched ingestion pipeline of the vector indexes."""
+import threading
+
+import pytest
+
+from config import Config
+from vector_index import NumpyIndex
+
+
+class FailingEmbeddings:
+    """Embeddings whose first batch fails."""
+
+    def embed_documents(self, texts):
+        raise RuntimeError("embedding backend down")
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+def test_failed_embedding_stops_the_reader_and_closes_the_records(tmp_path, monkeypatch):
+    # A queue much smaller than the input, so the reader blocks on it
+    monkeypatch.setattr(Config, "INGEST_QUEUE_SIZE", 2)
+    monkeypatch.setattr(Config, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(Config, "INGEST_WORKERS", 1)
+    index = NumpyIndex(str(tmp_path), "test", FailingEmbeddings())
+    closed = threading.Event()
+
+    def records():
+        try:
+            for i in range(1000):
+                yield f"doc-{i}", f"text {i}", {"source": "a.txt", "chunk_index": i}
+        finally:
+            closed.set()
+
+    generator = records()
+    with pytest.raises(RuntimeError, match="embedding backend down"):
+        index.ingest_documents(generator)
+
+    assert closed.is_set()
+    assert not any(thread.name == "rag-ingest-reader" for thread in threading.enumerate())
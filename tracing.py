@@ -0,0 +1,456 @@
+"""Per-request span traces, the slow-query log and on-demand sampling profiles."""
+import asyncio
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import STAGE_SECONDS
+
+# Trace of the request being handled in this task / thread
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Timeline of one request: stage spans, retrieved chunks and LLM calls."""
+
+    def __init__(self, kind: str, question: str, attributes: Optional[dict] = None):
+        self.kind = kind
+        self.question = question
+        self.attributes = dict(attributes or {})
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now(timezone.utc)
+        self.duration = None
+        self.spans: List[dict] = []
+        self.chunks: List[dict] = []
+        self.llm_calls: List[dict] = []
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _offset_ms(self, at: float) -> float:
+        return round((at - self.started) * 1000, 2)
+
+    def add_span(self, name: str, started: float, seconds: float, **attributes):
+        span = {"name": name, "start_ms": self._offset_ms(started), "duration_ms": round(seconds * 1000, 2)}
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    def add_chunks(self, documents):
+        """Record the chunks retrieved for the prompt."""
+        chunks = []
+        for doc in documents:
+            metadata = doc.metadata or {}
+            source, index = metadata.get("source"), metadata.get("chunk_index")
+            chunks.append({
+                "id": f"{source}::{index}" if source is not None and index is not None else None,
+                "chars": len(doc.page_content),
+            })
+        with self._lock:
+            self.chunks = chunks
+
+    def export(self) -> dict:
+        """Return what a worker process recorded, for add_remote() in the gateway."""
+        with self._lock:
+            return {
+                "attributes": dict(self.attributes),
+                "error": self.error,
+                "spans": list(self.spans),
+                "chunks": list(self.chunks),
+                "llm_calls": list(self.llm_calls),
+            }
+
+    def add_remote(self, remote: dict, dispatched: float, **attributes):
+        """
+        Merge the trace a worker process recorded for this request.
+
+        Args:
+            remote: The worker trace's export()
+            dispatched: perf_counter() time the request was sent to the worker
+            attributes: Extra attributes, e.g. the worker's number
+        """
+        offset = self._offset_ms(dispatched)
+        with self._lock:
+            for span in remote["spans"]:
+                self.spans.append({**span, "start_ms": round(span["start_ms"] + offset, 2)})
+            for call in remote["llm_calls"]:
+                self.llm_calls.append({**call, "start_ms": round(call["start_ms"] + offset, 2)})
+            if remote["chunks"]:
+                self.chunks = remote["chunks"]
+            self.attributes.update(remote["attributes"])
+            self.attributes.update(attributes)
+            if remote["error"] and not self.error:
+                self.error = remote["error"]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            llm_calls = list(self.llm_calls)
+            winner = next((call for call in llm_calls if call["outcome"] == "ok"), None)
+            return {
+                "timestamp": self.timestamp.isoformat(timespec="milliseconds"),
+                "kind": self.kind,
+                "question": self.question,
+                "duration_ms": round((self.duration or 0) * 1000, 2),
+                **self.attributes,
+                "error": self.error,
+                "provider": winner["provider"] if winner else None,
+                "prompt_tokens": winner["prompt_tokens"] if winner else None,
+                # Extra provider calls: hedges and failovers
+                "retries": max(0, len(llm_calls) - 1),
+                "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+                "chunks": list(self.chunks),
+                "llm_calls": llm_calls,
+            }
+
+
+def current_trace() -> Optional[Trace]:
+    """Return the trace of the request being handled, if it is traced."""
+    return _current_trace.get()
+
+
+def record_stage(name: str, started: float, **attributes):
+    """Record a stage that began at perf_counter() time started and ends now."""
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(seconds, name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, started, seconds, **attributes)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the with-block as a stage: a latency histogram sample, and a span if traced."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, started)
+
+
+def record_error(error: BaseException):
+    """Note an error that was handled (not raised) on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.error = f"{type(error).__name__}: {error}"
+
+
+def with_trace_context(func):
+    """
+    Wrap func to run in a copy of the current context.
+
+    Executor threads don't inherit context variables, so use this for work
+    handed to run_in_executor() that should add spans to the caller's trace.
+    """
+    context = contextvars.copy_context()
+    return lambda *args: context.run(func, *args)
+
+
+class SlowQueryLog:
+    """Append traces of requests slower than a threshold to a rotating JSONL file."""
+
+    def __init__(self, path: str, threshold_seconds: float, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        """
+        Args:
+            path: Log file; rotated to path.1 ... path.<backup_count>
+            threshold_seconds: Requests taking at least this long are logged
+            max_bytes: Size at which the file is rotated
+            backup_count: Rotated files kept
+        """
+        self.path = path
+        self.threshold = threshold_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"ragbot.slow_queries.{os.path.abspath(path)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        for existing in list(self._logger.handlers):
+            self._logger.removeHandler(existing)
+            existing.close()
+        self._logger.addHandler(handler)
+        self.logged = 0
+
+    def record(self, trace: Trace) -> bool:
+        """Log the trace if the request was slow. Returns whether it was logged."""
+        if trace.duration is None or trace.duration < self.threshold:
+            return False
+        self._logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+        self.logged += 1
+        return True
+
+
+# Leaf functions of threads that are waiting rather than working
+_IDLE_FRAMES = frozenset({
+    ("selectors.py", "select"), ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("thread.py", "_worker"), ("socketserver.py", "serve_forever"),
+})
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the stacks of all threads from a background thread.
+
+    Samples are aggregated as collapsed stacks ("frame;frame;frame count"),
+    the input format of flamegraph.pl, speedscope and similar tools. Idle
+    threads (waiting on a selector, lock or queue) are left out.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def write_collapsed(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileCapture:
+    """
+    Profile the next N traced requests.
+
+    The sampler runs from the first of them starting until the last of
+    them finishes, then writes a collapsed-stack file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._active = 0
+        self._profiler = None
+        self._path = None
+        self._interval = 0.005
+        self._on_done = None
+        self.last_path = None
+
+    @property
+    def armed(self) -> bool:
+        return self._remaining > 0 or self._active > 0
+
+    def arm(self, queries: int, path: str, interval: float = 0.005, on_done: Optional[Callable[[str, int], None]] = None):
+        """
+        Profile the next `queries` requests and write the stacks to path.
+
+        Args:
+            queries: Number of requests to profile
+            path: Collapsed-stack file to write
+            interval: Seconds between samples
+            on_done: Called with the path and sample count once the file is written
+
+        Raises:
+            RuntimeError: A capture is already in progress
+        """
+        with self._lock:
+            if self.armed:
+                raise RuntimeError("a profile capture is already in progress")
+            self._remaining = queries
+            self._path = path
+            self._interval = interval
+            self._on_done = on_done
+
+    def progress(self) -> Optional[dict]:
+        """Return the requests still to start and in progress, or None if not armed."""
+        if not self.armed:
+            return None
+        return {"remaining": self._remaining, "active": self._active, "path": self._path}
+
+    def claim(self) -> bool:
+        """Called when a request starts; returns whether it is being profiled."""
+        if not self._remaining:
+            return False
+        with self._lock:
+            if not self._remaining:
+                return False
+            self._remaining -= 1
+            self._active += 1
+            if self._profiler is None:
+                self._profiler = SamplingProfiler(self._interval)
+                self._profiler.start()
+            return True
+
+    def release(self):
+        """Called when a profiled request finishes."""
+        with self._lock:
+            self._active -= 1
+            if self._remaining or self._active:
+                return
+            profiler, self._profiler = self._profiler, None
+            path, on_done = self._path, self._on_done
+        profiler.stop()
+        profiler.write_collapsed(path)
+        self.last_path = path
+        print(f"[OK] Wrote profile of {profiler.samples} samples to {path}")
+        if on_done is not None:
+            on_done(path, profiler.samples)
+
+
+# Configured by configure(); the slow-query log is opt-in
+SLOW_QUERY_LOG: Optional[SlowQueryLog] = None
+PROFILE_CAPTURE = ProfileCapture()
+
+
+def configure(slow_query_log: Optional[SlowQueryLog]):
+    """Install (or, with None, remove) the slow-query log."""
+    global SLOW_QUERY_LOG
+    SLOW_QUERY_LOG = slow_query_log
+
+
+@contextmanager
+def trace_request(kind: str, question: str, force: bool = False, **attributes):
+    """
+    Trace a request while the with-block runs.
+
+    Nested calls (the RAG query inside a bot request) join the enclosing
+    trace. When neither the slow-query log nor a profile capture is active
+    this does nothing, so it can stay in every request path.
+
+    Args:
+        kind: Request type recorded in the trace
+        question: The question being answered
+        force: Trace even if nothing here consumes the trace (a worker
+            process tracing for the gateway)
+        attributes: Extra fields recorded in the trace
+
+    Yields:
+        The trace, or None if the request isn't traced
+    """
+    trace = _current_trace.get()
+    if trace is not None or (not force and SLOW_QUERY_LOG is None and not PROFILE_CAPTURE.armed):
+        yield trace
+        return
+
+    trace = Trace(kind, question, attributes)
+    token = _current_trace.set(trace)
+    profiled = PROFILE_CAPTURE.claim()
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        trace.duration = time.perf_counter() - trace.started
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # An async generator finished in a different context
+            pass
+        if profiled:
+            PROFILE_CAPTURE.release()
+        if SLOW_QUERY_LOG is not None:
+            SLOW_QUERY_LOG.record(trace)
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """Make a request's trace current in another task, e.g. the scheduler worker running it."""
+    if trace is None:
+        yield
+        return
+    token = _current_trace.set(trace)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+class LLMTraceHandler(BaseCallbackHandler):
+    """LangChain callback adding every LLM provider call to the current trace."""
+
+    run_inline = True
+
+    def __init__(self):
+        # run ID -> (trace, call record, start time, prompt messages)
+        self._runs: Dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        metadata = metadata or {}
+        started = time.perf_counter()
+        call = {
+            "provider": metadata.get("llm_provider") or metadata.get("ls_provider"),
+            "model": metadata.get("ls_model_name"),
+            "start_ms": trace._offset_ms(started),
+            "duration_ms": None,
+            "outcome": None,
+            "prompt_tokens": None,
+            "completion_tokens": None,
+        }
+        with trace._lock:
+            trace.llm_calls.append(call)
+        self._runs[run_id] = (trace, call, started, messages)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        trace, call, started, messages = run
+        call["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        call["outcome"] = "ok"
+
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        usage = getattr(message, "usage_metadata", None) if message is not None else None
+        if usage:
+            call["prompt_tokens"] = usage.get("input_tokens")
+            call["completion_tokens"] = usage.get("output_tokens")
+        else:
+            from chunking import count_tokens
+            call["prompt_tokens"] = sum(count_tokens(str(m.content)) for batch in messages for m in batch)
+            call["completion_tokens"] = sum(count_tokens(g.text) for g in generations)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        trace, call, started, _ = run
+        call["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if isinstance(error, asyncio.CancelledError):
+            call["outcome"] = "cancelled"
+        else:
+            call["outcome"] = f"error: {type(error).__name__}: {error}"[:300]
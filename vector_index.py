@@ -0,0 +1,625 @@
+"""Vector indexes holding the embedded knowledge base chunks."""
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import Config
+from lexical_index import BM25Index
+from quantization import VectorQuantizer
+
+
+class VectorIndex:
+    """
+    Base class of a collection of embedded chunks.
+
+    Subclasses store and search the vectors; this class provides the batched
+    ingestion pipeline, keeps the optional keyword index in step with every
+    change, and counts the searches running against the index, so an index
+    replaced by a reload can wait for them before it is dropped.
+    """
+
+    def __init__(self, name: str, embeddings):
+        """
+        Args:
+            name: Name of the collection
+            embeddings: Embeddings used to embed ingested documents
+        """
+        self.name = name
+        self.embeddings = embeddings
+        # Optional BM25Index of the same documents (see attach_lexical_index)
+        self.lexical = None
+        # Optional faq.FAQTable of answers generated from these documents
+        self.faq = None
+        self._users = 0
+        self._idle = threading.Condition()
+
+    # Storage interface implemented by subclasses
+
+    def count(self) -> int:
+        """Return the number of stored documents."""
+        raise NotImplementedError
+
+    def search(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Return the k documents closest to a query embedding."""
+        raise NotImplementedError
+
+    def get_index_state(self) -> dict:
+        """Return a mapping of every document ID to its metadata dictionary."""
+        raise NotImplementedError
+
+    def iter_records(self, batch_size: int = 1000) -> Iterable[Tuple[List[str], list, List[str], List[dict]]]:
+        """Yield (ids, vectors, texts, metadatas) batches of every stored document."""
+        raise NotImplementedError
+
+    def _write(self, ids: List[str], vectors, texts: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+
+    def _update_metadatas(self, ids: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+
+    def _delete_documents(self, ids: List[str]):
+        raise NotImplementedError
+
+    def _flush(self):
+        pass
+
+    def _drop(self):
+        raise NotImplementedError
+
+    # Changes, applied to the vectors and to the keyword index
+
+    def attach_lexical_index(self, path: str):
+        """
+        Keep a BM25 keyword index of the documents, saved at path.
+
+        If no saved index exists yet (e.g. the collection predates hybrid
+        search), it is built from the stored documents.
+        """
+        lexical = BM25Index(path)
+        if not lexical.load() and self.count():
+            for ids, _, texts, metadatas in self.iter_records():
+                lexical.add(ids, texts, metadatas)
+            lexical.save()
+        self.lexical = lexical
+
+    def write(self, ids: List[str], vectors, texts: List[str], metadatas: List[dict]):
+        """Insert or replace embedded documents (call flush() when done)."""
+        self._write(ids, vectors, texts, metadatas)
+        if self.lexical is not None:
+            self.lexical.add(ids, texts, metadatas)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]):
+        """Replace the metadata of existing documents without re-embedding them."""
+        if not ids:
+            return
+        self._update_metadatas(ids, metadatas)
+        if self.lexical is not None:
+            self.lexical.update_metadatas(ids, metadatas)
+        self.flush()
+
+    def delete_documents(self, ids: List[str]):
+        """Delete documents by ID."""
+        if not ids:
+            return
+        self._delete_documents(ids)
+        if self.lexical is not None:
+            self.lexical.delete(ids)
+        self.flush()
+
+    def flush(self):
+        """Persist buffered writes."""
+        self._flush()
+        if self.lexical is not None:
+            self.lexical.save()
+
+    def drop(self):
+        """Delete the collection and its storage."""
+        self._drop()
+        if self.lexical is not None:
+            self.lexical.drop()
+        if self.faq is not None:
+            self.faq.drop()
+
+    # Shared behaviour
+
+    def acquire(self):
+        """Mark the index as used by a search; pair with release()."""
+        with self._idle:
+            self._users += 1
+
+    def release(self):
+        """End a use started with acquire()."""
+        with self._idle:
+            self._users -= 1
+            if self._users == 0:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until no search is using the index.
+
+        Returns:
+            False if searches were still running after timeout seconds
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._users == 0, timeout)
+
+    def copy_from(self, other: "VectorIndex") -> int:
+        """
+        Copy every document of another index, reusing its stored vectors.
+
+        Reads and writes the whole index: linear in its size, but without
+        any embedding calls.
+
+        Returns:
+            Number of documents copied
+        """
+        copied = 0
+        for ids, vectors, texts, metadatas in other.iter_records():
+            self.write(ids, vectors, texts, metadatas)
+            copied += len(ids)
+        self.flush()
+        return copied
+
+    def ingest_documents(self, records: Iterable[Tuple[str, str, dict]]) -> dict:
+        """
+        Embed and write a stream of documents in batches.
+
+        The records iterable is drained by a producer thread into a queue of
+        at most Config.INGEST_QUEUE_SIZE records, so lazily generated input
+        (file reading, chunking) runs ahead of embedding without ever being
+        materialized in full. Batches of Config.INGEST_BATCH_SIZE records are
+        embedded on a pool of Config.INGEST_WORKERS threads while finished
+        batches are written to the index, and at most one batch per worker is
+        in flight at a time.
+
+        If embedding or writing fails, the producer is stopped and joined
+        and a generator passed as records is closed, so whatever it holds
+        open (e.g. the loader's parse worker processes) is released.
+
+        Args:
+            records: Iterable of (id, text, metadata) tuples; existing
+                documents with the same IDs are replaced
+
+        Returns:
+            Dictionary with the chunk count, total seconds, chunks per second
+            and per-batch embed/write timings
+        """
+        stats = {"chunks": 0, "seconds": 0.0, "chunks_per_second": 0.0, "batches": []}
+        batch_size = max(1, Config.INGEST_BATCH_SIZE)
+        workers = max(1, Config.INGEST_WORKERS)
+        started = time.perf_counter()
+
+        # Producer stage: pull records off the (possibly lazy) iterable
+        records_queue = queue.Queue(maxsize=max(1, Config.INGEST_QUEUE_SIZE))
+        done = object()
+        # Set when the consumer stops, so a producer blocked on a full queue gives up
+        stopped = threading.Event()
+
+        def put(item) -> bool:
+            while not stopped.is_set():
+                try:
+                    records_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for record in records:
+                    if not put(record):
+                        return
+            except BaseException as e:
+                put(e)
+            put(done)
+
+        producer = threading.Thread(target=produce, name="rag-ingest-reader", daemon=True)
+        producer.start()
+
+        def next_batch():
+            batch = []
+            while len(batch) < batch_size:
+                record = records_queue.get()
+                if record is done:
+                    # Leave the marker for the next call
+                    records_queue.put(done)
+                    break
+                if isinstance(record, BaseException):
+                    raise record
+                batch.append(record)
+            return batch
+
+        def embed_batch(batch):
+            batch_started = time.perf_counter()
+            vectors = self.embeddings.embed_documents([text for _, text, _ in batch])
+            return vectors, time.perf_counter() - batch_started
+
+        def write_batch(batch, future):
+            vectors, embed_seconds = future.result()
+            write_started = time.perf_counter()
+            self.write(
+                [doc_id for doc_id, _, _ in batch],
+                vectors,
+                [text for _, text, _ in batch],
+                [metadata for _, _, metadata in batch]
+            )
+            timing = {
+                "size": len(batch),
+                "embed_seconds": embed_seconds,
+                "write_seconds": time.perf_counter() - write_started
+            }
+            stats["batches"].append(timing)
+            stats["chunks"] += len(batch)
+            print(
+                f"  Batch {len(stats['batches'])}: {timing['size']} chunks, "
+                f"embed {timing['embed_seconds']:.2f}s, write {timing['write_seconds']:.2f}s"
+            )
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-ingest") as pool:
+                pending = deque()
+                batch = next_batch()
+                while batch:
+                    pending.append((batch, pool.submit(embed_batch, batch)))
+                    if len(pending) > workers:
+                        write_batch(*pending.popleft())
+                    batch = next_batch()
+                while pending:
+                    write_batch(*pending.popleft())
+        finally:
+            stopped.set()
+            # Unblock the producer and drop what it read ahead
+            while True:
+                try:
+                    records_queue.get_nowait()
+                except queue.Empty:
+                    break
+            producer.join()
+            if isinstance(records, types.GeneratorType):
+                records.close()
+        if stats["chunks"] == 0:
+            return stats
+        self.flush()
+
+        stats["seconds"] = time.perf_counter() - started
+        stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+        print(
+            f"[OK] Embedded and stored {stats['chunks']} chunks in {stats['seconds']:.2f}s "
+            f"({stats['chunks_per_second']:.1f} chunks/sec)"
+        )
+        return stats
+
+
+class ChromaIndex(VectorIndex):
+    """A Chroma collection, created if it doesn't exist."""
+
+    def __init__(self, client, name: str, embeddings):
+        """
+        Args:
+            client: chromadb client the collection lives in
+            name: Name of the collection
+            embeddings: Embeddings used to embed ingested documents
+        """
+        super().__init__(name, embeddings)
+        from langchain_community.vectorstores import Chroma
+        self.client = client
+        self.vectorstore = Chroma(
+            client=client,
+            collection_name=name,
+            embedding_function=embeddings
+        )
+        self._collection = self.vectorstore._collection
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def search(self, embedding: List[float], k: int = 4) -> List[Document]:
+        return self.vectorstore.similarity_search_by_vector(embedding, k=k)
+
+    def _write(self, ids, vectors, texts, metadatas):
+        self._collection.upsert(
+            ids=list(ids),
+            embeddings=vectors,
+            documents=list(texts),
+            # Chroma rejects empty metadata dictionaries
+            metadatas=[metadata or None for metadata in metadatas]
+        )
+
+    def _update_metadatas(self, ids, metadatas):
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def _delete_documents(self, ids):
+        self._collection.delete(ids=ids)
+
+    def get_index_state(self) -> dict:
+        result = self._collection.get(include=["metadatas"])
+        return {
+            doc_id: metadata or {}
+            for doc_id, metadata in zip(result["ids"], result["metadatas"])
+        }
+
+    def iter_records(self, batch_size: int = 1000):
+        offset = 0
+        while True:
+            result = self._collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            if not result["ids"]:
+                return
+            yield result["ids"], result["embeddings"], result["documents"], result["metadatas"]
+            offset += len(result["ids"])
+
+    def _drop(self):
+        self.client.delete_collection(name=self.name)
+
+
+class NumpyIndex(VectorIndex):
+    """
+    In-process index of normalized float32 vectors.
+
+    The vectors are stored as a matrix in vectors.npy, memory-mapped when
+    loaded, and the IDs, texts and metadata of its rows in records.json.
+    A search is one matrix-vector product (cosine similarity) followed by
+    argpartition, which for a few thousand chunks is much cheaper than a
+    round trip through Chroma. Writes are buffered in memory and saved by
+    flush(), which the ingestion pipeline calls when it is done.
+
+    With a VectorQuantizer, a compact copy of the matrix (int8 codes and/or
+    fewer dimensions, fitted when the index is saved) is kept in memory
+    and searched instead, and the best rescore_candidates rows are
+    re-scored with the float vectors, of which only those rows are read
+    from the memory-mapped file.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    RECORDS_FILE = "records.json"
+    QUANTIZED_FILE = "quantized.npz"
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        embeddings,
+        quantizer: Optional[VectorQuantizer] = None,
+        rescore_candidates: int = 32
+    ):
+        """
+        Args:
+            directory: Directory holding the collection's files (created if missing)
+            name: Name of the collection
+            embeddings: Embeddings used to embed ingested documents
+            quantizer: Unfitted quantizer to search with (None searches the float vectors)
+            rescore_candidates: Candidates re-scored with the float vectors
+                after a quantized search (0 disables re-scoring)
+        """
+        super().__init__(name, embeddings)
+        self.directory = directory
+        self.quantizer = quantizer if quantizer is not None and quantizer.enabled else None
+        self.rescore_candidates = rescore_candidates
+        # Encoded rows of _matrix, or None until the quantizer is fitted to the saved index
+        self._codes = None
+        self._lock = threading.RLock()
+        self._dirty = False
+        # Rows [0, _size) of _matrix are in use; spare rows make appends amortized O(1)
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._rows = {}
+        self._load()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self._path(self.RECORDS_FILE)):
+            return
+        with open(self._path(self.RECORDS_FILE), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        matrix = np.load(self._path(self.VECTORS_FILE), mmap_mode="r")
+        if matrix.shape[0] != len(records["ids"]):
+            raise ValueError(
+                f"{self.directory} is inconsistent: {matrix.shape[0]} vectors "
+                f"but {len(records['ids'])} records"
+            )
+        self._matrix = matrix
+        self._size = matrix.shape[0]
+        self._ids = records["ids"]
+        self._texts = records["texts"]
+        self._metadatas = records["metadatas"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._load_codes()
+
+    def _load_codes(self):
+        """Load the saved quantized vectors, or fit and save them if they are missing or stale."""
+        if self.quantizer is None or self._size == 0:
+            return
+        path = self._path(self.QUANTIZED_FILE)
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                if str(saved["signature"]) == self.quantizer.signature() and len(saved["codes"]) == self._size:
+                    self.quantizer.load_state(saved)
+                    self._codes = saved["codes"]
+                    return
+        self._fit_codes()
+
+    def _fit_codes(self):
+        """Fit the quantizer to the saved vectors and save the encoded matrix."""
+        matrix = self._matrix[:self._size]
+        self.quantizer.fit(matrix)
+        codes = self.quantizer.encode(matrix)
+        path = self._path(self.QUANTIZED_FILE)
+        # Per-process name: bot workers sharing the directory may fit at once
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, codes=codes, signature=np.array(self.quantizer.signature()), **self.quantizer.state())
+        os.replace(temp_path, path)
+        self._codes = codes
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def _writable(self, rows: int, dimensions: int):
+        """Make _matrix an in-memory array with room for at least rows rows."""
+        if self._size and dimensions != self._matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension {dimensions} does not match the index ({self._matrix.shape[1]})"
+            )
+        if isinstance(self._matrix, np.memmap) or rows > self._matrix.shape[0] or self._matrix.shape[1] != dimensions:
+            capacity = max(rows, 2 * self._size, 64)
+            matrix = np.empty((capacity, dimensions), dtype=np.float32)
+            if self._size:
+                matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def count(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """Return the indexes of the k highest scores, best first."""
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, embedding: List[float], k: int = 4) -> List[Document]:
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            codes = self._codes
+            texts, metadatas = self._texts, self._metadatas
+        if size == 0 or k <= 0:
+            return []
+
+        query = self._normalize(embedding)[0]
+        if codes is None:
+            top = self._top(matrix[:size] @ query, k)
+        else:
+            approximate = self.quantizer.score(codes, query)
+            if self.rescore_candidates:
+                # Sorted rows read the memory-mapped file in order
+                candidates = np.sort(self._top(approximate, max(k, self.rescore_candidates)))
+                top = candidates[self._top(matrix[candidates] @ query, k)]
+            else:
+                top = self._top(approximate, k)
+        return [
+            Document(page_content=texts[row], metadata=dict(metadatas[row] or {}))
+            for row in top
+        ]
+
+    def _write(self, ids, vectors, texts, metadatas):
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = self._normalize(vectors)
+        with self._lock:
+            new_rows = sum(1 for doc_id in set(ids) if doc_id not in self._rows)
+            self._writable(self._size + new_rows, vectors.shape[1])
+            for doc_id, vector, text, metadata in zip(ids, vectors, texts, metadatas):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._rows[doc_id] = self._size
+                    self._size += 1
+                    self._ids.append(doc_id)
+                    self._texts.append(text)
+                    self._metadatas.append(metadata or {})
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = metadata or {}
+                self._matrix[row] = vector
+            self._codes = None
+            self._dirty = True
+
+    def _update_metadatas(self, ids, metadatas):
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                row = self._rows.get(doc_id)
+                if row is not None:
+                    self._metadatas[row] = metadata or {}
+            self._dirty = True
+
+    def _delete_documents(self, ids):
+        with self._lock:
+            remove = {self._rows[doc_id] for doc_id in ids if doc_id in self._rows}
+            if not remove:
+                return
+            keep = [row for row in range(self._size) if row not in remove]
+            # Searches may still hold the old lists and matrix, so build new ones
+            self._matrix = np.ascontiguousarray(self._matrix[keep], dtype=np.float32)
+            self._ids = [self._ids[row] for row in keep]
+            self._texts = [self._texts[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._size = len(keep)
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._codes = None
+            self._dirty = True
+
+    def get_index_state(self) -> dict:
+        with self._lock:
+            return {doc_id: dict(metadata or {}) for doc_id, metadata in zip(self._ids, self._metadatas)}
+
+    def iter_records(self, batch_size: int = 1000):
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            ids, texts, metadatas = list(self._ids), list(self._texts), list(self._metadatas)
+        for start in range(0, size, batch_size):
+            end = min(start + batch_size, size)
+            yield ids[start:end], np.array(matrix[start:end]), texts[start:end], metadatas[start:end]
+
+    def _flush(self):
+        """Save the vectors and records, then memory-map the saved vectors."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            vectors_path = self._path(self.VECTORS_FILE)
+            records_path = self._path(self.RECORDS_FILE)
+
+            # Write both files next to their targets (under per-process
+            # names), then move them into place
+            suffix = f".{os.getpid()}.tmp"
+            with open(vectors_path + suffix, "wb") as f:
+                np.save(f, np.ascontiguousarray(self._matrix[:self._size]))
+            with open(records_path + suffix, "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, f)
+            os.replace(vectors_path + suffix, vectors_path)
+            os.replace(records_path + suffix, records_path)
+
+            self._matrix = np.load(vectors_path, mmap_mode="r")
+            self._dirty = False
+            if self.quantizer is not None and self._codes is None and self._size:
+                self._fit_codes()
+            elif self.quantizer is None and os.path.exists(self._path(self.QUANTIZED_FILE)):
+                # Would be stale if quantization is turned back on
+                os.remove(self._path(self.QUANTIZED_FILE))
+
+    def _drop(self):
+        with self._lock:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self._size = 0
+            self._codes = None
+            self._ids, self._texts, self._metadatas, self._rows = [], [], [], {}
+            self._dirty = False
+        shutil.rmtree(self.directory, ignore_errors=True)
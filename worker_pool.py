@@ -0,0 +1,696 @@
+"""
+Pool of RAG worker processes answering questions for the bot process.
+
+The bot process (the gateway) keeps the Discord connection and forwards
+each question over a local socket to one of N worker processes, each with
+its own RAGSystem opened on the shared, persisted index. Embedding and
+retrieval then use every core instead of sharing one interpreter, and a
+worker that crashes is restarted without the bot disconnecting.
+
+Run as a script, this module is a worker process; RAGWorkerPool starts
+the workers itself.
+"""
+import argparse
+import asyncio
+import atexit
+import importlib
+import itertools
+import json
+import math
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from answer_length import ErrorMessage, answer_char_budget, fit_text
+from config import Config
+from metrics import LLM_TOKENS, STAGE_SECONDS, Histogram, start_http_server
+from tracing import PROFILE_CAPTURE, current_trace, record_error, record_stage, trace_request
+
+# The workers authenticate to the pool's socket with a key passed in their environment
+AUTHKEY_ENV = "RAG_WORKER_AUTHKEY"
+
+# Fields of the worker stats that aren't summed across workers
+_SHARED_FIELDS = {"index_chunks", "threshold", "questions"}
+_MAX_FIELDS = {"largest_batch", "p95_seconds", "p95_first_token_seconds"}
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process handling a request exited before answering."""
+
+
+def _resolve(future: Future, result=None, error: Optional[BaseException] = None):
+    """Complete a future unless its caller already gave up on it."""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _merge_stats(sections: List[Optional[dict]]) -> Optional[dict]:
+    """
+    Combine the stats() of several RAGSystems into one.
+
+    Counters are summed, ratios recomputed from the sums, and settings
+    every worker shares are taken from the first.
+    """
+    sections = [section for section in sections if section is not None]
+    if not sections:
+        return None
+    merged = {}
+    for section in sections:
+        for key, value in section.items():
+            if isinstance(value, dict) or (value is None and isinstance(merged.get(key), dict)):
+                merged[key] = _merge_stats([merged.get(key), value])
+            elif key not in merged or key in _SHARED_FIELDS:
+                merged.setdefault(key, value)
+            elif key in _MAX_FIELDS:
+                merged[key] = max((v for v in (merged[key], value) if v is not None), default=None)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] += value
+    if "hit_rate" in merged:
+        lookups = merged["hits"] + merged["misses"]
+        merged["hit_rate"] = merged["hits"] / lookups if lookups else 0.0
+    if "requests_per_batch" in merged:
+        merged["requests_per_batch"] = merged["requests"] / merged["batches"] if merged["batches"] else 0.0
+    return merged
+
+
+class _Worker:
+    """The pool's view of one worker process."""
+
+    def __init__(self, number: int):
+        self.number = number
+        self.process: Optional[subprocess.Popen] = None
+        self.connection = None
+        self.pid = None
+        self.ready = False
+        self.ready_event = threading.Event()
+        # Exits while (re)starting are handled by whoever is starting it
+        self.starting = True
+        self.restarts = 0
+        self.requests = 0
+        # request ID -> (future, chunk callback)
+        self.pending: Dict[int, Tuple[Future, Optional[Callable[[str], None]]]] = {}
+        self.send_lock = threading.Lock()
+
+
+class WorkerProfileCapture:
+    """
+    Profile captures run in the worker processes (see tracing.ProfileCapture).
+
+    Each worker profiles its share of the next questions and writes its own
+    collapsed-stack file, reported through on_done as it is written.
+    """
+
+    def __init__(self, pool: "RAGWorkerPool"):
+        self._pool = pool
+        self._waiting = set()
+        self._on_done = None
+
+    def arm(self, queries: int, path: str, interval: float = 0.005, on_done: Optional[Callable[[str, int], None]] = None):
+        """
+        Profile the next `queries` requests, split across the workers.
+
+        Args:
+            queries: Number of requests to profile
+            path: Collapsed-stack file name; each worker inserts its number
+            interval: Seconds between samples
+            on_done: Called with the path and sample count of each worker's file
+
+        Raises:
+            RuntimeError: A capture is already in progress
+        """
+        if self._waiting:
+            raise RuntimeError("a profile capture is already in progress")
+        workers = self._pool.live_workers()
+        if not workers:
+            raise RuntimeError("no RAG worker is available")
+        self._on_done = on_done
+        self._waiting = {worker.number for worker in workers}
+        share = math.ceil(queries / len(workers))
+        for worker in workers:
+            self._pool.call("profile", share, path, interval, worker=worker)
+
+    def progress(self) -> Optional[dict]:
+        """Return the requests still to start and in progress, or None if not armed."""
+        if not self._waiting:
+            return None
+        progress = {"remaining": 0, "active": 0, "path": None}
+        for worker_progress in self._pool.broadcast("profile_progress", timeout=10):
+            if worker_progress is not None:
+                progress["remaining"] += worker_progress["remaining"]
+                progress["active"] += worker_progress["active"]
+        return progress
+
+    def _finished(self, number: int, path: Optional[str], samples: int):
+        self._waiting.discard(number)
+        if path is not None and self._on_done is not None:
+            self._on_done(path, samples)
+
+
+class RAGWorkerPool:
+    """
+    Gateway-side handle on the worker processes, used by the bot like a RAGSystem.
+
+    Questions go to the worker with the fewest requests in flight; each
+    worker answers many at once on its own event loop. If a worker dies,
+    its questions are retried once on another worker (streams only if
+    nothing was sent yet) and it is restarted with backoff.
+
+    Reloads are coordinated: one worker builds and swaps in the new
+    collection, every worker then switches to it, and only then is the
+    previous collection dropped.
+    """
+
+    # Times a question is retried on another worker after a crash
+    RETRIES = 1
+
+    def __init__(
+        self,
+        processes: int,
+        factory: Optional[str] = None,
+        factory_kwargs: Optional[dict] = None,
+        start_timeout: float = 600,
+        metrics_port: int = 0
+    ):
+        """
+        Args:
+            processes: Number of worker processes
+            factory: "module:function" returning the RAGSystem each worker
+                uses, instead of RAGSystem() (benchmarks pass fakes)
+            factory_kwargs: JSON-serializable arguments for the factory
+            start_timeout: Seconds a worker may take to become ready
+            metrics_port: If set, worker i serves its metrics on metrics_port + 1 + i
+        """
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.workers = [_Worker(number) for number in range(processes)]
+        self.factory = factory
+        self.factory_kwargs = factory_kwargs or {}
+        self.start_timeout = start_timeout
+        self.metrics_port = metrics_port
+        self.profile_capture = WorkerProfileCapture(self)
+        self._authkey = secrets.token_bytes(32)
+        self._listener = None
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """
+        Start the workers and wait until all are ready.
+
+        The first worker indexes the knowledge base if it is empty; the
+        others start once it is done. Blocks, so run it in an executor.
+
+        Raises:
+            RuntimeError: A worker failed to start
+        """
+        self._listener = Listener(authkey=self._authkey)
+        threading.Thread(target=self._accept_loop, name="rag-worker-accept", daemon=True).start()
+        atexit.register(self.shutdown)
+
+        first, rest = self.workers[0], self.workers[1:]
+        self._spawn(first, prepare=True)
+        if not self._wait_ready(first):
+            raise RuntimeError("RAG worker 0 failed to start")
+        for worker in rest:
+            self._spawn(worker)
+        for worker in rest:
+            if not self._wait_ready(worker):
+                raise RuntimeError(f"RAG worker {worker.number} failed to start")
+        for worker in self.workers:
+            worker.starting = False
+        print(f"[OK] {len(self.workers)} RAG worker process(es) ready")
+
+    def shutdown(self):
+        """Stop the workers."""
+        if self._closed:
+            return
+        self._closed = True
+        for worker in self.workers:
+            connection = worker.connection
+            if connection is not None:
+                try:
+                    with worker.send_lock:
+                        connection.send((None, "shutdown", ()))
+                except (OSError, ValueError):
+                    pass
+        for worker in self.workers:
+            if worker.process is not None:
+                try:
+                    worker.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+        if self._listener is not None:
+            self._listener.close()
+
+    # Process management
+
+    def _spawn(self, worker: _Worker, prepare: bool = False):
+        command = [
+            sys.executable, os.path.abspath(__file__),
+            "--number", str(worker.number),
+            "--address", self._listener.address,
+            "--metrics-port", str(self.metrics_port + 1 + worker.number if self.metrics_port else 0),
+        ]
+        if prepare:
+            command.append("--prepare")
+        if self.factory:
+            command += ["--factory", self.factory, "--factory-kwargs", json.dumps(self.factory_kwargs)]
+        worker.ready = False
+        worker.ready_event.clear()
+        worker.process = subprocess.Popen(command, env=dict(os.environ, **{AUTHKEY_ENV: self._authkey.hex()}))
+
+    def _wait_ready(self, worker: _Worker) -> bool:
+        """Wait for a spawned worker; returns False if it exited or timed out first."""
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if worker.ready_event.wait(0.5) and worker.ready:
+                return True
+            if worker.process.poll() is not None:
+                return False
+        worker.process.kill()
+        return False
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+                _, number, pid = connection.recv()
+            except Exception:
+                # Closed on shutdown, or a client that failed to authenticate
+                continue
+            worker = self.workers[number]
+            with self._lock:
+                worker.connection, worker.pid = connection, pid
+            threading.Thread(
+                target=self._read_loop, args=(worker, connection), name=f"rag-worker-{number}", daemon=True
+            ).start()
+
+    def _read_loop(self, worker: _Worker, connection):
+        """Deliver a worker's replies until its connection closes."""
+        try:
+            while True:
+                kind, request_id, payload = connection.recv()
+                if kind == "chunk":
+                    request = worker.pending.get(request_id)
+                    if request is not None and request[1] is not None:
+                        request[1](payload)
+                elif kind in ("result", "error"):
+                    with self._lock:
+                        request = worker.pending.pop(request_id, None)
+                    if request is None:
+                        continue
+                    if kind == "result":
+                        worker.requests += 1
+                        _resolve(request[0], payload)
+                    else:
+                        _resolve(request[0], error=RuntimeError(payload))
+                elif kind == "profile":
+                    self.profile_capture._finished(worker.number, *payload)
+                elif kind == "ready":
+                    worker.ready = True
+                    worker.ready_event.set()
+                    print(f"[OK] RAG worker {worker.number} ready (pid {worker.pid})")
+        except (EOFError, OSError):
+            pass
+        except Exception as e:
+            # A bad message or a failing chunk callback; without its reader
+            # the worker is unusable, so treat it as crashed
+            print(f"[!] Reading from RAG worker {worker.number} failed: {e}")
+        self._worker_exited(worker, connection)
+
+    def _worker_exited(self, worker: _Worker, connection):
+        with self._lock:
+            if worker.connection is not connection:
+                return
+            worker.ready = False
+            worker.connection = None
+            pending, worker.pending = worker.pending, {}
+        connection.close()
+        worker.ready_event.set()
+        for future, _ in pending.values():
+            _resolve(future, error=WorkerCrashed(f"RAG worker {worker.number} exited"))
+        self.profile_capture._finished(worker.number, None, 0)
+        if self._closed or worker.starting:
+            return
+
+        try:
+            code = worker.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+            code = worker.process.wait()
+        print(f"[!] RAG worker {worker.number} (pid {worker.pid}) exited with code {code}, "
+              f"{len(pending)} request(s) in flight; restarting it")
+        worker.starting = True
+        threading.Thread(target=self._restart, args=(worker,), daemon=True).start()
+
+    def _restart(self, worker: _Worker):
+        """Start a replacement for a worker, backing off while it keeps failing."""
+        while not self._closed:
+            time.sleep(min(30, 2 ** min(worker.restarts, 5)))
+            worker.restarts += 1
+            self._spawn(worker)
+            if self._wait_ready(worker):
+                worker.starting = False
+                # The knowledge base may have been reloaded while it was starting
+                try:
+                    self.call("refresh", worker=worker)
+                except Exception as e:
+                    print(f"[!] RAG worker {worker.number} could not refresh its index: {e}")
+                return
+            print(f"[!] RAG worker {worker.number} failed to restart")
+
+    # Requests
+
+    def live_workers(self) -> List[_Worker]:
+        """Return the workers currently able to take requests."""
+        return [worker for worker in self.workers if worker.ready]
+
+    def _submit(
+        self,
+        method: str,
+        args: tuple,
+        worker: Optional[_Worker] = None,
+        on_chunk: Optional[Callable[[str], None]] = None
+    ) -> Tuple[_Worker, Future]:
+        """
+        Send a request to a worker (by default the least busy one).
+
+        Returns:
+            The worker and a future of (result, worker trace)
+        """
+        with self._lock:
+            if worker is None:
+                live = self.live_workers()
+                if not live:
+                    raise RuntimeError("no RAG worker is available")
+                worker = min(live, key=lambda w: len(w.pending))
+            elif not worker.ready:
+                raise WorkerCrashed(f"RAG worker {worker.number} is not running")
+            request_id = next(self._ids)
+            future = Future()
+            worker.pending[request_id] = (future, on_chunk)
+            connection = worker.connection
+        try:
+            with worker.send_lock:
+                connection.send((request_id, method, args))
+        except (OSError, ValueError) as e:
+            with self._lock:
+                worker.pending.pop(request_id, None)
+            _resolve(future, error=WorkerCrashed(f"RAG worker {worker.number} is unreachable: {e}"))
+        return worker, future
+
+    def call(self, method: str, *args, worker: Optional[_Worker] = None, timeout: Optional[float] = None):
+        """Run a method on a worker and wait for its result (blocking)."""
+        _, future = self._submit(method, args, worker)
+        return future.result(timeout)[0]
+
+    def broadcast(self, method: str, *args, timeout: Optional[float] = None) -> list:
+        """Run a method on every live worker and return the results (blocking)."""
+        futures = []
+        for worker in self.live_workers():
+            try:
+                futures.append(self._submit(method, args, worker)[1])
+            except WorkerCrashed:
+                pass
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout)[0])
+            except WorkerCrashed:
+                pass
+        return results
+
+    async def aquery(self, question: str) -> str:
+        """
+        Answer a question on a worker process (see RAGSystem.aquery).
+
+        Returns:
+            The answer text, or an error message
+        """
+        trace = current_trace()
+        try:
+            for attempt in itertools.count():
+                dispatched = time.perf_counter()
+                worker, future = self._submit("aquery", (question, trace is not None))
+                try:
+                    answer, remote = await asyncio.wrap_future(future)
+                except WorkerCrashed:
+                    if attempt >= self.RETRIES:
+                        raise
+                    print(f"[!] Retrying a question from crashed RAG worker {worker.number}")
+                    continue
+                record_stage("worker", dispatched)
+                if trace is not None and remote is not None:
+                    trace.add_remote(remote, dispatched, worker=worker.number)
+                return answer
+        except Exception as e:
+            record_error(e)
+            return f"I encountered an error while processing your question: {str(e)}"
+
+    async def astream(self, question: str) -> AsyncIterator[str]:
+        """
+        Stream an answer from a worker process (see RAGSystem.astream).
+
+        Yields:
+            Pieces of the answer text as the worker produces them
+        """
+        loop = asyncio.get_running_loop()
+        trace = current_trace()
+        for attempt in itertools.count():
+            pieces = asyncio.Queue()
+            dispatched = time.perf_counter()
+            try:
+                worker, future = self._submit(
+                    "astream",
+                    (question, trace is not None),
+                    on_chunk=lambda piece: loop.call_soon_threadsafe(pieces.put_nowait, piece)
+                )
+            except Exception as e:
+                record_error(e)
+                yield ErrorMessage(f"I encountered an error while processing your question: {str(e)}")
+                return
+            # Completion is delivered on the same thread as the chunks, so it
+            # is queued after the last of them
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(pieces.put_nowait, None))
+
+            sent = False
+            while (piece := await pieces.get()) is not None:
+                sent = True
+                yield piece
+            try:
+                _, remote = future.result()
+            except WorkerCrashed as e:
+                if not sent and attempt < self.RETRIES:
+                    print(f"[!] Retrying a question from crashed RAG worker {worker.number}")
+                    continue
+                record_error(e)
+                yield ErrorMessage(f"I encountered an error while processing your question: {str(e)}")
+                return
+            except Exception as e:
+                record_error(e)
+                yield ErrorMessage(f"I encountered an error while processing your question: {str(e)}")
+                return
+            record_stage("worker", dispatched)
+            if trace is not None and remote is not None:
+                trace.add_remote(remote, dispatched, worker=worker.number)
+            return
+
+    def fit_message(self, answer: str) -> str:
+        """Shorten an answer that overran its length budget (see RAGSystem.fit_message)."""
+        return fit_text(answer, answer_char_budget())
+
+    # Knowledge base
+
+    def reload_knowledge_base(self, knowledge_dir: str = "knowledge_base", full_rebuild: bool = False) -> dict:
+        """
+        Re-index the knowledge base on one worker and switch every worker to it.
+
+        Blocks until done (see RAGSystem.reload_knowledge_base).
+
+        Raises:
+            RuntimeError: Another reload is already running
+        """
+        return self._replace_collection("reload", knowledge_dir, full_rebuild)
+
+    def clear_knowledge_base(self):
+        """Clear all documents from the knowledge base."""
+        self._replace_collection("clear")
+
+    def _replace_collection(self, method: str, *args):
+        if not self._reload_lock.acquire(blocking=False):
+            raise RuntimeError("a knowledge base reload is already in progress")
+        try:
+            live = self.live_workers()
+            if not live:
+                raise RuntimeError("no RAG worker is available")
+            worker = min(live, key=lambda w: len(w.pending))
+            result = self.call(method, *args, worker=worker)
+            # Switch the others, then drop the previous collection nobody reads anymore
+            self.broadcast("refresh")
+            self.call("drop_stale", worker=worker)
+            return result
+        finally:
+            self._reload_lock.release()
+
+    # Monitoring
+
+    def stats(self) -> dict:
+        """
+        Return the workers' stats() combined, plus the state of each worker process.
+
+        Latency histograms recorded in the workers are merged under
+        "stage_seconds" and "llm_tokens" (see metrics.Histogram.export).
+        """
+        results = self.broadcast("stats", timeout=10)
+        stats = _merge_stats([result["rag"] for result in results]) or {}
+        stage_seconds = Histogram(STAGE_SECONDS.name, STAGE_SECONDS.help, STAGE_SECONDS.labelnames, STAGE_SECONDS.buckets)
+        llm_tokens = Histogram(LLM_TOKENS.name, LLM_TOKENS.help, LLM_TOKENS.labelnames, LLM_TOKENS.buckets)
+        for result in results:
+            stage_seconds.merge(result["stage_seconds"])
+            llm_tokens.merge(result["llm_tokens"])
+        stats["stage_seconds"] = stage_seconds
+        stats["llm_tokens"] = llm_tokens
+        stats["workers"] = [
+            {
+                "number": worker.number,
+                "pid": worker.pid,
+                "alive": worker.ready,
+                "in_flight": len(worker.pending),
+                "requests": worker.requests,
+                "restarts": worker.restarts,
+            }
+            for worker in self.workers
+        ]
+        return stats
+
+
+# Worker process
+
+def _create_rag(factory: Optional[str], factory_kwargs: dict):
+    if not factory:
+        from rag_system import RAGSystem
+        return RAGSystem()
+    module_name, _, function_name = factory.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)(**factory_kwargs)
+
+
+def _worker_stats(rag) -> dict:
+    return {"rag": rag.stats(), "stage_seconds": STAGE_SECONDS.export(), "llm_tokens": LLM_TOKENS.export()}
+
+
+def _arm_profile(rag, number: int, send: Callable, queries: int, path: str, interval: float):
+    root, extension = os.path.splitext(path)
+    PROFILE_CAPTURE.arm(
+        queries,
+        f"{root}-worker{number}{extension}",
+        interval,
+        on_done=lambda written, samples: send("profile", None, (written, samples))
+    )
+
+
+# Blocking requests, run on the default executor of the worker's loop
+_BLOCKING = {
+    "reload": lambda rag, number, send, *args: rag.reload_knowledge_base(*args),
+    "clear": lambda rag, number, send: rag.clear_knowledge_base(),
+    "refresh": lambda rag, number, send: rag.refresh_index(),
+    "drop_stale": lambda rag, number, send: rag._drop_stale_collections(),
+    "stats": lambda rag, number, send: _worker_stats(rag),
+    "profile": _arm_profile,
+    "profile_progress": lambda rag, number, send: PROFILE_CAPTURE.progress(),
+}
+
+
+async def _handle(rag, number: int, send: Callable, request_id: int, method: str, args: tuple):
+    loop = asyncio.get_running_loop()
+    try:
+        if method in ("aquery", "astream"):
+            question, traced = args
+            with trace_request(method, question, force=traced) as trace:
+                if method == "aquery":
+                    result = await rag.aquery(question)
+                else:
+                    result = None
+                    async for piece in rag.astream(question):
+                        send("chunk", request_id, piece)
+            send("result", request_id, (result, trace.export() if traced and trace is not None else None))
+        else:
+            result = await loop.run_in_executor(None, _BLOCKING[method], rag, number, send, *args)
+            send("result", request_id, (result, None))
+    except Exception as e:
+        send("error", request_id, f"{type(e).__name__}: {e}")
+
+
+async def _serve(rag, number: int, connection):
+    """Answer requests from the pool until it shuts down or goes away."""
+    loop = asyncio.get_running_loop()
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            connection.send(message)
+
+    # Requests are read on their own thread and handled concurrently
+    reader = ThreadPoolExecutor(max_workers=1)
+    tasks = set()
+    send("ready", None, None)
+    while True:
+        try:
+            request_id, method, args = await loop.run_in_executor(reader, connection.recv)
+        except (EOFError, OSError):
+            break
+        if method == "shutdown":
+            break
+        task = asyncio.create_task(_handle(rag, number, send, request_id, method, args))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+def run_worker(number: int, address: str, prepare: bool, metrics_port: int, factory: Optional[str], factory_kwargs: dict):
+    """Connect to the pool, load the RAG system and serve requests."""
+    connection = Client(address, authkey=bytes.fromhex(os.environ.pop(AUTHKEY_ENV)))
+    connection.send(("hello", number, os.getpid()))
+    print(f"[startup] RAG worker {number} starting (pid {os.getpid()})")
+
+    if metrics_port:
+        try:
+            start_http_server(metrics_port, Config.METRICS_HOST)
+        except OSError as e:
+            print(f"[!] RAG worker {number} could not serve metrics on port {metrics_port}: {e}")
+
+    rag = _create_rag(factory, factory_kwargs)
+    # Other workers may still be reading the replaced collection; the pool
+    # drops it once they have all switched
+    rag.drop_replaced_collections = False
+    if prepare and rag.index.count() == 0:
+        print("Knowledge base is empty, loading from files...")
+        rag.reload_knowledge_base()
+    rag.warm_up()
+    asyncio.run(_serve(rag, number, connection))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG worker process (started by RAGWorkerPool)")
+    parser.add_argument("--number", type=int, required=True)
+    parser.add_argument("--address", required=True)
+    parser.add_argument("--prepare", action="store_true", help="Index the knowledge base if it is empty")
+    parser.add_argument("--metrics-port", type=int, default=0)
+    parser.add_argument("--factory")
+    parser.add_argument("--factory-kwargs", default="{}")
+    options = parser.parse_args()
+    run_worker(
+        options.number, options.address, options.prepare, options.metrics_port,
+        options.factory, json.loads(options.factory_kwargs)
+    )